@@ -1,21 +1,100 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 import os
+from app.database.pool_metrics import MeteredQueuePool, PoolMetrics
+from app.database.query_monitor import query_monitor
 from app.utils.config import get_settings
 
 settings = get_settings()
 
+def _sqlite_pragmas(read_only: bool) -> list:
+    """PRAGMAs applied to every new SQLite connection"""
+    pragmas = [
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        f"PRAGMA cache_size=-{settings.sqlite_cache_size_kb}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size}",
+        f"PRAGMA temp_store={settings.sqlite_temp_store}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+def _create_sqlite_engine(url: str, pool_size: int, max_overflow: int, read_only: bool = False):
+    sqlite_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=MeteredQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.db_pool_timeout
+    )
+    pragmas = _sqlite_pragmas(read_only)
+
+    @event.listens_for(sqlite_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return sqlite_engine
+
 # Use SQLite for development/testing, PostgreSQL for production
 if settings.environment == "production":
     SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.db_username}:{settings.db_password}@{settings.db_host}/{settings.db_name}"
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    # Reads go to the replica when one is configured, otherwise to a separate
+    # pool on the primary, so a burst of analytics queries can't use up the
+    # connections the webhook writes need
+    READ_DATABASE_URL = f"postgresql://{settings.db_username}:{settings.db_password}@{settings.db_read_host or settings.db_host}/{settings.db_name}"
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=True,
+        poolclass=MeteredQueuePool
+    )
+    read_engine = create_engine(
+        READ_DATABASE_URL,
+        pool_size=settings.db_read_pool_size,
+        max_overflow=settings.db_read_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=True,
+        poolclass=MeteredQueuePool
+    )
 else:
     SQLALCHEMY_DATABASE_URL = "sqlite:///./ai_voice_agent.db"
-    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+    # In WAL mode readers work from a snapshot and never block the writer, so
+    # read-only requests get their own query_only connections
+    engine = _create_sqlite_engine(
+        SQLALCHEMY_DATABASE_URL,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow
+    )
+    read_engine = _create_sqlite_engine(
+        SQLALCHEMY_DATABASE_URL,
+        pool_size=settings.db_read_pool_size,
+        max_overflow=settings.db_read_max_overflow,
+        read_only=True
+    )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+query_monitor.attach(engine)
+query_monitor.attach(read_engine)
+
+pool_metrics = {
+    "write": PoolMetrics("write", engine),
+    "read": PoolMetrics("read", read_engine),
+}
+
+# Committed objects keep their loaded state: services commit and carry on
+# with the same objects, and expiring them made each next attribute access
+# (or the refresh that used to follow every commit) reload the row
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
@@ -27,6 +106,26 @@ def get_db():
     finally:
         db.close()
 
+# Database dependency for endpoints that only read
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def dispose_engines(close: bool = True) -> None:
+    """
+    Drop the pooled connections of both engines
+
+    Forked workers pass close=False: connections inherited from the parent
+    are forgotten without closing them under the parent's feet.
+    """
+    engine.dispose(close=close)
+    read_engine.dispose(close=close)
+
 async def init_db():
     from app.models.database import Base
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from app.database.migrations import upgrade_schema
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
@@ -0,0 +1,152 @@
+from sqlalchemy import inspect, text, bindparam, LargeBinary
+from sqlalchemy.orm import Session
+import logging
+from typing import Dict
+
+from app.database.search_index import create_search_index, rebuild_search_index
+from app.models.database import ID_COUNTERS, TRANSCRIPT_SNIPPET_LENGTH
+from app.utils.compression import compress_text, is_compressed
+
+logger = logging.getLogger(__name__)
+
+# Columns added after the initial schema. create_all only creates missing
+# tables, so these are added to existing databases on startup.
+ADDED_COLUMNS = [
+    ("calls", "transcript_length", "INTEGER"),
+    ("calls", "transcript_snippet", f"VARCHAR({TRANSCRIPT_SNIPPET_LENGTH})"),
+    ("recordings", "content_hash", "VARCHAR(64)"),
+]
+
+# Indexes added after the initial schema, created on existing databases on startup
+ADDED_INDEXES = [
+    ("call_actions", "ix_call_actions_status_created_at", "status, created_at"),
+]
+
+# SQL run right after a column is added to fill it in for existing rows
+BACKFILLS = {
+    ("calls", "transcript_length"): "UPDATE calls SET transcript_length = length(transcript) WHERE transcript IS NOT NULL",
+    ("calls", "transcript_snippet"): f"UPDATE calls SET transcript_snippet = substr(transcript, 1, {TRANSCRIPT_SNIPPET_LENGTH}) WHERE transcript IS NOT NULL",
+}
+
+# Tables whose transcript column holds CompressedText values
+TRANSCRIPT_TABLES = ["calls", "recordings"]
+
+def upgrade_schema(engine) -> None:
+    """Bring an existing database up to date with the current models"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    columns = {table: {column["name"]: column for column in inspector.get_columns(table)} for table in tables}
+
+    with engine.begin() as conn:
+        for table, column, ddl in ADDED_COLUMNS:
+            if table not in tables or column in columns[table]:
+                continue
+
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            if (table, column) in BACKFILLS:
+                conn.execute(text(BACKFILLS[(table, column)]))
+            logger.info(f"Added column {table}.{column}")
+
+        for table, index, index_columns in ADDED_INDEXES:
+            if table in tables:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({index_columns})"))
+
+        if "id_counters" in tables:
+            conn.execute(
+                text(
+                    "INSERT INTO id_counters (name, next_value) SELECT :name, 1 "
+                    "WHERE NOT EXISTS (SELECT 1 FROM id_counters WHERE name = :name)"
+                ),
+                [{"name": name} for name in ID_COUNTERS]
+            )
+
+        # SQLite stores compressed bytes in the existing TEXT columns as-is,
+        # Postgres needs the column converted to bytea first
+        if engine.dialect.name == "postgresql":
+            for table in TRANSCRIPT_TABLES:
+                if table in tables and not isinstance(columns[table]["transcript"]["type"], LargeBinary):
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ALTER COLUMN transcript TYPE BYTEA "
+                        f"USING convert_to(transcript, 'UTF8')"
+                    ))
+                    logger.info(f"Converted {table}.transcript to bytea")
+
+        search_index_created = create_search_index(conn)
+
+    # A new index is filled from existing transcripts once, after which
+    # CallService keeps it up to date on every transcript write
+    if search_index_created:
+        with Session(engine) as db:
+            rebuild_search_index(db)
+
+def deduplicate_recording_transcripts(engine) -> int:
+    """Clear recording transcripts that only duplicate their call's transcript"""
+    with engine.begin() as conn:
+        result = conn.execute(text(
+            "UPDATE recordings SET transcript = NULL "
+            "WHERE transcript IS NOT NULL AND transcript = "
+            "(SELECT calls.transcript FROM calls WHERE calls.id = recordings.call_id)"
+        ))
+        return result.rowcount
+
+def compress_transcripts(engine, batch_size: int = 500) -> Dict[str, Dict[str, int]]:
+    """
+    Compress existing uncompressed transcripts in batches
+
+    Each batch is committed separately, so the migration can be interrupted
+    and re-run; rows that are already compressed are skipped.
+
+    Returns:
+        Per-table row counts and stored bytes before and after compression
+    """
+    report = {}
+    update_params = [bindparam("transcript", type_=LargeBinary), bindparam("id")]
+
+    for table in TRANSCRIPT_TABLES:
+        stats = {"rows": 0, "compressed": 0, "bytes_before": 0, "bytes_after": 0}
+        select = text(
+            f"SELECT id, transcript FROM {table} "
+            f"WHERE id > :last_id AND transcript IS NOT NULL ORDER BY id LIMIT :limit"
+        )
+        update = text(f"UPDATE {table} SET transcript = :transcript WHERE id = :id").bindparams(*update_params)
+        last_id = 0
+
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(select, {"last_id": last_id, "limit": batch_size}).all()
+                if not rows:
+                    break
+
+                updates = []
+                for row_id, value in rows:
+                    stored = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+                    stats["rows"] += 1
+                    stats["bytes_before"] += len(stored)
+
+                    if is_compressed(value):
+                        stats["bytes_after"] += len(stored)
+                        continue
+
+                    compressed = compress_text(stored.decode("utf-8"))
+                    if not is_compressed(compressed):
+                        # Too short to shrink; rewriting it would change nothing
+                        stats["bytes_after"] += len(stored)
+                        continue
+
+                    stats["bytes_after"] += len(compressed)
+                    updates.append({"id": row_id, "transcript": compressed})
+
+                if updates:
+                    conn.execute(update, updates)
+                    stats["compressed"] += len(updates)
+
+                last_id = rows[-1][0]
+
+        saved = stats["bytes_before"] - stats["bytes_after"]
+        logger.info(
+            f"Compressed {stats['compressed']} of {stats['rows']} {table} transcripts: "
+            f"{stats['bytes_before']} -> {stats['bytes_after']} bytes ({saved} saved)"
+        )
+        report[table] = stats
+
+    return report
@@ -0,0 +1,78 @@
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from typing import Dict, Any
+import threading
+import time
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait and how often they time out"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited_ms = (time.perf_counter() - started) * 1000
+            self.total_wait_ms += waited_ms
+            self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+
+class PoolMetrics:
+    """Checkout counters and saturation figures for one engine's connection pool"""
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.checkouts = 0
+        self.peak_checked_out = 0
+        self.longest_checkout_ms = 0.0
+        self._lock = threading.Lock()
+
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+
+    @property
+    def capacity(self) -> int:
+        pool = self.engine.pool
+        return pool.size() + max(pool._max_overflow, 0)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        checked_out = self.engine.pool.checkedout()
+        with self._lock:
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            held_ms = (time.perf_counter() - checked_out_at) * 1000
+            with self._lock:
+                self.longest_checkout_ms = max(self.longest_checkout_ms, held_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        checked_out = pool.checkedout()
+        capacity = self.capacity
+        return {
+            "pool": self.name,
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": checked_out,
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+            "peak_checked_out": self.peak_checked_out,
+            "checkouts": self.checkouts,
+            "timeouts": getattr(pool, "timeouts", 0),
+            "average_wait_ms": round(getattr(pool, "total_wait_ms", 0.0) / self.checkouts, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(getattr(pool, "max_wait_ms", 0.0), 1),
+            "longest_checkout_ms": round(self.longest_checkout_ms, 1),
+        }
@@ -0,0 +1,169 @@
+"""
+Query counting, slow-query log and N+1 detection
+
+Engine event hooks count the statements each unit of work issues: a
+request (QueryCountMiddleware) or any block wrapped in track_queries(),
+such as a scheduled task. The unit is carried in a context variable, so
+work it hands to asyncio.to_thread is counted with it.
+
+- Statements slower than SLOW_QUERY_MS are logged with their EXPLAIN plan.
+- A statement issued N_PLUS_ONE_THRESHOLD times or more within one unit
+  is reported as a likely N+1 when the unit ends.
+- Statements whose cost is shared by many units, such as leasing a block
+  of IDs, run untracked() and count against none of them.
+- Endpoints can declare a query budget with @query_budget(n). Going over
+  it is logged, or with QUERY_BUDGET_STRICT (meant for tests) fails the
+  statement that went over with QueryBudgetExceeded, and the request or
+  task itself in case the service code caught that.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+import logging
+import time
+
+from sqlalchemy import event
+
+from app.utils.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Statements worth an EXPLAIN; transaction control and PRAGMAs aren't
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+def query_budget(max_queries: int):
+    """Declare the most statements an endpoint may issue, background tasks included"""
+    def decorate(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorate
+
+class QueryStats:
+    """Statements issued by one request or task"""
+    def __init__(self, name: str, budget: Optional[int] = None, scope: Optional[dict] = None):
+        self.name = name
+        self.budget = budget
+        self.scope = scope
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements: Dict[str, int] = {}
+        self.over_budget = False
+
+    def limit(self) -> Optional[int]:
+        """The declared budget, looked up on the routed endpoint for requests"""
+        if self.budget is None and self.scope is not None:
+            budget = getattr(self.scope.get("endpoint"), "query_budget", None)
+            return budget if budget is not None else settings.query_budget_default or None
+        return self.budget
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+    def report(self) -> None:
+        for statement, count in self.repeated(settings.n_plus_one_threshold).items():
+            logger.warning(f"Possible N+1 in {self.name}: {count} x {statement}")
+        if self.over_budget:
+            logger.warning(f"{self.name} issued {self.count} queries, over its budget of {self.limit()}")
+        logger.debug(f"{self.name} issued {self.count} queries in {self.total_ms:.1f} ms")
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+@contextmanager
+def track_queries(name: str, budget: Optional[int] = None, scope: Optional[dict] = None) -> Iterator[QueryStats]:
+    """Count the statements issued inside the block as one unit of work"""
+    stats = QueryStats(name, budget, scope)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        stats.report()
+    if stats.over_budget and query_monitor.strict:
+        raise QueryBudgetExceeded(f"{name} issued {stats.count} queries, over its budget of {stats.limit()}")
+
+@contextmanager
+def untracked() -> Iterator[None]:
+    """Leave the statements issued inside the block out of the current unit of work"""
+    token = _current_stats.set(None)
+    try:
+        yield
+    finally:
+        _current_stats.reset(token)
+
+class QueryMonitor:
+    """Engine hooks feeding the current QueryStats and the slow-query log"""
+    def __init__(self, slow_query_ms: float, strict: bool):
+        self.slow_query_ms = slow_query_ms
+        self.strict = strict
+
+    def attach(self, engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's own context: after_cursor_execute doesn't
+        # fire for a statement that raises, such as an expected IntegrityError
+        context._query_started_at = time.perf_counter()
+
+        stats = _current_stats.get()
+        if stats is None:
+            return
+        stats.count += 1
+        limit = stats.limit()
+        if limit is not None and stats.count > limit and not stats.over_budget:
+            stats.over_budget = True
+            if self.strict:
+                raise QueryBudgetExceeded(f"{stats.name} exceeded its budget of {limit} queries with: {statement}")
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - context._query_started_at) * 1000
+
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.total_ms += elapsed_ms
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+        if elapsed_ms >= self.slow_query_ms:
+            plan = self._explain(conn, statement, parameters, executemany)
+            logger.warning(
+                f"Slow query ({elapsed_ms:.1f} ms) in {stats.name if stats else 'no request'}: {statement}\n{plan}"
+            )
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters, executemany: bool) -> str:
+        if not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return "(no plan)"
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+
+        # On the raw connection, so the EXPLAIN isn't counted or timed itself
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+        except Exception as e:
+            return f"(no plan: {e})"
+        finally:
+            cursor.close()
+
+query_monitor = QueryMonitor(settings.slow_query_ms, settings.query_budget_strict)
+
+class QueryCountMiddleware:
+    """Count the statements of each request, including its background tasks"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with track_queries(f"{scope['method']} {scope['path']}", scope=scope):
+            await self.app(scope, receive, send)
@@ -0,0 +1,150 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session, load_only
+import logging
+from typing import List, Optional, Tuple
+
+from app.models.database import Call
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "call_search"
+
+# SQLite: a contentless FTS5 table, so transcripts (stored compressed on the
+# calls table) are not duplicated in plain text. unicode61 splits Devanagari on
+# whitespace and punctuation (including the danda) and keeps vowel signs
+# attached, so Hindi words index as whole tokens.
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+    f"transcript, content='', tokenize='unicode61 remove_diacritics 2')",
+]
+
+# Postgres: a tsvector per call using the 'simple' configuration, which does
+# no stemming and works for both English and Hindi
+POSTGRES_DDL = [
+    f"CREATE TABLE {SEARCH_TABLE} ("
+    f"call_id INTEGER PRIMARY KEY REFERENCES calls(id) ON DELETE CASCADE, "
+    f"document TSVECTOR NOT NULL)",
+    f"CREATE INDEX ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)",
+]
+
+def create_search_index(conn) -> bool:
+    """Create the transcript search index if missing, returning whether it was created"""
+    if SEARCH_TABLE in inspect(conn).get_table_names():
+        return False
+
+    for statement in (POSTGRES_DDL if conn.dialect.name == "postgresql" else SQLITE_DDL):
+        conn.execute(text(statement))
+
+    logger.info(f"Created transcript search index {SEARCH_TABLE}")
+    return True
+
+def index_transcript(conn, call_id: int, transcript: Optional[str], previous_transcript: Optional[str] = None) -> None:
+    """
+    Update the search index for a call whose transcript changed
+
+    The SQLite index is contentless, so removing a call's old entry requires
+    the text that was indexed for it.
+    """
+    if conn.dialect.name == "postgresql":
+        if transcript:
+            conn.execute(text(
+                f"INSERT INTO {SEARCH_TABLE} (call_id, document) "
+                f"VALUES (:call_id, to_tsvector('simple', :transcript)) "
+                f"ON CONFLICT (call_id) DO UPDATE SET document = EXCLUDED.document"
+            ), {"call_id": call_id, "transcript": transcript})
+        else:
+            conn.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE call_id = :call_id"), {"call_id": call_id})
+        return
+
+    if previous_transcript:
+        conn.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, transcript) VALUES ('delete', :call_id, :transcript)"
+        ), {"call_id": call_id, "transcript": previous_transcript})
+
+    if transcript:
+        conn.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, transcript) VALUES (:call_id, :transcript)"
+        ), {"call_id": call_id, "transcript": transcript})
+
+def index_new_transcripts(conn, transcripts: List[Tuple[int, str]]) -> None:
+    """Index the transcripts of newly inserted calls with one executemany"""
+    if not transcripts:
+        return
+
+    parameters = [{"call_id": call_id, "transcript": transcript} for call_id, transcript in transcripts]
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (call_id, document) "
+            f"VALUES (:call_id, to_tsvector('simple', :transcript))"
+        ), parameters)
+    else:
+        conn.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, transcript) VALUES (:call_id, :transcript)"
+        ), parameters)
+
+def _fts_query(query: str) -> str:
+    """Quote each search term so user input can't inject FTS5 query syntax"""
+    # Split on whitespace only; the FTS tokenizer handles punctuation inside
+    # each quoted term, and regex word classes would split Devanagari vowel signs
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+def search_transcripts(conn, query: str, skip: int = 0, limit: int = 20) -> List[Tuple[int, float]]:
+    """
+    Search indexed transcripts
+
+    Returns:
+        (call_id, score) pairs, best match first. Higher scores rank better.
+    """
+    if conn.dialect.name == "postgresql":
+        rows = conn.execute(text(
+            f"SELECT call_id, ts_rank(document, q) AS score "
+            f"FROM {SEARCH_TABLE}, plainto_tsquery('simple', :query) q "
+            f"WHERE document @@ q ORDER BY score DESC, call_id DESC LIMIT :limit OFFSET :skip"
+        ), {"query": query, "limit": limit, "skip": skip})
+        return [(call_id, float(score)) for call_id, score in rows]
+
+    match = _fts_query(query)
+    if not match:
+        return []
+
+    # FTS5 rank is bm25, where lower (more negative) is better
+    rows = conn.execute(text(
+        f"SELECT rowid, rank FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match "
+        f"ORDER BY rank, rowid DESC LIMIT :limit OFFSET :skip"
+    ), {"match": match, "limit": limit, "skip": skip})
+    return [(call_id, -float(rank)) for call_id, rank in rows]
+
+def rebuild_search_index(db: Session, batch_size: int = 500) -> int:
+    """
+    Rebuild the search index from the calls table
+
+    Returns:
+        Number of calls indexed
+    """
+    conn = db.connection()
+    create_search_index(conn)
+
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    else:
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('delete-all')"))
+
+    indexed = 0
+    last_id = 0
+    while True:
+        calls = db.query(Call).options(load_only(Call.id, Call.transcript)).filter(
+            Call.id > last_id, Call.transcript.isnot(None)
+        ).order_by(Call.id).limit(batch_size).all()
+        if not calls:
+            break
+
+        for call in calls:
+            index_transcript(conn, call.id, call.transcript)
+
+        indexed += len(calls)
+        last_id = calls[-1].id
+        db.expunge_all()
+
+    db.commit()
+    logger.info(f"Rebuilt transcript search index with {indexed} calls")
+    return indexed
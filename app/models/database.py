@@ -1,11 +1,16 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Enum, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Boolean, String, Float, DateTime, Date, Text, Enum, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 import enum
 
+from app.models.types import CompressedText
+
 Base = declarative_base()
 
+# Length of the transcript preview kept alongside the compressed transcript
+TRANSCRIPT_SNIPPET_LENGTH = 200
+
 class CallDirection(str, enum.Enum):
     INBOUND = "inbound"
     OUTBOUND = "outbound"
@@ -30,7 +35,9 @@ class Call(Base):
     status = Column(Enum(CallStatus), default=CallStatus.QUEUED)
     duration = Column(Float, default=0.0)
     language = Column(String(10), default="en")
-    transcript = Column(Text, nullable=True)
+    transcript = Column(CompressedText, nullable=True)
+    transcript_length = Column(Integer, nullable=True)
+    transcript_snippet = Column(String(TRANSCRIPT_SNIPPET_LENGTH), nullable=True)
     intent = Column(String(100), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -38,6 +45,15 @@ class Call(Base):
     # Relationships
     recordings = relationship("Recording", back_populates="call")
     actions = relationship("CallAction", back_populates="call")
+    tickets = relationship("Ticket", back_populates="call")
+    
+    @validates("transcript")
+    def _summarize_transcript(self, key, transcript):
+        # The compressed transcript can't be inspected in SQL, so list views
+        # read these columns instead
+        self.transcript_length = len(transcript) if transcript is not None else None
+        self.transcript_snippet = transcript[:TRANSCRIPT_SNIPPET_LENGTH] if transcript is not None else None
+        return transcript
 
 class Recording(Base):
     __tablename__ = "recordings"
@@ -46,8 +62,9 @@ class Recording(Base):
     call_id = Column(Integer, ForeignKey("calls.id"))
     recording_sid = Column(String(255), unique=True, index=True, nullable=True)
     recording_url = Column(String(255))
+    content_hash = Column(String(64), nullable=True)  # Key of the audio in the local recording store
     duration = Column(Float, default=0.0)
-    transcript = Column(Text, nullable=True)
+    transcript = Column(CompressedText, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -62,6 +79,8 @@ class ActionType(str, enum.Enum):
 
 class CallAction(Base):
     __tablename__ = "call_actions"
+    # Pending callbacks are polled by status and creation time
+    __table_args__ = (Index("ix_call_actions_status_created_at", "status", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     call_id = Column(Integer, ForeignKey("calls.id"))
@@ -85,4 +104,69 @@ class Ticket(Base):
     status = Column(String(50), default="open")
     assigned_to = Column(String(100), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # Relationships
+    call = relationship("Call", back_populates="tickets")
+
+class ArchivePartition(Base):
+    """Manifest entry for a file of calls moved out of the hot tables"""
+    __tablename__ = "archive_partitions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, index=True)
+    path = Column(String(255), unique=True)
+    call_count = Column(Integer, default=0)
+    min_call_id = Column(Integer, index=True)
+    max_call_id = Column(Integer, index=True)
+    summary = Column(Text)  # JSON aggregates used by analytics without reading the file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class WebhookEvent(Base):
+    """Response to a processed webhook delivery, replayed when the provider retries it"""
+    __tablename__ = "webhook_events"
+    __table_args__ = (UniqueConstraint("provider", "call_id", "event", "sequence"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String(20))
+    call_id = Column(String(255))
+    event = Column(String(50))
+    sequence = Column(String(50), default="")
+    status_code = Column(Integer, nullable=True)  # NULL while the first delivery is being processed
+    claimed_at = Column(Float)  # Unix time the delivery being processed was claimed
+    media_type = Column(String(100), nullable=True)
+    body = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Counters of IdCounter, created with the schema so leasing never has to
+ID_COUNTERS = ("ticket", "call_sid")
+
+class IdCounter(Base):
+    """Next unleased value of a sequential ID, see app.services.id_allocator"""
+    __tablename__ = "id_counters"
+
+    name = Column(String(50), primary_key=True)
+    next_value = Column(Integer, nullable=False, default=1)
+
+class ImportJob(Base):
+    """Progress of a bulk call import, checkpointed with each committed batch"""
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String(500))  # Path of the file being imported
+    format = Column(String(10))
+    classify_intents = Column(Boolean, default=False)
+    status = Column(String(20), default="running")  # running, completed or failed
+    byte_offset = Column(BigInteger, default=0)  # Where the next batch starts in the source
+    rows = Column(Integer, default=0)  # Records read up to byte_offset, rejected ones included
+    calls = Column(Integer, default=0)
+    recordings = Column(Integer, default=0)
+    actions = Column(Integer, default=0)
+    tickets = Column(Integer, default=0)
+    rejected = Column(Integer, default=0)
+    intents_classified = Column(Integer, default=0)
+    elapsed_seconds = Column(Float, default=0.0)  # Time spent importing, over all runs
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,21 @@
+from sqlalchemy.types import TypeDecorator, LargeBinary
+
+from app.utils.compression import compress_text, decompress_text
+
+class CompressedText(TypeDecorator):
+    """
+    Text column stored compressed
+
+    Values are compressed on write and decompressed on read. Rows written
+    before compression was enabled are read back as plain text.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
@@ -1,21 +1,36 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from sqlalchemy.orm import Session
+from datetime import datetime
 from typing import List, Optional
 import logging
+import os
+import uuid
 
-from app.database.db import get_db
-from app.schemas.analytics import CallAnalytics, IntentSummary
+from app.database.db import get_db, get_read_db, ReadSessionLocal, pool_metrics
+from app.database.query_monitor import query_budget
+from app.models.database import ImportJob
+from app.schemas.analytics import CallAnalytics, DurationAnalytics, IntentSummary, LiveCallMetrics, ProfileSummary, PoolStats, IntentStageStats, WorkerStats, CallbackSchedulerStats, ImportJobStatus
 from app.services.analytics_service import AnalyticsService
 from app.services.call_service import CallService
+from app.services.callback_scheduler import callback_scheduler
+from app.services.export_service import ExportService, EXPORT_FORMATS, EXPORT_INCLUDES
+from app.services.import_service import ImportService, IMPORT_FORMATS, import_job_status, run_import_in_background
+from app.services.intent_service import get_intent_stage_stats
+from app.services.live_metrics import get_live_metrics
+from app.utils.config import get_settings
+from app.utils.prefork import get_worker_table
+from app.utils.profiling import get_profile_store
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 @router.get("/analytics", response_model=CallAnalytics)
 async def get_call_analytics(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get analytics for calls within a specified date range
@@ -28,11 +43,42 @@ async def get_call_analytics(
         logger.error(f"Error retrieving call analytics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/analytics/durations", response_model=DurationAnalytics)
+async def get_duration_analytics(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Get p50/p90/p99 and histograms of answered call durations within a
+    specified date range, overall and by intent, direction and hour of day
+    """
+    try:
+        analytics_service = AnalyticsService(db)
+        return await analytics_service.get_duration_analytics(start_date, end_date)
+    except Exception as e:
+        logger.error(f"Error retrieving duration analytics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/live-metrics", response_model=LiveCallMetrics)
+async def get_live_call_metrics(
+    window_seconds: int = Query(settings.live_metrics_window_seconds, ge=1, le=settings.live_metrics_window_seconds,
+                                description="Length of the window in seconds")
+):
+    """
+    Get calls started, status changes and detected intents over the last
+    few minutes, merged across server workers
+    
+    Served from in-memory per-second counters without querying the
+    database, so wallboards can poll it every second.
+    """
+    return get_live_metrics().call_metrics(window_seconds)
+
 @router.get("/intents", response_model=List[IntentSummary])
 async def get_intent_summary(
     start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get summary of detected intents within a specified date range
@@ -45,11 +91,199 @@ async def get_intent_summary(
         logger.error(f"Error retrieving intent summary: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/intent-cascade", response_model=List[IntentStageStats])
+async def get_intent_cascade_stats():
+    """
+    Get how many transcripts each intent stage (rules, local model, LLM,
+    default) decided in this worker since it started
+    """
+    return get_intent_stage_stats()
+
+@router.get("/export")
+async def export_calls(
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    format: str = Query("ndjson", description="Export format (ndjson/csv)"),
+    include: Optional[str] = Query(None, description="Comma-separated child rows to include (recordings,actions,tickets)"),
+    gzip: bool = Query(False, description="Gzip the export on the fly"),
+):
+    """
+    Stream all calls within a date range as NDJSON or CSV
+    
+    Rows are read from a server-side cursor and written as they are fetched,
+    so memory use does not grow with the size of the export.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    
+    includes = [child.strip() for child in include.split(",") if child.strip()] if include else []
+    unknown = [child for child in includes if child not in EXPORT_INCLUDES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown export includes: {', '.join(unknown)}")
+    
+    try:
+        start_datetime, end_datetime = ExportService.parse_date_range(start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def stream():
+        # The export outlives the request's dependencies, so it uses its own session
+        db = ReadSessionLocal()
+        try:
+            yield from ExportService(db).iter_export(
+                start_datetime, end_datetime, format=format, include=includes, compress=gzip
+            )
+        except Exception as e:
+            logger.error(f"Error streaming call export: {e}")
+            raise
+        finally:
+            db.close()
+    
+    filename = f"calls.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/x-ndjson")
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/imports", response_model=ImportJobStatus, status_code=202)
+async def start_import(
+    request: Request,
+    format: str = Query("ndjson", description="Format of the uploaded file (ndjson/csv), as written by /admin/export"),
+    gzip: bool = Query(False, description="Whether the uploaded file is gzipped"),
+    classify_intents: bool = Query(False, description="Classify calls that have a transcript but no intent"),
+    db: Session = Depends(get_db)
+):
+    """
+    Bulk-import historical calls from the request body
+    
+    The body is streamed to IMPORT_DIR and imported in the background in
+    batches of IMPORT_BATCH_SIZE. Poll GET /admin/imports/{job_id} for
+    progress; a failed or interrupted import resumes from its last
+    committed batch with POST /admin/imports/{job_id}/resume.
+    """
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format: {format}")
+    
+    os.makedirs(settings.import_dir, exist_ok=True)
+    path = os.path.join(settings.import_dir, f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex}.{format}" + (".gz" if gzip else ""))
+    try:
+        # Written under a temporary name, so a broken upload never looks complete
+        with open(path + ".part", "wb") as upload:
+            async for chunk in request.stream():
+                upload.write(chunk)
+        os.replace(path + ".part", path)
+        
+        job = ImportService(db).create_job(path, format, classify_intents)
+        run_import_in_background(job.id)
+        return import_job_status(job)
+    except Exception as e:
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
+        logger.error(f"Error starting call import: {e}")
+        raise HTTPException(status_code=500, detail="Error starting call import")
+
+@router.get("/imports", response_model=List[ImportJobStatus])
+async def list_imports(
+    limit: int = Query(50, ge=1, le=500, description="Most recent imports to list"),
+    db: Session = Depends(get_db)
+):
+    """List bulk imports, newest first"""
+    return [import_job_status(job) for job in ImportService(db).list_jobs(limit)]
+
+@router.get("/imports/{job_id}", response_model=ImportJobStatus)
+async def get_import(job_id: int, db: Session = Depends(get_db)):
+    """Get the progress of a bulk import, including records imported per second"""
+    job = db.get(ImportJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return import_job_status(job)
+
+@router.post("/imports/{job_id}/resume", response_model=ImportJobStatus, status_code=202)
+async def resume_import(job_id: int, db: Session = Depends(get_db)):
+    """
+    Resume a failed or interrupted import from its last committed batch
+    
+    Resuming an import that is still running is harmless: whichever run
+    commits the next batch first carries on and the other one stops.
+    """
+    job = db.get(ImportJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    if job.status == "completed":
+        raise HTTPException(status_code=409, detail="Import already completed")
+    if not os.path.exists(job.source):
+        raise HTTPException(status_code=409, detail="Import file no longer exists")
+    
+    run_import_in_background(job.id)
+    return import_job_status(job)
+
+@router.get("/db-pools", response_model=List[PoolStats])
+async def get_db_pool_stats():
+    """
+    Get checkout and saturation figures for the write and read connection pools
+    
+    Saturation is the share of the pool's capacity (size + max overflow)
+    currently checked out. Wait times and timeouts show how long checkouts
+    queued for a free connection.
+    """
+    return [metrics.snapshot() for metrics in pool_metrics.values()]
+
+@router.get("/workers", response_model=List[WorkerStats])
+async def get_worker_stats():
+    """
+    Get liveness and request counts of every server worker
+    
+    Under the pre-fork production server any worker reports on all of them.
+    A worker is alive while its event loop keeps sending heartbeats; the
+    master restarts workers silent for WORKER_TIMEOUT_SECONDS.
+    """
+    return get_worker_table().snapshot(settings.worker_timeout_seconds)
+
+@router.get("/profiles", response_model=List[ProfileSummary])
+async def list_profiles():
+    """
+    List stored request profiles, newest first
+    
+    Requests are profiled when PROFILING_ENABLED is set and they carry the
+    X-Profile header with PROFILING_TOKEN, or are picked at
+    PROFILING_SAMPLE_RATE. Profiled responses carry an X-Profile-Id header.
+    """
+    return get_profile_store().list()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("collapsed", description="collapsed (flamegraph.pl / speedscope input) or json")
+):
+    """Get a stored request profile"""
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be collapsed or json")
+    
+    profile = get_profile_store().get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(profile["collapsed"])
+    return profile
+
+@router.get("/callback-scheduler", response_model=CallbackSchedulerStats)
+async def get_callback_scheduler_stats():
+    """
+    Get the queue and counters of the callback scheduler
+    
+    Only one server worker dials callbacks; the others report running=false,
+    so retry until the request lands on the running one.
+    """
+    return callback_scheduler.stats()
+
 @router.post("/simulate-call", tags=["Testing"])
+@query_budget(10)
 async def simulate_call(
     phone_number: str = Query(..., description="Phone number to simulate call from"),
     message: str = Query(..., description="Message to simulate from caller"),
-    language: str = Query("en", description="Language of the message (en/hi)"),
+    language: Optional[str] = Query(None, description="Language of the message (en/hi); detected from the message if omitted"),
     db: Session = Depends(get_db)
 ):
     """
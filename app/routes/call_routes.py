@@ -153,22 +153,94 @@ async def simulate_frontend_call(db: Session = Depends(get_db)):
     except Exception as e:
         logger.error(f"Error simulating frontend call: {e}")
         raise HTTPException(status_code=500, detail="Simulation failed")'''
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Path
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Path, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import asyncio
+import json
 import logging
 
-from app.database.db import get_db
+from app.database.db import get_db, get_read_db
+from app.database.query_monitor import query_budget
 from app.schemas.call import (
     CallCreate, CallResponse, OutboundCallRequest, 
-    InboundCallResponse, CallStatus
+    InboundCallResponse, CallStatus, CallSearchResult
 )
-from app.services.call_service import CallService
+from app.models.database import Call, Recording
+from app.services.archive_service import serialize_row
+from app.services.call_service import CallService, DEFAULT_LIST_FIELDS, DEFAULT_DETAIL_FIELDS
+from app.services.event_bus import call_events
+from app.services.recording_store import get_recording_store
 from app.services.voice_service import VoiceService
 from app.services.intent_service import IntentService
+from app.utils.audio import is_wav
+from app.utils.config import get_settings
+from app.utils.responses import FastJSONResponse
 
 router = APIRouter(prefix="/calls", tags=["Calls"])
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+def _parse_fields(fields: Optional[str], default: List[str]) -> List[str]:
+    """Parse a comma-separated `fields` query parameter into a projection"""
+    requested = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    try:
+        return CallService.resolve_fields(requested, default)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _parse_includes(include: Optional[str]) -> List[str]:
+    """Parse a comma-separated `include` query parameter into related rows to load"""
+    requested = [child.strip() for child in include.split(",") if child.strip()] if include else []
+    try:
+        return CallService.resolve_includes(requested)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _call_response_data(call: Call, fields: List[str], include: List[str] = ()) -> dict:
+    """
+    Collect the projected fields and included related rows of a call for a response
+    
+    The data comes straight from the database, so routes return it through
+    FastJSONResponse instead of validating it again as CallResponse models.
+    """
+    data = {field: getattr(call, field) for field in fields}
+    
+    if "transcript" not in fields:
+        data["transcript_length"] = call.transcript_length
+        data["transcript_snippet"] = call.transcript_snippet
+    
+    for child in include:
+        data[child] = [serialize_row(row) for row in getattr(call, child)]
+    
+    return data
+
+def _parse_byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range: bytes=...` header into inclusive offsets
+    
+    Returns None when the whole content should be sent, including for
+    multi-range requests, which the response may ignore. Raises a 416
+    HTTPException when the range can't be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
 
 @router.post("/outbound", response_model=CallResponse)
 async def create_outbound_call(
@@ -212,66 +284,179 @@ async def create_outbound_call(
         logger.error(f"Error creating outbound call: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{call_id}", response_model=CallResponse)
+@router.get("/stream")
+async def stream_calls(
+    request: Request,
+    direction: Optional[str] = Query(None, description="Only send events for this call direction (inbound/outbound)"),
+    status: Optional[str] = Query(None, description="Only send events for calls in this status"),
+):
+    """
+    Live feed of call events as Server-Sent Events
+    
+    Sends call.created, call.status and call.transcript events as they happen.
+    A client that falls behind skips the oldest events and receives a
+    `lagged` event with the number it missed.
+    """
+    subscription = call_events.subscribe(direction=direction, status=status)
+    
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=settings.live_feed_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if subscription.dropped:
+                    yield f"event: lagged\ndata: {json.dumps({'dropped': subscription.dropped})}\n\n"
+                    subscription.dropped = 0
+                
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            call_events.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/search", response_model=List[CallSearchResult], response_model_exclude_unset=True)
+async def search_calls(
+    q: str = Query(..., min_length=1, description="Words to search for in call transcripts (English or Hindi)"),
+    skip: int = Query(0, description="Number of results to skip"),
+    limit: int = Query(20, description="Maximum number of results to return"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return (transcript is deferred by default)"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Search call transcripts
+    
+    Returns calls whose transcript contains all of the given words, best
+    matches first.
+    """
+    try:
+        projection = _parse_fields(fields, DEFAULT_LIST_FIELDS)
+        call_service = CallService(db)
+        results = await call_service.search_calls(q, skip=skip, limit=limit, fields=projection)
+        
+        return FastJSONResponse([
+            {**_call_response_data(call, projection), "score": score}
+            for call, score in results
+        ])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching calls: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{call_id}/recordings/{recording_id}/audio")
+async def get_recording_audio(
+    request: Request,
+    call_id: int = Path(..., description="The ID of the call"),
+    recording_id: int = Path(..., description="The ID of the recording"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Get the audio of a call recording
+    
+    Audio is served from the local recording store and supports byte-range
+    requests, so players can seek without downloading the whole file.
+    Recordings that were never fetched, or have since been evicted, return 404.
+    """
+    try:
+        recording = db.query(Recording).filter(Recording.id == recording_id, Recording.call_id == call_id).first()
+        if not recording or not recording.content_hash:
+            raise HTTPException(status_code=404, detail="Recording not found")
+        
+        store = get_recording_store()
+        size = store.size(recording.content_hash)
+        if size is None:
+            raise HTTPException(status_code=404, detail="Recording audio is no longer stored")
+        
+        byte_range = _parse_byte_range(request.headers.get("range"), size)
+        start, end = byte_range or (0, size - 1)
+        data = await asyncio.to_thread(store.read_range, recording.content_hash, start, end + 1)
+        if data is None:
+            raise HTTPException(status_code=404, detail="Recording audio is no longer stored")
+        
+        header = data[:12] if start == 0 else store.read_range(recording.content_hash, 0, 12) or b""
+        headers = {"Accept-Ranges": "bytes"}
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        
+        return Response(
+            content=data,
+            status_code=206 if byte_range else 200,
+            media_type="audio/wav" if is_wav(header) else "audio/mpeg",
+            headers=headers
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving recording audio: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{call_id}", response_model=CallResponse, response_model_exclude_unset=True)
+@query_budget(5)
 async def get_call_details(
     call_id: int = Path(..., description="The ID of the call to retrieve"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return (default: all)"),
+    include: Optional[str] = Query(None, description="Comma-separated related rows to return (recordings,actions,tickets)"),
+    db: Session = Depends(get_read_db)
 ):
     """
     Get details for a specific call
+    
+    Each included relationship is loaded in one extra query.
     """
     try:
+        projection = _parse_fields(fields, DEFAULT_DETAIL_FIELDS)
+        includes = _parse_includes(include)
         call_service = CallService(db)
-        call = await call_service.get_call(call_id)
+        call = await call_service.get_call(call_id, fields=projection, include=includes)
         
         if not call:
             raise HTTPException(status_code=404, detail="Call not found")
         
-        return CallResponse(
-            id=call.id,
-            status=call.status,
-            phone_number=call.phone_number,
-            direction=call.direction,
-            duration=call.duration,
-            transcript=call.transcript,
-            intent=call.intent,
-            created_at=call.created_at,
-            updated_at=call.updated_at
-        )
+        return FastJSONResponse(_call_response_data(call, projection, includes))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error retrieving call details: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[CallResponse])
+@router.get("/", response_model=List[CallResponse], response_model_exclude_unset=True)
+@query_budget(4)
 async def list_calls(
     skip: int = Query(0, description="Number of records to skip"),
-    limit: int = Query(100, description="Maximum number of records to return"),
+    # Up to 500 calls, as many as selectinload loads children of per query
+    limit: int = Query(100, le=500, description="Maximum number of records to return (at most 500)"),
     direction: Optional[str] = Query(None, description="Filter by call direction (inbound/outbound)"),
     status: Optional[str] = Query(None, description="Filter by call status"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return (transcript is deferred by default)"),
+    include: Optional[str] = Query(None, description="Comma-separated related rows to return (recordings,actions,tickets)"),
+    db: Session = Depends(get_read_db)
 ):
     """
     List all calls with optional filtering
+    
+    Transcripts are not returned by default; each call carries the transcript
+    length and a short snippet instead. Pass `fields=...,transcript` to get the
+    full text. Each included relationship is loaded for the whole page in one
+    extra query.
     """
     try:
+        projection = _parse_fields(fields, DEFAULT_LIST_FIELDS)
+        includes = _parse_includes(include)
         call_service = CallService(db)
-        calls = await call_service.list_calls(skip=skip, limit=limit, direction=direction, status=status)
+        calls = await call_service.list_calls(skip=skip, limit=limit, direction=direction, status=status, fields=projection, include=includes)
         
-        return [
-            CallResponse(
-                id=call.id,
-                status=call.status,
-                phone_number=call.phone_number,
-                direction=call.direction,
-                duration=call.duration,
-                transcript=call.transcript,
-                intent=call.intent,
-                created_at=call.created_at,
-                updated_at=call.updated_at
-            ) for call in calls
-        ]
+        return FastJSONResponse([_call_response_data(call, projection, includes) for call in calls])
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing calls: {e}")
         raise HTTPException(status_code=500, detail=str(e)) 
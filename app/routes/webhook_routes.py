@@ -1,18 +1,55 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, BackgroundTasks
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Awaitable, Callable
 
 from app.database.db import get_db
+from app.database.query_monitor import query_budget
 from app.services.call_service import CallService
 from app.services.voice_service import VoiceService
 from app.services.intent_service import IntentService
+from app.services.webhook_idempotency import StoredResponse, WebhookKey, webhook_idempotency
 from app.schemas.webhook import TwilioWebhookRequest, VapiWebhookRequest
 
 router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
 logger = logging.getLogger(__name__)
 
+async def _handle_once(db: Session, key: WebhookKey, provider: str, handler: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    Run a webhook handler unless this delivery has been handled before
+    
+    A retried delivery gets the stored response of the first one, and neither
+    the handler nor the background work it queues runs again. If the handler
+    fails, the claim is released so the provider's next retry is processed.
+    """
+    try:
+        stored = webhook_idempotency.claim(db, key)
+    except Exception as e:
+        logger.error(f"Error checking {provider} webhook {key}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if stored is not None:
+        logger.info(f"Replaying response to duplicate {provider} webhook {key}")
+        return Response(content=stored.body, status_code=stored.status_code, media_type=stored.media_type)
+    
+    try:
+        result = await handler()
+        response = result if isinstance(result, Response) else JSONResponse(content=result)
+        webhook_idempotency.complete(
+            db, key, StoredResponse(response.status_code, response.media_type, bytes(response.body).decode("utf-8"))
+        )
+        return response
+    except HTTPException:
+        webhook_idempotency.release(db, key)
+        raise
+    except Exception as e:
+        webhook_idempotency.release(db, key)
+        logger.error(f"Error processing {provider} webhook: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/twilio")
+@query_budget(15)
 async def twilio_webhook(
     request: Request,
     background_tasks: BackgroundTasks,
@@ -25,64 +62,72 @@ async def twilio_webhook(
     call status updates. It processes these events and updates the call records
     accordingly.
     """
-    try:
-        form_data = await request.form()
-        data = dict(form_data)
+    form_data = await request.form()
+    data = dict(form_data)
+    
+    # Extract Twilio call SID and event type
+    call_sid = data.get("CallSid")
+    event_type = data.get("CallStatus")
+    
+    if not call_sid:
+        raise HTTPException(status_code=400, detail="Missing CallSid parameter")
+    
+    # "initiated" and "ringing" both create the call, so a ringing event after
+    # an initiated one is answered like a retry of it. Twilio numbers every
+    # status callback, so the sequence is left out of the key of those two
+    if event_type in ("initiated", "ringing"):
+        key = ("twilio", call_sid, "initiated", "")
+    else:
+        key = ("twilio", call_sid, event_type or "", data.get("SequenceNumber") or "")
+    
+    return await _handle_once(db, key, "Twilio", lambda: _process_twilio_event(data, background_tasks, db))
+
+async def _process_twilio_event(data: Dict[str, Any], background_tasks: BackgroundTasks, db: Session) -> Any:
+    call_service = CallService(db)
+    voice_service = VoiceService()
+    
+    call_sid = data.get("CallSid")
+    event_type = data.get("CallStatus")
+    logger.info(f"Received Twilio webhook: {event_type} for call {call_sid}")
+    
+    if event_type == "initiated" or event_type == "ringing":
+        # New inbound call
+        phone_number = data.get("From")
+        to_number = data.get("To")
         
-        call_service = CallService(db)
-        voice_service = VoiceService()
-        intent_service = IntentService()
+        # Create a new call record
+        call = await call_service.create_inbound_call(
+            call_sid=call_sid,
+            phone_number=phone_number,
+            to_number=to_number
+        )
         
-        # Extract Twilio call SID and event type
-        call_sid = data.get("CallSid")
-        event_type = data.get("CallStatus")
+        # Prepare TwiML response for the call
+        twiml_response = voice_service.generate_twilio_welcome_twiml()
+        return twiml_response
         
-        if not call_sid:
-            raise HTTPException(status_code=400, detail="Missing CallSid parameter")
+    elif event_type == "in-progress":
+        # Call is in progress, prepare to capture speech
+        return voice_service.generate_twilio_gather_twiml()
         
-        logger.info(f"Received Twilio webhook: {event_type} for call {call_sid}")
+    elif event_type == "completed":
+        # Call is completed, process the recording if available
+        recording_url = data.get("RecordingUrl")
         
-        if event_type == "initiated" or event_type == "ringing":
-            # New inbound call
-            phone_number = data.get("From")
-            to_number = data.get("To")
-            
-            # Create a new call record
-            call = await call_service.create_inbound_call(
+        if recording_url:
+            background_tasks.add_task(
+                call_service.process_recording,
                 call_sid=call_sid,
-                phone_number=phone_number,
-                to_number=to_number
+                recording_url=recording_url
             )
-            
-            # Prepare TwiML response for the call
-            twiml_response = voice_service.generate_twilio_welcome_twiml()
-            return twiml_response
-            
-        elif event_type == "in-progress":
-            # Call is in progress, prepare to capture speech
-            return voice_service.generate_twilio_gather_twiml()
-            
-        elif event_type == "completed":
-            # Call is completed, process the recording if available
-            recording_url = data.get("RecordingUrl")
-            
-            if recording_url:
-                background_tasks.add_task(
-                    call_service.process_recording,
-                    call_sid=call_sid,
-                    recording_url=recording_url
-                )
-            
-            # Update call status
-            await call_service.update_call_status(call_sid=call_sid, status="completed")
-            
-        return {"status": "success"}
-    
-    except Exception as e:
-        logger.error(f"Error processing Twilio webhook: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        
+        # Update call status
+        await call_service.update_call_status(call_sid=call_sid, status="completed")
+        
+    return {"status": "success"}
 
 @router.post("/vapi")
+@query_budget(15)
 async def vapi_webhook(
     webhook_data: VapiWebhookRequest,
     background_tasks: BackgroundTasks,
@@ -94,57 +139,61 @@ async def vapi_webhook(
     This endpoint receives webhook events from Vapi for inbound/outbound calls
     and processes them accordingly.
     """
-    try:
-        call_service = CallService(db)
-        voice_service = VoiceService()
-        intent_service = IntentService()
-        
-        event_type = webhook_data.event
-        call_id = webhook_data.call_id
-        
-        logger.info(f"Received Vapi webhook: {event_type} for call {call_id}")
-        
-        if event_type == "call.started":
-            # New call started
-            if webhook_data.direction == "inbound":
-                # Create a new inbound call record
-                call = await call_service.create_inbound_call(
-                    call_sid=call_id,
-                    phone_number=webhook_data.from_number,
-                    to_number=webhook_data.to_number
-                )
-                
-                # Return assistant configuration
-                return voice_service.generate_vapi_assistant_config(language=webhook_data.language or "en")
-                
-        elif event_type == "call.completed":
-            # Call is completed
-            transcript = webhook_data.transcript
+    metadata = webhook_data.metadata or {}
+    # A call is started once, however its deliveries are numbered
+    sequence = "" if webhook_data.event == "call.started" else str(metadata.get("sequence", ""))
+    key = ("vapi", webhook_data.call_id, webhook_data.event, sequence)
+    return await _handle_once(db, key, "Vapi", lambda: _process_vapi_event(webhook_data, background_tasks, db))
+
+async def _process_vapi_event(webhook_data: VapiWebhookRequest, background_tasks: BackgroundTasks, db: Session) -> Any:
+    call_service = CallService(db)
+    voice_service = VoiceService()
+    intent_service = IntentService()
+    
+    event_type = webhook_data.event
+    call_id = webhook_data.call_id
+    
+    logger.info(f"Received Vapi webhook: {event_type} for call {call_id}")
+    
+    if event_type == "call.started":
+        # New call started
+        if webhook_data.direction == "inbound":
+            # Create a new inbound call record
+            call = await call_service.create_inbound_call(
+                call_sid=call_id,
+                phone_number=webhook_data.from_number,
+                to_number=webhook_data.to_number
+            )
             
-            if transcript:
-                # Process transcript and extract intent
-                intent = await intent_service.extract_intent(transcript)
-                
-                # Update call record with transcript and intent
-                await call_service.update_call_with_transcript(
-                    call_sid=call_id,
-                    transcript=transcript,
-                    intent=intent,
-                    duration=webhook_data.duration
-                )
-                
-                # Process any follow-up actions based on intent
-                background_tasks.add_task(
-                    call_service.process_intent_actions,
-                    call_id=call_id,
-                    intent=intent
-                )
+            # Return assistant configuration
+            return voice_service.generate_vapi_assistant_config(language=webhook_data.language or "en")
             
-            # Update call status
-            await call_service.update_call_status(call_sid=call_id, status="completed")
+    elif event_type == "call.completed":
+        # Call is completed
+        transcript = webhook_data.transcript
+        
+        if transcript:
+            # Process transcript and extract intent
+            intent = await intent_service.extract_intent(transcript)
+            language = webhook_data.language or await intent_service.detect_language(transcript)
             
-        return {"status": "success"}
-    
-    except Exception as e:
-        logger.error(f"Error processing Vapi webhook: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+            # Update call record with transcript, intent and language
+            await call_service.update_call_with_transcript(
+                call_sid=call_id,
+                transcript=transcript,
+                intent=intent,
+                duration=webhook_data.duration,
+                language=language
+            )
+            
+            # Process any follow-up actions based on intent
+            background_tasks.add_task(
+                call_service.process_intent_actions,
+                call_id=call_id,
+                intent=intent
+            )
+        
+        # Update call status
+        await call_service.update_call_status(call_sid=call_id, status="completed")
+        
+    return {"status": "success"}
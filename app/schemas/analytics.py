@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+from datetime import datetime
 
 class CallMetrics(BaseModel):
     total_calls: int
@@ -18,4 +19,99 @@ class CallAnalytics(BaseModel):
     metrics: CallMetrics
     intents: List[IntentSummary]
     call_volume_by_day: Dict[str, int]
-    call_duration_by_intent: Dict[str, float]
\ No newline at end of file
+    call_duration_by_intent: Dict[str, float]
+
+class DurationStats(BaseModel):
+    count: int
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+    max: float
+    histogram: List[int]  # Calls per bucket of DurationAnalytics.histogram_edges
+
+class DurationAnalytics(BaseModel):
+    histogram_edges: List[float]  # Bucket i holds durations from edge i-1 (or 0) up to edge i; the last bucket is open-ended
+    overall: Optional[DurationStats] = None
+    by_intent: Dict[str, DurationStats]
+    by_direction: Dict[str, DurationStats]
+    by_hour: Dict[int, DurationStats]  # Hour of day (UTC) the call started
+
+class LiveCallMetrics(BaseModel):
+    window_seconds: int
+    calls_started: int
+    calls_started_per_second: List[int]  # Oldest second first
+    by_direction: Dict[str, int]  # Calls started
+    by_status: Dict[str, int]  # Calls that moved into each status
+    by_intent: Dict[str, int]  # Intents detected; keys that didn't fit are counted as "other"
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    status_code: Optional[int] = None
+    trigger: str  # "header" or "sampled"
+    started_at: float  # Unix time
+    duration_ms: float
+    samples: int
+    pid: int
+
+class PoolStats(BaseModel):
+    pool: str
+    size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    saturation: float
+    peak_checked_out: int
+    checkouts: int
+    timeouts: int
+    average_wait_ms: float
+    max_wait_ms: float
+    longest_checkout_ms: float
+
+class WorkerStats(BaseModel):
+    slot: int
+    pid: int
+    alive: bool
+    uptime_seconds: float
+    heartbeat_age_seconds: float
+    requests: int
+    in_flight: int
+    current: bool  # Whether this worker served the request
+
+class CallbackSchedulerStats(BaseModel):
+    running: bool  # False in workers other than the one dialing callbacks
+    queued: int
+    next_due_in_seconds: Optional[float] = None
+    in_calling_hours: bool
+    in_flight: int
+    dialed: int
+    completed: int
+    failed: int
+    skipped: int  # Cancelled or claimed elsewhere before they were dialed
+
+class IntentStageStats(BaseModel):
+    stage: str
+    count: int
+    rate: float
+
+class ImportJobStatus(BaseModel):
+    id: int
+    source: str
+    format: str
+    classify_intents: bool
+    status: str  # running, completed or failed
+    rows: int  # Records read so far, rejected ones included
+    calls: int
+    recordings: int
+    actions: int
+    tickets: int
+    rejected: int
+    intents_classified: int
+    elapsed_seconds: float
+    rows_per_second: float
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
\ No newline at end of file
@@ -33,6 +33,43 @@ class InboundCallResponse(BaseModel):
     status: CallStatus
     message: str = Field("Inbound call received")
 
+class RecordingResponse(BaseModel):
+    id: int
+    call_id: int
+    recording_url: str
+    duration: Optional[float] = None
+    transcript: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class CallActionResponse(BaseModel):
+    id: int
+    call_id: int
+    action_type: str
+    details: Optional[str] = None
+    status: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class TicketResponse(BaseModel):
+    id: int
+    call_id: int
+    ticket_number: str
+    subject: Optional[str] = None
+    description: Optional[str] = None
+    status: str
+    assigned_to: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 class CallResponse(BaseModel):
     id: int
     status: CallStatus
@@ -40,28 +77,25 @@ class CallResponse(BaseModel):
     direction: Optional[CallDirection] = None
     duration: Optional[float] = None
     transcript: Optional[str] = None
+    transcript_length: Optional[int] = Field(None, description="Transcript length when the full text is not returned")
+    transcript_snippet: Optional[str] = Field(None, description="Start of the transcript when the full text is not returned")
     intent: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     message: Optional[str] = None
+    recordings: Optional[List[RecordingResponse]] = Field(None, description="Returned with include=recordings")
+    actions: Optional[List[CallActionResponse]] = Field(None, description="Returned with include=actions")
+    tickets: Optional[List[TicketResponse]] = Field(None, description="Returned with include=tickets")
     
     class Config:
         from_attributes = True
 
+class CallSearchResult(CallResponse):
+    score: float = Field(..., description="Relevance score, higher is better")
+
 
 class RecordingCreate(BaseModel):
     call_id: int
     recording_sid: Optional[str] = None
     recording_url: str
     duration: Optional[float] = None
-
-class RecordingResponse(BaseModel):
-    id: int
-    call_id: int
-    recording_url: str
-    duration: Optional[float] = None
-    transcript: Optional[str] = None
-    created_at: datetime
-    
-    class Config:
-        from_attributes = True
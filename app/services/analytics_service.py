@@ -1,17 +1,98 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc, cast, Float
+from sqlalchemy import func, and_, desc, cast, Float, String, extract, select, type_coerce
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 
+import numpy as np
+
 from app.models.database import Call, CallAction, CallDirection, CallStatus
-from app.schemas.analytics import CallMetrics, IntentSummary, CallAnalytics
+from app.schemas.analytics import CallMetrics, IntentSummary, CallAnalytics, DurationStats, DurationAnalytics
+from app.services.archive_service import ArchiveService, record_created_at
 
 logger = logging.getLogger(__name__)
 
+# Upper edges in seconds of the call duration histogram buckets, plus an open-ended last bucket
+DURATION_HISTOGRAM_EDGES = [15, 30, 60, 120, 300, 600, 1200, 1800, 3600]
+
+# Rows converted to columns at a time when reading call durations
+DURATION_FETCH_BATCH_SIZE = 50000
+
+def _factorize(values: Tuple[Any, ...], codes: Dict[Any, int]) -> np.ndarray:
+    """Map values to int16 codes, adding unseen values to codes"""
+    return np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.int16, count=len(values))
+
+def grouped_duration_stats(durations: np.ndarray, groups: np.ndarray, group_count: int) -> List[Optional[DurationStats]]:
+    """
+    Duration percentiles, mean and histogram of each group
+
+    Args:
+        durations: float64 durations, sorted ascending
+        groups: int16 group code of each duration, in [0, group_count)
+        group_count: Number of groups
+
+    Returns:
+        Stats of each group code, None for groups without calls
+    """
+    # A stable sort by group keeps each group's durations sorted, and is a
+    # linear radix sort for int16 codes
+    grouping = np.argsort(groups, kind="stable")
+    ordered = durations[grouping]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sums = np.bincount(groups, weights=durations, minlength=group_count)
+
+    # Percentiles of every group at once, interpolating between the closest
+    # ranks like np.percentile
+    last = np.maximum(counts - 1, 0)
+    ranks = last[:, None] * np.array([0.5, 0.9, 0.99])[None, :]
+    lower = np.floor(ranks).astype(np.int64)
+    upper = np.minimum(lower + 1, last[:, None])
+    clip = max(len(ordered) - 1, 0)
+    low_values = ordered[np.minimum(starts[:, None] + lower, clip)] if len(ordered) else np.zeros_like(ranks)
+    high_values = ordered[np.minimum(starts[:, None] + upper, clip)] if len(ordered) else np.zeros_like(ranks)
+    percentiles = low_values + (high_values - low_values) * (ranks - lower)
+    maxima = ordered[np.minimum(starts + last, clip)] if len(ordered) else np.zeros(group_count)
+
+    buckets = len(DURATION_HISTOGRAM_EDGES) + 1
+    bins = np.searchsorted(DURATION_HISTOGRAM_EDGES, durations, side="right")
+    histograms = np.bincount(groups.astype(np.int64) * buckets + bins, minlength=group_count * buckets).reshape(group_count, buckets)
+
+    stats = []
+    for group in range(group_count):
+        if not counts[group]:
+            stats.append(None)
+            continue
+        p50, p90, p99 = percentiles[group]
+        stats.append(DurationStats(
+            count=int(counts[group]),
+            mean=round(float(sums[group] / counts[group]), 2),
+            p50=round(float(p50), 2),
+            p90=round(float(p90), 2),
+            p99=round(float(p99), 2),
+            max=round(float(maxima[group]), 2),
+            histogram=histograms[group].tolist()
+        ))
+    return stats
+
 class AnalyticsService:
     def __init__(self, db: Session):
         self.db = db
+        self.archive_service = ArchiveService(db)
+    
+    def _build_intent_summary(self, intent_counts: Dict[str, int], total_calls: int) -> List[IntentSummary]:
+        """Build intent summaries ordered by count"""
+        intent_summary = []
+        for intent, count in sorted(intent_counts.items(), key=lambda item: item[1], reverse=True):
+            if not intent:
+                continue
+            percentage = (count / total_calls) * 100 if total_calls > 0 else 0
+            intent_summary.append(IntentSummary(
+                intent=intent,
+                count=count,
+                percentage=round(percentage, 2)
+            ))
+        return intent_summary
     
     async def get_call_analytics(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> CallAnalytics:
         """Get call analytics within a specified date range"""
@@ -26,39 +107,41 @@ class AnalyticsService:
                 Call.created_at < end_datetime
             )
             
+            # Aggregates of archived calls in the range, merged with the hot tables below
+            archived = self.archive_service.get_archived_summary(start_datetime, end_datetime)
+            
             # Get basic metrics
-            total_calls = self.db.query(func.count(Call.id)).filter(date_filter).scalar() or 0
-            inbound_calls = self.db.query(func.count(Call.id)).filter(
+            total_calls = (self.db.query(func.count(Call.id)).filter(date_filter).scalar() or 0) + archived["total_calls"]
+            inbound_calls = (self.db.query(func.count(Call.id)).filter(
                 date_filter, Call.direction == CallDirection.INBOUND
-            ).scalar() or 0
-            outbound_calls = self.db.query(func.count(Call.id)).filter(
+            ).scalar() or 0) + archived["inbound_calls"]
+            outbound_calls = (self.db.query(func.count(Call.id)).filter(
                 date_filter, Call.direction == CallDirection.OUTBOUND
-            ).scalar() or 0
-            avg_duration = self.db.query(func.avg(Call.duration)).filter(date_filter).scalar() or 0
-            completed_calls = self.db.query(func.count(Call.id)).filter(
+            ).scalar() or 0) + archived["outbound_calls"]
+            duration_sum, duration_count = self.db.query(
+                func.sum(Call.duration), func.count(Call.duration)
+            ).filter(date_filter).one()
+            duration_sum = (duration_sum or 0) + archived["duration_sum"]
+            duration_count = (duration_count or 0) + archived["duration_count"]
+            avg_duration = duration_sum / duration_count if duration_count else 0
+            completed_calls = (self.db.query(func.count(Call.id)).filter(
                 date_filter, Call.status == CallStatus.COMPLETED
-            ).scalar() or 0
-            failed_calls = self.db.query(func.count(Call.id)).filter(
+            ).scalar() or 0) + archived["completed_calls"]
+            failed_calls = (self.db.query(func.count(Call.id)).filter(
                 date_filter, Call.status == CallStatus.FAILED
-            ).scalar() or 0
+            ).scalar() or 0) + archived["failed_calls"]
             
             # Get intent summary
             intents_query = self.db.query(
                 Call.intent, func.count(Call.id).label("count")
             ).filter(
                 date_filter, Call.intent.isnot(None)
-            ).group_by(Call.intent).order_by(desc("count")).all()
+            ).group_by(Call.intent).all()
             
-            intent_summary = []
+            intent_counts = {intent: stats["count"] for intent, stats in archived["intents"].items()}
             for intent, count in intents_query:
-                if not intent:
-                    continue
-                percentage = (count / total_calls) * 100 if total_calls > 0 else 0
-                intent_summary.append(IntentSummary(
-                    intent=intent,
-                    count=count,
-                    percentage=round(percentage, 2)
-                ))
+                intent_counts[intent] = intent_counts.get(intent, 0) + count
+            intent_summary = self._build_intent_summary(intent_counts, total_calls)
             
             # Get call volume by day
             call_volume_query = self.db.query(
@@ -66,20 +149,31 @@ class AnalyticsService:
                 func.count(Call.id).label("count")
             ).filter(date_filter).group_by("date").order_by("date").all()
             
-            call_volume_by_day = {
-                str(date): count for date, count in call_volume_query
-            }
+            call_volume_by_day = dict(archived["call_volume_by_day"])
+            for date, count in call_volume_query:
+                call_volume_by_day[str(date)] = call_volume_by_day.get(str(date), 0) + count
+            call_volume_by_day = dict(sorted(call_volume_by_day.items()))
             
             # Get average duration by intent
             duration_by_intent_query = self.db.query(
                 Call.intent,
-                func.avg(Call.duration).label("avg_duration")
+                func.sum(Call.duration).label("duration_sum"),
+                func.count(Call.duration).label("duration_count")
             ).filter(
                 date_filter, Call.intent.isnot(None), Call.duration > 0
             ).group_by(Call.intent).all()
             
+            duration_by_intent = {
+                intent: [stats["duration_sum"], stats["duration_count"]]
+                for intent, stats in archived["intents"].items() if stats["duration_count"]
+            }
+            for intent, intent_duration_sum, intent_duration_count in duration_by_intent_query:
+                totals = duration_by_intent.setdefault(intent, [0.0, 0])
+                totals[0] += float(intent_duration_sum)
+                totals[1] += intent_duration_count
+            
             call_duration_by_intent = {
-                intent: round(float(avg_duration), 2) for intent, avg_duration in duration_by_intent_query if intent
+                intent: round(total / count, 2) for intent, (total, count) in duration_by_intent.items() if intent
             }
             
             # Construct the response
@@ -116,6 +210,100 @@ class AnalyticsService:
                 call_duration_by_intent={}
             )
     
+    def _duration_columns(self, start_datetime: datetime, end_datetime: datetime) -> Dict[str, Any]:
+        """
+        Durations, start hours and intent and direction codes of answered
+        calls in a range, hot and archived, as NumPy arrays
+        """
+        intent_codes: Dict[Any, int] = {}
+        direction_codes: Dict[Any, int] = {}
+        chunks: List[Tuple[np.ndarray, ...]] = []
+        
+        def add_chunk(rows: List[Tuple[Any, ...]]) -> None:
+            durations, intents, directions, hours = zip(*rows)
+            chunks.append((
+                np.array(durations, dtype=np.float64),
+                _factorize(intents, intent_codes),
+                _factorize(directions, direction_codes),
+                np.array(hours, dtype=np.int16)
+            ))
+        
+        # Executed on the connection, so rows come back as plain tuples rather
+        # than through ORM loading, and converted to arrays a batch at a time
+        result = self.db.connection().execute(
+            select(
+                Call.duration,
+                Call.intent,
+                # The raw value, skipping the per-row conversion to CallDirection
+                type_coerce(Call.direction, String),
+                extract("hour", Call.created_at)
+            ).where(
+                Call.created_at >= start_datetime,
+                Call.created_at < end_datetime,
+                Call.duration > 0
+            )
+        )
+        for partition in result.partitions(DURATION_FETCH_BATCH_SIZE):
+            add_chunk(partition)
+        
+        archived = []
+        for record in self.archive_service.iter_archived_records(start_datetime, end_datetime):
+            if record["duration"] and record["duration"] > 0:
+                archived.append((
+                    record["duration"],
+                    record["intent"],
+                    # Archives hold the enum value, the table its name
+                    CallDirection(record["direction"]).name if record["direction"] else None,
+                    record_created_at(record).hour
+                ))
+        if archived:
+            add_chunk(archived)
+        
+        empty = (np.zeros(0), np.zeros(0, dtype=np.int16), np.zeros(0, dtype=np.int16), np.zeros(0, dtype=np.int16))
+        durations, intents, directions, hours = (np.concatenate(column) for column in zip(empty, *chunks))
+        return {
+            "durations": durations,
+            "intents": intents,
+            "intent_values": list(intent_codes),
+            "directions": directions,
+            "direction_values": list(direction_codes),
+            "hours": hours,
+        }
+    
+    async def get_duration_analytics(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> DurationAnalytics:
+        """
+        Get percentiles and histograms of the duration of answered calls
+        within a date range, overall and by intent, direction and hour of day
+        
+        The range is read as columns in one query and aggregated with
+        vectorized NumPy operations: one sort by duration, then a linear
+        sort per breakdown.
+        """
+        start_datetime = datetime.strptime(start_date, "%Y-%m-%d") if start_date else datetime.now() - timedelta(days=30)
+        end_datetime = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1) if end_date else datetime.now()
+        
+        columns = self._duration_columns(start_datetime, end_datetime)
+        intent_values = columns["intent_values"]
+        direction_values = columns["direction_values"]
+        
+        order = np.argsort(columns["durations"])
+        durations = columns["durations"][order]
+        
+        overall = grouped_duration_stats(durations, np.zeros(len(durations), dtype=np.int16), 1)[0]
+        by_intent = grouped_duration_stats(durations, columns["intents"][order], len(intent_values))
+        by_direction = grouped_duration_stats(durations, columns["directions"][order], len(direction_values))
+        by_hour = grouped_duration_stats(durations, columns["hours"][order], 24)
+        
+        return DurationAnalytics(
+            histogram_edges=DURATION_HISTOGRAM_EDGES,
+            overall=overall,
+            by_intent={intent: stats for intent, stats in zip(intent_values, by_intent) if intent},
+            by_direction={
+                CallDirection[direction].value: stats for direction, stats in zip(direction_values, by_direction) if direction
+            },
+            by_hour={hour: stats for hour, stats in enumerate(by_hour) if stats}
+        )
+    
     async def get_intent_summary(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[IntentSummary]:
         """Get summary of detected intents within a specified date range"""
         try:
@@ -129,26 +317,22 @@ class AnalyticsService:
                 Call.created_at < end_datetime
             )
             
+            archived = self.archive_service.get_archived_summary(start_datetime, end_datetime)
+            
             # Get total calls
-            total_calls = self.db.query(func.count(Call.id)).filter(date_filter).scalar() or 0
+            total_calls = (self.db.query(func.count(Call.id)).filter(date_filter).scalar() or 0) + archived["total_calls"]
             
             # Get intent summary
             intents_query = self.db.query(
                 Call.intent, func.count(Call.id).label("count")
             ).filter(
                 date_filter, Call.intent.isnot(None)
-            ).group_by(Call.intent).order_by(desc("count")).all()
+            ).group_by(Call.intent).all()
             
-            intent_summary = []
+            intent_counts = {intent: stats["count"] for intent, stats in archived["intents"].items()}
             for intent, count in intents_query:
-                if not intent:
-                    continue
-                percentage = (count / total_calls) * 100 if total_calls > 0 else 0
-                intent_summary.append(IntentSummary(
-                    intent=intent,
-                    count=count,
-                    percentage=round(percentage, 2)
-                ))
+                intent_counts[intent] = intent_counts.get(intent, 0) + count
+            intent_summary = self._build_intent_summary(intent_counts, total_calls)
             
             return intent_summary
             
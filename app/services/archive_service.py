@@ -0,0 +1,282 @@
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import Date, DateTime, Enum
+from collections import defaultdict
+from datetime import datetime, date, time, timedelta, timezone
+from typing import List, Optional, Dict, Any, Iterator
+import enum
+import gzip
+import json
+import logging
+import os
+
+from app.database.search_index import index_transcript
+from app.models.database import (
+    Call, Recording, CallAction, Ticket, ArchivePartition, CallDirection, CallStatus
+)
+from app.utils.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+def serialize_row(row) -> Dict[str, Any]:
+    """Convert a model instance to a JSON-compatible dict of its columns"""
+    record = {}
+    for column in row.__table__.columns:
+        value = getattr(row, column.key)
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, enum.Enum):
+            value = value.value
+        record[column.key] = value
+    return record
+
+def _naive_utc(value: datetime) -> datetime:
+    """
+    Compare timestamps like SQLite stores them: naive UTC
+
+    Postgres returns timestamptz values with an offset, so partitions
+    archived from it carry ISO strings with one.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def record_created_at(record: Dict[str, Any]) -> datetime:
+    """Creation time of an archived call record, as naive UTC"""
+    return _naive_utc(datetime.fromisoformat(record["created_at"]))
+
+def _deserialize_row(model, record: Dict[str, Any]):
+    """Build a detached model instance from a record written by serialize_row"""
+    values = {}
+    for column in model.__table__.columns:
+        value = record.get(column.key)
+        if value is not None:
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, Date):
+                value = date.fromisoformat(value)
+            elif isinstance(column.type, Enum) and column.type.enum_class:
+                value = column.type.enum_class(value)
+        values[column.key] = value
+    return model(**values)
+
+def _empty_summary() -> Dict[str, Any]:
+    return {
+        "total_calls": 0,
+        "inbound_calls": 0,
+        "outbound_calls": 0,
+        "completed_calls": 0,
+        "failed_calls": 0,
+        "duration_sum": 0.0,
+        "duration_count": 0,
+        "intents": {},
+        "call_volume_by_day": {},
+    }
+
+def _summarize_calls(day: date, calls: List[Call]) -> Dict[str, Any]:
+    """Pre-aggregate a partition the same way AnalyticsService aggregates hot calls"""
+    summary = _empty_summary()
+    summary["call_volume_by_day"][day.isoformat()] = len(calls)
+
+    for call in calls:
+        summary["total_calls"] += 1
+        summary["inbound_calls"] += call.direction == CallDirection.INBOUND
+        summary["outbound_calls"] += call.direction == CallDirection.OUTBOUND
+        summary["completed_calls"] += call.status == CallStatus.COMPLETED
+        summary["failed_calls"] += call.status == CallStatus.FAILED
+
+        if call.duration is not None:
+            summary["duration_sum"] += call.duration
+            summary["duration_count"] += 1
+
+        if call.intent:
+            intent = summary["intents"].setdefault(call.intent, {"count": 0, "duration_sum": 0.0, "duration_count": 0})
+            intent["count"] += 1
+            if call.duration and call.duration > 0:
+                intent["duration_sum"] += call.duration
+                intent["duration_count"] += 1
+
+    return summary
+
+def merge_summaries(target: Dict[str, Any], summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Add one partition summary into another"""
+    for key in ("total_calls", "inbound_calls", "outbound_calls", "completed_calls", "failed_calls", "duration_sum", "duration_count"):
+        target[key] += summary[key]
+
+    for intent, stats in summary["intents"].items():
+        merged = target["intents"].setdefault(intent, {"count": 0, "duration_sum": 0.0, "duration_count": 0})
+        for key, value in stats.items():
+            merged[key] += value
+
+    for day, count in summary["call_volume_by_day"].items():
+        target["call_volume_by_day"][day] = target["call_volume_by_day"].get(day, 0) + count
+
+    return target
+
+class ArchiveService:
+    """
+    Moves old calls out of the hot tables into compressed NDJSON files
+
+    Each file holds the calls of one day together with their recordings,
+    actions and tickets, and is listed in the archive_partitions manifest
+    with its call ID range and pre-computed analytics aggregates.
+    """
+    def __init__(self, db: Session):
+        self.db = db
+        self.archive_dir = settings.archive_dir
+
+    async def archive_calls(self, retention_days: Optional[int] = None, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Archive calls created before the retention window
+
+        Args:
+            retention_days: Age in days after which calls are archived
+            batch_size: Maximum number of calls moved per transaction
+
+        Returns:
+            Number of partitions written and rows moved per table
+        """
+        if retention_days is None:
+            retention_days = settings.archive_retention_days
+        # created_at is stored in UTC
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=retention_days)
+        report = {"partitions": 0, "calls": 0, "recordings": 0, "actions": 0, "tickets": 0}
+
+        while True:
+            calls = self.db.query(Call).options(
+                selectinload(Call.recordings), selectinload(Call.actions)
+            ).filter(Call.created_at < cutoff).order_by(Call.created_at, Call.id).limit(batch_size).all()
+            if not calls:
+                break
+
+            calls_by_day = defaultdict(list)
+            for call in calls:
+                calls_by_day[_naive_utc(call.created_at).date()].append(call)
+
+            for day, day_calls in calls_by_day.items():
+                self._archive_partition(day, day_calls, report)
+
+            self.db.expunge_all()
+
+        logger.info(f"Archived calls older than {cutoff.date()}: {report}")
+        return report
+
+    def _archive_partition(self, day: date, calls: List[Call], report: Dict[str, int]) -> None:
+        """Write one day's batch of calls to a partition file and remove them from the hot tables"""
+        call_ids = [call.id for call in calls]
+        tickets_by_call = defaultdict(list)
+        for ticket in self.db.query(Ticket).filter(Ticket.call_id.in_(call_ids)):
+            tickets_by_call[ticket.call_id].append(ticket)
+
+        relative_path = os.path.join(f"{day:%Y}", f"{day:%m}", f"calls-{day.isoformat()}-{min(call_ids)}-{max(call_ids)}.ndjson.gz")
+        path = os.path.join(self.archive_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file so a crash never leaves a partial partition
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as archive_file:
+            for call in calls:
+                record = serialize_row(call)
+                record["recordings"] = [serialize_row(recording) for recording in call.recordings]
+                record["actions"] = [serialize_row(action) for action in call.actions]
+                record["tickets"] = [serialize_row(ticket) for ticket in tickets_by_call[call.id]]
+                archive_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(path + ".tmp", path)
+
+        try:
+            conn = self.db.connection()
+            for call in calls:
+                if call.transcript:
+                    index_transcript(conn, call.id, None, previous_transcript=call.transcript)
+
+            report["recordings"] += self.db.query(Recording).filter(Recording.call_id.in_(call_ids)).delete(synchronize_session=False)
+            report["actions"] += self.db.query(CallAction).filter(CallAction.call_id.in_(call_ids)).delete(synchronize_session=False)
+            report["tickets"] += self.db.query(Ticket).filter(Ticket.call_id.in_(call_ids)).delete(synchronize_session=False)
+            report["calls"] += self.db.query(Call).filter(Call.id.in_(call_ids)).delete(synchronize_session=False)
+
+            self.db.add(ArchivePartition(
+                day=day,
+                path=relative_path,
+                call_count=len(calls),
+                min_call_id=min(call_ids),
+                max_call_id=max(call_ids),
+                summary=json.dumps(_summarize_calls(day, calls), ensure_ascii=False)
+            ))
+            self.db.commit()
+            report["partitions"] += 1
+        except Exception:
+            self.db.rollback()
+            os.remove(path)
+            raise
+
+    def _read_partition(self, partition: ArchivePartition) -> Iterator[Dict[str, Any]]:
+        with gzip.open(os.path.join(self.archive_dir, partition.path), "rt", encoding="utf-8") as archive_file:
+            for line in archive_file:
+                yield json.loads(line)
+
+    async def get_archived_call(self, call_id: int) -> Optional[Call]:
+        """
+        Load an archived call with its recordings, actions and tickets
+
+        Returns:
+            A detached Call instance or None if the call isn't archived
+        """
+        partitions = self.db.query(ArchivePartition).filter(
+            ArchivePartition.min_call_id <= call_id,
+            ArchivePartition.max_call_id >= call_id
+        ).all()
+
+        for partition in partitions:
+            for record in self._read_partition(partition):
+                if record["id"] == call_id:
+                    call = _deserialize_row(Call, record)
+                    call.recordings = [_deserialize_row(Recording, recording) for recording in record["recordings"]]
+                    call.actions = [_deserialize_row(CallAction, action) for action in record["actions"]]
+                    call.tickets = [_deserialize_row(Ticket, ticket) for ticket in record["tickets"]]
+                    return call
+
+        return None
+
+    def iter_archived_records(self, start_datetime: datetime, end_datetime: datetime) -> Iterator[Dict[str, Any]]:
+        """Stream archived call records created within a date range, oldest partition first"""
+        start_datetime, end_datetime = _naive_utc(start_datetime), _naive_utc(end_datetime)
+        last_day = (end_datetime - timedelta(microseconds=1)).date()
+        partitions = self.db.query(ArchivePartition).filter(
+            ArchivePartition.day >= start_datetime.date(),
+            ArchivePartition.day <= last_day
+        ).order_by(ArchivePartition.day, ArchivePartition.min_call_id).all()
+
+        for partition in partitions:
+            for record in self._read_partition(partition):
+                if start_datetime <= record_created_at(record) < end_datetime:
+                    yield record
+
+    def get_archived_summary(self, start_datetime: datetime, end_datetime: datetime) -> Dict[str, Any]:
+        """
+        Aggregate the archived calls created within a date range
+
+        Partitions of days the range covers in full contribute their
+        pre-computed aggregates; those of the partly covered first and
+        last day are read and filtered with the exact bounds, like the
+        hot tables are.
+        """
+        start_datetime, end_datetime = _naive_utc(start_datetime), _naive_utc(end_datetime)
+        last_day = (end_datetime - timedelta(microseconds=1)).date()
+        partitions = self.db.query(ArchivePartition).filter(
+            ArchivePartition.day >= start_datetime.date(),
+            ArchivePartition.day <= last_day
+        ).all()
+
+        summary = _empty_summary()
+        for partition in partitions:
+            day_start = datetime.combine(partition.day, time.min)
+            if start_datetime <= day_start and day_start + timedelta(days=1) <= end_datetime:
+                merge_summaries(summary, json.loads(partition.summary))
+                continue
+
+            calls = [
+                _deserialize_row(Call, record) for record in self._read_partition(partition)
+                if start_datetime <= record_created_at(record) < end_datetime
+            ]
+            if calls:
+                merge_summaries(summary, _summarize_calls(partition.day, calls))
+        return summary
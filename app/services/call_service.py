@@ -1,26 +1,87 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only, selectinload
 from sqlalchemy import and_, or_, desc
+from sqlalchemy.exc import IntegrityError
 import logging
-import uuid
 import requests
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 
+from app.database.search_index import index_transcript, search_transcripts
 from app.models.database import Call, Recording, CallAction, Ticket, CallDirection, CallStatus, ActionType
 from app.services.voice_service import VoiceService
 from app.services.intent_service import IntentService
+from app.services.archive_service import ArchiveService
+from app.services.event_bus import call_events
+from app.services.id_allocator import next_call_sid, next_ticket_number
+from app.services.live_metrics import get_live_metrics
 
 logger = logging.getLogger(__name__)
 
+# Call columns that can be requested through the `fields` projection
+CALL_FIELDS = {
+    "id": Call.id,
+    "status": Call.status,
+    "phone_number": Call.phone_number,
+    "direction": Call.direction,
+    "duration": Call.duration,
+    "transcript": Call.transcript,
+    "intent": Call.intent,
+    "created_at": Call.created_at,
+    "updated_at": Call.updated_at,
+}
+
+# Related rows that can be loaded with calls through `include`
+CALL_INCLUDES = {
+    "recordings": Call.recordings,
+    "actions": Call.actions,
+    "tickets": Call.tickets,
+}
+
+# List views defer the transcript and return its length and a snippet instead
+DEFAULT_LIST_FIELDS = [field for field in CALL_FIELDS if field != "transcript"]
+DEFAULT_DETAIL_FIELDS = list(CALL_FIELDS)
+
 class CallService:
     def __init__(self, db: Session):
         self.db = db
         self.voice_service = VoiceService()
         self.intent_service = IntentService()
+        self.archive_service = ArchiveService(db)
+    
+    def _publish(self, event_type: str, call: Call, status_changed: bool = False) -> None:
+        """
+        Count a committed call change in the live metrics and notify live feed subscribers
+        
+        status_changed marks a transcript update that also moved the call to a new status.
+        """
+        status = getattr(call.status, "value", call.status)
+        keys = []
+        if event_type == "call.created":
+            keys.append(f"created:{getattr(call.direction, 'value', call.direction)}")
+        if event_type in ("call.created", "call.status") or status_changed:
+            keys.append(f"status:{status}")
+        if event_type == "call.transcript" and call.intent:
+            keys.append(f"intent:{call.intent}")
+        get_live_metrics().record(*keys)
+        
+        if not call_events.subscriber_count:
+            return
+        
+        call_events.publish(
+            event_type,
+            call_id=call.id,
+            call_sid=call.call_sid,
+            direction=getattr(call.direction, "value", call.direction),
+            status=status,
+            intent=call.intent,
+            duration=call.duration,
+            transcript_length=call.transcript_length,
+            transcript_snippet=call.transcript_snippet
+        )
     
     async def create_outbound_call(self, phone_number: str, message: str, language: str = "en") -> Call:
         """Create a new outbound call record"""
-        call_sid = f"out_{uuid.uuid4().hex}"
+        call_sid = next_call_sid("out")
         call = Call(
             call_sid=call_sid,
             phone_number=phone_number,
@@ -30,13 +91,13 @@ class CallService:
         )
         self.db.add(call)
         self.db.commit()
-        self.db.refresh(call)
         
+        self._publish("call.created", call)
         logger.info(f"Created outbound call to {phone_number} with ID {call.id}")
         return call
     
     async def create_inbound_call(self, call_sid: str, phone_number: str, to_number: str) -> Call:
-        """Create a new inbound call record"""
+        """Create a new inbound call record, or return the existing call with this SID"""
         call = Call(
             call_sid=call_sid,
             phone_number=phone_number,
@@ -45,15 +106,77 @@ class CallService:
             status=CallStatus.INITIATED
         )
         self.db.add(call)
-        self.db.commit()
-        self.db.refresh(call)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # A repeated creating event the idempotency keys didn't catch
+            self.db.rollback()
+            existing = self.db.query(Call).filter(Call.call_sid == call_sid).first()
+            if existing is None:
+                raise
+            logger.info(f"Inbound call {call_sid} already exists with ID {existing.id}")
+            return existing
         
+        self._publish("call.created", call)
         logger.info(f"Created inbound call from {phone_number} with ID {call.id}")
         return call
     
-    async def get_call(self, call_id: int) -> Optional[Call]:
-        """Get call by ID"""
-        return self.db.query(Call).filter(Call.id == call_id).first()
+    @staticmethod
+    def resolve_fields(fields: Optional[List[str]], default: List[str]) -> List[str]:
+        """Validate a requested field projection, falling back to the default"""
+        if not fields:
+            return list(default)
+        
+        unknown = [field for field in fields if field not in CALL_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown call fields: {', '.join(unknown)}")
+        
+        # id and status are always required to build a call response
+        return ["id", "status"] + [field for field in fields if field not in ("id", "status")]
+    
+    @staticmethod
+    def resolve_includes(include: Optional[List[str]]) -> List[str]:
+        """Validate requested related rows"""
+        unknown = [child for child in include or [] if child not in CALL_INCLUDES]
+        if unknown:
+            raise ValueError(f"Unknown call includes: {', '.join(unknown)}")
+        return list(dict.fromkeys(include or []))
+    
+    def _projection_options(self, fields: List[str]) -> list:
+        """Build loader options that fetch only the projected call columns"""
+        columns = [CALL_FIELDS[field] for field in fields]
+        
+        if "transcript" not in fields:
+            columns += [Call.transcript_length, Call.transcript_snippet]
+        
+        return [load_only(*columns)]
+    
+    def _include_options(self, include: Optional[List[str]]) -> list:
+        """
+        Build loader options for related rows
+        
+        selectinload fetches each relationship for all loaded calls in one
+        IN query, so a page costs one query per include instead of one per
+        call and include when the relationships are lazy-loaded.
+        """
+        return [selectinload(CALL_INCLUDES[child]) for child in include or []]
+    
+    async def get_call(self, call_id: int, fields: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Optional[Call]:
+        """Get call by ID, optionally loading only the given fields and related rows; falls back to the archive"""
+        query = self.db.query(Call).options(*self._include_options(include))
+        
+        if fields:
+            query = query.options(*self._projection_options(fields))
+        
+        call = query.filter(Call.id == call_id).first()
+        if call is None:
+            call = await self.archive_service.get_archived_call(call_id)
+        return call
+    
+    def _set_transcript(self, call: Call, transcript: str) -> None:
+        """Set a call's transcript and update the search index in the same transaction"""
+        index_transcript(self.db.connection(), call.id, transcript, previous_transcript=call.transcript)
+        call.transcript = transcript
     
     async def get_call_by_sid(self, call_sid: str) -> Optional[Call]:
         """Get call by SID"""
@@ -66,26 +189,34 @@ class CallService:
             call.status = status
             call.updated_at = datetime.now()
             self.db.commit()
-            self.db.refresh(call)
+            self._publish("call.status", call)
             logger.info(f"Updated call {call_sid} status to {status}")
         return call
     
-    async def update_call_with_transcript(self, call_sid: str, transcript: str, intent: str, duration: float) -> Optional[Call]:
-        """Update call with transcript and intent"""
+    async def update_call_with_transcript(self, call_sid: str, transcript: str, intent: str, duration: float, language: Optional[str] = None) -> Optional[Call]:
+        """Update call with transcript, intent and, if given, the detected language"""
         call = await self.get_call_by_sid(call_sid)
         if call:
-            call.transcript = transcript
-            call.intent = intent
-            call.duration = duration
-            call.updated_at = datetime.now()
-            self.db.commit()
-            self.db.refresh(call)
-            logger.info(f"Updated call {call_sid} with transcript and intent: {intent}")
+            self._apply_transcript(call, transcript, intent, duration, language)
         return call
     
-    async def list_calls(self, skip: int = 0, limit: int = 100, direction: Optional[str] = None, status: Optional[str] = None) -> List[Call]:
-        """List calls with optional filtering"""
-        query = self.db.query(Call)
+    def _apply_transcript(self, call: Call, transcript: str, intent: str, duration: float, language: Optional[str] = None) -> None:
+        """Store the transcript, intent and language of a call already loaded"""
+        self._set_transcript(call, transcript)
+        call.intent = intent
+        if language:
+            call.language = language
+        call.duration = duration
+        call.updated_at = datetime.now()
+        self.db.commit()
+        self._publish("call.transcript", call)
+        logger.info(f"Updated call {call.call_sid} with transcript and intent: {intent}")
+    
+    async def list_calls(self, skip: int = 0, limit: int = 100, direction: Optional[str] = None, status: Optional[str] = None,
+                         fields: Optional[List[str]] = None, include: Optional[List[str]] = None) -> List[Call]:
+        """List calls with optional filtering, loading only the given fields and related rows"""
+        fields = fields or DEFAULT_LIST_FIELDS
+        query = self.db.query(Call).options(*self._projection_options(fields), *self._include_options(include))
         
         if direction:
             query = query.filter(Call.direction == direction)
@@ -95,6 +226,20 @@ class CallService:
         
         return query.order_by(desc(Call.created_at)).offset(skip).limit(limit).all()
     
+    async def search_calls(self, query: str, skip: int = 0, limit: int = 20, fields: Optional[List[str]] = None) -> List[Tuple[Call, float]]:
+        """Full-text search over call transcripts, returning calls with their relevance score"""
+        hits = search_transcripts(self.db.connection(), query, skip=skip, limit=limit)
+        if not hits:
+            return []
+        
+        fields = fields or DEFAULT_LIST_FIELDS
+        calls = self.db.query(Call).options(*self._projection_options(fields)).filter(
+            Call.id.in_([call_id for call_id, _ in hits])
+        ).all()
+        calls_by_id = {call.id: call for call in calls}
+        
+        return [(calls_by_id[call_id], score) for call_id, score in hits if call_id in calls_by_id]
+    
     async def process_recording(self, call_sid: str, recording_url: str) -> None:
         """Process a call recording"""
         try:
@@ -114,21 +259,34 @@ class CallService:
             self.db.add(recording)
             self.db.commit()
             
-            # Transcribe recording
-            transcript = await self.voice_service.transcribe_audio(recording_url, call.language)
-            if transcript:
-                recording.transcript = transcript
+            audio = await self.voice_service.fetch_recording(recording_url)
+            if audio:
+                recording.content_hash = audio.content_hash
                 self.db.commit()
-                
-                # Extract intent
+            
+            # Transcribe recording. Long recordings are transcribed in
+            # segments, whose timestamped text is kept on the recording
+            segments = await self.voice_service.transcribe_recording(audio, call.language)
+            transcript = self.voice_service.join_segments(segments) if segments else None
+            if segments and len(segments) > 1:
+                recording.transcript = self.voice_service.format_timestamped_transcript(segments)
+            if segments and not recording.duration and segments[-1].end:
+                recording.duration = segments[-1].end
+            self.db.commit()
+            
+            if transcript:
+                # Extract intent and the language actually spoken
                 intent = await self.intent_service.extract_intent(transcript)
+                language = await self.intent_service.detect_language(transcript)
                 
-                # Update call with transcript and intent
-                await self.update_call_with_transcript(
-                    call_sid=call_sid,
+                # Update call with transcript and intent. The transcript is
+                # stored once, on the call, rather than copied onto the recording
+                self._apply_transcript(
+                    call,
                     transcript=transcript,
                     intent=intent,
-                    duration=recording.duration or 0
+                    duration=recording.duration or 0,
+                    language=language
                 )
                 
                 # Process intent actions
@@ -137,11 +295,17 @@ class CallService:
         except Exception as e:
             logger.error(f"Error processing recording: {e}")
     
-    async def process_outbound_call(self, call_id: int, phone_number: str, message: str, language: str = "en") -> None:
-        """Process an outbound call"""
+    async def process_outbound_call(self, call_id: int, phone_number: str, message: str, language: str = "en",
+                                    scheduled_callback: bool = False) -> None:
+        """
+        Process an outbound call
+        
+        A call placed by the callback scheduler (scheduled_callback) doesn't
+        schedule another callback, whatever the reply
+        """
         try:
-            # Get the call record
-            call = self.db.query(Call).filter(Call.id == call_id).first()
+            # Get the call record; usually already in the session
+            call = self.db.get(Call, call_id)
             if not call:
                 logger.error(f"Call {call_id} not found")
                 return
@@ -149,6 +313,7 @@ class CallService:
             # Update call status
             call.status = CallStatus.INITIATED
             self.db.commit()
+            self._publish("call.status", call)
             
             # Initialize voice service for TTS
             logger.info(f"Initiating outbound call to {phone_number}")
@@ -159,6 +324,7 @@ class CallService:
                 # Simulate call success
                 call.status = CallStatus.IN_PROGRESS
                 self.db.commit()
+                self._publish("call.status", call)
                 
                 # Convert message to speech
                 audio_data = await self.voice_service.text_to_speech(message, language)
@@ -171,15 +337,16 @@ class CallService:
                 intent = await self.intent_service.extract_intent(transcript)
                 
                 # Update call with transcript and intent
-                call.transcript = transcript
+                self._set_transcript(call, transcript)
                 call.intent = intent
                 call.status = CallStatus.COMPLETED
                 call.duration = 60.0  # Simulated 60-second call
                 call.updated_at = datetime.now()
                 self.db.commit()
+                self._publish("call.transcript", call, status_changed=True)
                 
                 # Process intent actions
-                await self.process_intent_actions(call.id, intent)
+                await self.process_intent_actions(call.id, intent, schedule_callbacks=not scheduled_callback)
                 
                 logger.info(f"Completed outbound call to {phone_number} with intent: {intent}")
                 
@@ -187,16 +354,22 @@ class CallService:
                 # Handle failure
                 call.status = CallStatus.FAILED
                 self.db.commit()
+                self._publish("call.status", call)
                 logger.error(f"Failed to complete outbound call: {e}")
                 
         except Exception as e:
             logger.error(f"Error processing outbound call: {e}")
     
-    async def process_intent_actions(self, call_id: int, intent: str) -> None:
-        """Process actions based on detected intent"""
+    async def process_intent_actions(self, call_id: int, intent: str, schedule_callbacks: bool = True) -> Optional[CallAction]:
+        """
+        Process actions based on detected intent, returning the action recorded
+        
+        Without schedule_callbacks a callback request is recorded as
+        "skipped", so the callback scheduler doesn't dial it
+        """
         try:
-            # Get the call record
-            call = self.db.query(Call).filter(Call.id == call_id).first()
+            # Get the call record; usually already in the session
+            call = self.db.get(Call, call_id)
             if not call:
                 logger.error(f"Call {call_id} not found")
                 return
@@ -207,14 +380,15 @@ class CallService:
                 action = CallAction(
                     call_id=call.id,
                     action_type=ActionType.CALLBACK,
-                    details=f"Callback scheduled from intent: {intent}",
-                    status="pending"
+                    details=f"Callback scheduled from intent: {intent}" if schedule_callbacks
+                        else f"Callback not rescheduled from a callback call, intent: {intent}",
+                    status="pending" if schedule_callbacks else "skipped"
                 )
                 self.db.add(action)
                 
             elif "ticket" in intent.lower() or "issue" in intent.lower():
                 # Create a support ticket
-                ticket_number = f"TKT-{uuid.uuid4().hex[:8].upper()}"
+                ticket_number = next_ticket_number()
                 ticket = Ticket(
                     call_id=call.id,
                     ticket_number=ticket_number,
@@ -264,15 +438,20 @@ class CallService:
             
             self.db.commit()
             logger.info(f"Processed intent '{intent}' for call {call_id}")
+            return action
             
         except Exception as e:
             logger.error(f"Error processing intent actions: {e}")
+            return None
     
-    async def simulate_inbound_call(self, phone_number: str, message: str, language: str = "en") -> Dict[str, Any]:
-        """Simulate an inbound call for testing purposes"""
+    async def simulate_inbound_call(self, phone_number: str, message: str, language: Optional[str] = None) -> Dict[str, Any]:
+        """Simulate an inbound call for testing purposes; the language is detected from the message if not given"""
         try:
+            if not language:
+                language = await self.intent_service.detect_language(message)
+            
             # Create a simulated call SID
-            call_sid = f"sim_{uuid.uuid4().hex}"
+            call_sid = next_call_sid("sim")
             
             # Create call record
             call = await self.create_inbound_call(
@@ -285,6 +464,7 @@ class CallService:
             call.status = CallStatus.IN_PROGRESS
             call.language = language
             self.db.commit()
+            self._publish("call.status", call)
             
             # Process the simulated message
             transcript = message
@@ -293,15 +473,16 @@ class CallService:
             intent = await self.intent_service.extract_intent(transcript)
             
             # Update call with transcript and intent
-            call.transcript = transcript
+            self._set_transcript(call, transcript)
             call.intent = intent
             call.status = CallStatus.COMPLETED
             call.duration = 30.0  # Simulated 30-second call
             call.updated_at = datetime.now()
             self.db.commit()
+            self._publish("call.transcript", call, status_changed=True)
             
             # Process intent actions
-            await self.process_intent_actions(call.id, intent)
+            action = await self.process_intent_actions(call.id, intent)
             
             # Return simulation results
             return {
@@ -310,7 +491,9 @@ class CallService:
                 "status": "completed",
                 "transcript": transcript,
                 "intent": intent,
-                "actions": [action.action_type for action in call.actions]
+                "language": language,
+                # The call is new, so its only action is the one just recorded
+                "actions": [action.action_type] if action else []
             }
             
         except Exception as e:
@@ -0,0 +1,354 @@
+from datetime import datetime, time as day_time, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+import asyncio
+import heapq
+import logging
+import time
+
+from sqlalchemy import or_, update
+
+from app.database.db import SessionLocal
+from app.database.query_monitor import track_queries
+from app.models.database import Call, CallAction, CallStatus, ActionType
+from app.utils.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Status of a callback while it is being dialed. Only the scheduler that
+# moved it there from "pending" dials it.
+DIALING_STATUS = "dialing"
+
+# Each poll re-reads callbacks created this long before the newest one
+# loaded, catching rows whose transaction committed after a later row's
+LOAD_LOOKBACK = timedelta(seconds=60)
+
+# SQLite hands back naive UTC timestamps
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+class QueuedCallback(NamedTuple):
+    due_at: float  # Unix time
+    action_id: int
+    phone_number: str
+    language: str
+
+def parse_calling_hours(hours: str) -> Tuple[day_time, day_time]:
+    """Parse "HH:MM-HH:MM" into start and end times"""
+    start, end = hours.split("-")
+    return day_time.fromisoformat(start.strip()), day_time.fromisoformat(end.strip())
+
+class CallbackScheduler:
+    """
+    Dials pending callback actions, paced and within calling hours
+
+    Pending callbacks are read into a heap ordered by due time. All of them
+    are read at startup and every CALLBACK_RELOAD_SECONDS; in between, each
+    poll only reads those created since shortly before the newest one seen,
+    an indexed range on status and created_at, so a poll costs the same no
+    matter how many callbacks are waiting. Callbacks left "dialing" by a
+    worker that crashed are put back to "pending" at startup. Dialing is
+    limited by:
+
+    - a global rate (CALLBACK_CALLS_PER_SECOND) and number of concurrent
+      calls (CALLBACK_MAX_CONCURRENCY)
+    - a minimum interval between calls to the same number
+      (CALLBACK_DESTINATION_INTERVAL_SECONDS); an earlier callback to a
+      number pushes later ones back instead of blocking the queue
+    - the calling-hours window (CALLBACK_CALLING_HOURS in
+      CALLBACK_TIMEZONE); outside it nothing is dialed until it reopens
+
+    Each callback is claimed with a conditional UPDATE from "pending" to
+    "dialing", so a callback cancelled in the meantime or claimed by
+    another scheduler is skipped, and ends up "completed" or "failed".
+    """
+    def __init__(self, calls_per_second: float, max_concurrency: int, destination_interval_seconds: float,
+                 calling_hours: str, timezone: str, delay_seconds: float, poll_seconds: float,
+                 reload_seconds: float, dial_timeout_seconds: float):
+        self.calls_per_second = calls_per_second
+        self.max_concurrency = max_concurrency
+        self.destination_interval_seconds = destination_interval_seconds
+        self.window_start, self.window_end = parse_calling_hours(calling_hours)
+        self.timezone = ZoneInfo(timezone)
+        self.delay_seconds = delay_seconds
+        self.poll_seconds = poll_seconds
+        self.reload_seconds = reload_seconds
+        self.dial_timeout_seconds = dial_timeout_seconds
+
+        self._queue: List[QueuedCallback] = []
+        self._queued_ids: Set[int] = set()
+        self._loaded_until: Optional[datetime] = None  # Newest created_at loaded, as stored
+        self._reloaded_at = 0.0
+        self._last_dialed: Dict[str, float] = {}
+        self._in_flight: Set[asyncio.Task] = set()
+        self._tokens = 1.0
+        self._tokens_at = time.monotonic()
+        self.dialed = 0
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.running = False
+
+    def requeue_stale(self) -> int:
+        """Put callbacks left "dialing" by a crashed worker back to pending"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.dial_timeout_seconds)
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(CallAction)
+                .where(
+                    CallAction.action_type == ActionType.CALLBACK,
+                    CallAction.status == DIALING_STATUS,
+                    or_(CallAction.updated_at.is_(None), CallAction.updated_at < cutoff)
+                )
+                .values(status="pending")
+            )
+            db.commit()
+            return result.rowcount
+        finally:
+            db.close()
+
+    @staticmethod
+    def _pending_query(db):
+        return db.query(CallAction.id, CallAction.created_at, Call.phone_number, Call.language).join(
+            Call, Call.id == CallAction.call_id
+        ).filter(
+            CallAction.status == "pending",
+            CallAction.action_type == ActionType.CALLBACK
+        )
+
+    def load_all(self, batch_size: int = 5000) -> int:
+        """Queue every pending callback that isn't queued yet"""
+        loaded_callbacks = []
+        db = SessionLocal()
+        try:
+            last_action_id = 0
+            while True:
+                rows = self._pending_query(db).filter(
+                    CallAction.id > last_action_id
+                ).order_by(CallAction.id).limit(batch_size).all()
+                if not rows:
+                    break
+                loaded_callbacks += self._new_callbacks(rows)
+                last_action_id = rows[-1].id
+        finally:
+            db.close()
+
+        self._reloaded_at = time.monotonic()
+        return self._push(loaded_callbacks)
+
+    def load_new(self) -> int:
+        """Queue pending callbacks created since shortly before the newest one loaded"""
+        db = SessionLocal()
+        try:
+            query = self._pending_query(db)
+            if self._loaded_until is not None:
+                query = query.filter(CallAction.created_at >= self._loaded_until - LOAD_LOOKBACK)
+            rows = query.all()
+        finally:
+            db.close()
+
+        return self._push(self._new_callbacks(rows))
+
+    def _new_callbacks(self, rows) -> List[QueuedCallback]:
+        callbacks = []
+        for action_id, created_at, phone_number, language in rows:
+            if created_at is not None and (self._loaded_until is None or created_at > self._loaded_until):
+                self._loaded_until = created_at
+            if action_id in self._queued_ids:
+                continue
+
+            if created_at is None:
+                created = time.time()
+            elif created_at.tzinfo is None:
+                created = (created_at - _UNIX_EPOCH).total_seconds()
+            else:
+                created = created_at.timestamp()
+            callbacks.append(QueuedCallback(created + self.delay_seconds, action_id, phone_number, language or "en"))
+        return callbacks
+
+    def _push(self, callbacks: List[QueuedCallback]) -> int:
+        self._queued_ids.update(callback.action_id for callback in callbacks)
+        # Heapifying the combined list is linear, pushing one by one is not
+        if len(callbacks) > len(self._queue):
+            self._queue.extend(callbacks)
+            heapq.heapify(self._queue)
+        else:
+            for callback in callbacks:
+                heapq.heappush(self._queue, callback)
+        return len(callbacks)
+
+    def in_calling_hours(self, at: float) -> bool:
+        local = datetime.fromtimestamp(at, self.timezone).time()
+        if self.window_start <= self.window_end:
+            return self.window_start <= local < self.window_end
+        return local >= self.window_start or local < self.window_end
+
+    def next_window_opening(self, at: float) -> float:
+        """Unix time at which calling hours next open after `at`"""
+        local = datetime.fromtimestamp(at, self.timezone)
+        opening = datetime.combine(local.date(), self.window_start, tzinfo=self.timezone)
+        if opening <= local:
+            opening += timedelta(days=1)
+        return opening.timestamp()
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(1.0, self._tokens + (now - self._tokens_at) * self.calls_per_second)
+        self._tokens_at = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def _claim(self, action_id: int) -> bool:
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(CallAction)
+                .where(CallAction.id == action_id, CallAction.status == "pending")
+                .values(status=DIALING_STATUS)
+            )
+            db.commit()
+            return result.rowcount == 1
+        finally:
+            db.close()
+
+    def dispatch_due(self) -> float:
+        """
+        Start as many due callbacks as pacing allows
+
+        Returns:
+            Seconds until the next callback could be dialed
+        """
+        now = time.time()
+        if self._queue and not self.in_calling_hours(now):
+            return self.next_window_opening(now) - now
+
+        while self._queue and self._queue[0].due_at <= now:
+            if len(self._in_flight) >= self.max_concurrency:
+                return self.poll_seconds
+            if not self._take_token():
+                return (1.0 - self._tokens) / self.calls_per_second
+
+            callback = heapq.heappop(self._queue)
+            self._queued_ids.discard(callback.action_id)
+            last_dialed = self._last_dialed.get(callback.phone_number)
+            if last_dialed is not None and now - last_dialed < self.destination_interval_seconds:
+                # Give the token back and try this number again once its interval has passed
+                self._tokens += 1.0
+                heapq.heappush(self._queue, callback._replace(due_at=last_dialed + self.destination_interval_seconds))
+                self._queued_ids.add(callback.action_id)
+                continue
+
+            if not self._claim(callback.action_id):
+                self._tokens += 1.0
+                self.skipped += 1
+                continue
+
+            self._last_dialed[callback.phone_number] = now
+            task = asyncio.create_task(self._dial(callback))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+        if not self._queue:
+            return self.poll_seconds
+        return min(self._queue[0].due_at - now, self.poll_seconds)
+
+    async def _dial(self, callback: QueuedCallback) -> None:
+        from app.services.call_service import CallService
+
+        self.dialed += 1
+        with track_queries(f"callback {callback.action_id}"):
+            db = SessionLocal()
+            status = "failed"
+            try:
+                call_service = CallService(db)
+                call = await call_service.create_outbound_call(callback.phone_number, settings.callback_message, callback.language)
+                await call_service.process_outbound_call(
+                    call.id, callback.phone_number, settings.callback_message, callback.language, scheduled_callback=True
+                )
+                if call.status == CallStatus.COMPLETED:
+                    status = "completed"
+            except Exception as e:
+                logger.error(f"Error dialing callback {callback.action_id} to {callback.phone_number}: {e}")
+            finally:
+                try:
+                    db.rollback()
+                    db.execute(
+                        update(CallAction)
+                        .where(CallAction.id == callback.action_id, CallAction.status == DIALING_STATUS)
+                        .values(status=status)
+                    )
+                    db.commit()
+                except Exception as e:
+                    logger.error(f"Error updating callback {callback.action_id}: {e}")
+                finally:
+                    db.close()
+
+        if status == "completed":
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def _forget_paced_destinations(self) -> None:
+        cutoff = time.time() - self.destination_interval_seconds
+        self._last_dialed = {number: at for number, at in self._last_dialed.items() if at > cutoff}
+
+    async def run(self) -> None:
+        """Load and dial callbacks until cancelled"""
+        self.running = True
+        requeued = await asyncio.to_thread(self.requeue_stale)
+        if requeued:
+            logger.warning(f"Requeued {requeued} callbacks left dialing by a previous worker")
+        loaded = await asyncio.to_thread(self.load_all)
+        logger.info(f"Callback scheduler started with {loaded} pending callbacks")
+
+        last_cleanup = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() - self._reloaded_at > self.reload_seconds:
+                    await asyncio.to_thread(self.load_all)
+                else:
+                    await asyncio.to_thread(self.load_new)
+                wait = self.dispatch_due()
+            except Exception as e:
+                logger.error(f"Error in callback scheduler: {e}")
+                wait = self.poll_seconds
+
+            if time.monotonic() - last_cleanup > self.destination_interval_seconds:
+                self._forget_paced_destinations()
+                last_cleanup = time.monotonic()
+
+            await asyncio.sleep(max(0.0, min(wait, self.poll_seconds)))
+
+    async def drain(self) -> None:
+        """Wait for callbacks being dialed to finish"""
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "running": self.running,
+            "queued": len(self._queue),
+            "next_due_in_seconds": round(self._queue[0].due_at - now, 1) if self._queue else None,
+            "in_calling_hours": self.in_calling_hours(now),
+            "in_flight": len(self._in_flight),
+            "dialed": self.dialed,
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+        }
+
+callback_scheduler = CallbackScheduler(
+    calls_per_second=settings.callback_calls_per_second,
+    max_concurrency=settings.callback_max_concurrency,
+    destination_interval_seconds=settings.callback_destination_interval_seconds,
+    calling_hours=settings.callback_calling_hours,
+    timezone=settings.callback_timezone,
+    delay_seconds=settings.callback_delay_seconds,
+    poll_seconds=settings.callback_poll_seconds,
+    reload_seconds=settings.callback_reload_seconds,
+    dial_timeout_seconds=settings.callback_dial_timeout_seconds
+)
@@ -0,0 +1,82 @@
+from typing import Optional, Dict, Any, Set
+from datetime import datetime
+import asyncio
+import logging
+
+from app.utils.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class Subscription:
+    """A subscriber's bounded queue of call events, with optional filters"""
+    def __init__(self, direction: Optional[str] = None, status: Optional[str] = None, queue_size: int = 100):
+        self.direction = direction
+        self.status = status
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.direction and event.get("direction") != self.direction:
+            return False
+        if self.status and event.get("status") != self.status:
+            return False
+        return True
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """Queue an event without blocking, dropping the oldest one if the subscriber is behind"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+class CallEventBus:
+    """
+    In-process publish/subscribe for call lifecycle events
+
+    Publishing never blocks: each subscriber has a bounded queue and a slow
+    subscriber loses its oldest events instead of holding up CallService.
+    Events published from outside the event loop thread are handed over to
+    the loop.
+    """
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, direction: Optional[str] = None, status: Optional[str] = None) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(direction=direction, status=status, queue_size=settings.live_feed_queue_size)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def publish(self, event_type: str, **data: Any) -> None:
+        """Fan an event out to all matching subscribers"""
+        if not self._subscriptions:
+            return
+
+        event = {"type": event_type, "timestamp": datetime.now().isoformat(), **data}
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self._loop:
+            self._dispatch(event)
+        elif self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Dict[str, Any]) -> None:
+        for subscription in list(self._subscriptions):
+            if subscription.matches(event):
+                subscription.offer(event)
+
+# Shared by all CallService instances in this worker process
+call_events = CallEventBus()
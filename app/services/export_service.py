@@ -0,0 +1,130 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Iterator
+import csv
+import io
+import json
+import logging
+import zlib
+
+from app.models.database import Call, Recording, CallAction, Ticket
+from app.services.archive_service import ArchiveService, serialize_row
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ["ndjson", "csv"]
+
+# Child rows that can be included with each exported call
+EXPORT_INCLUDES = {
+    "recordings": Recording,
+    "actions": CallAction,
+    "tickets": Ticket,
+}
+
+# Calls fetched from the server-side cursor per round trip
+EXPORT_CHUNK_SIZE = 500
+
+CSV_COLUMNS = [column.key for column in Call.__table__.columns]
+
+class ExportService:
+    """
+    Streams call logs for a date range in constant memory
+
+    Hot calls are read from a server-side cursor in chunks, with child rows
+    loaded per chunk, and archived calls are read from their partition
+    files. Output is produced incrementally and never held in full.
+    """
+    def __init__(self, db: Session):
+        self.db = db
+        self.archive_service = ArchiveService(db)
+
+    @staticmethod
+    def parse_date_range(start_date: Optional[str], end_date: Optional[str]) -> tuple:
+        """Parse YYYY-MM-DD bounds into a half-open datetime range"""
+        start_datetime = datetime.strptime(start_date, "%Y-%m-%d") if start_date else datetime.min
+        end_datetime = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1) if end_date else datetime.max
+        return start_datetime, end_datetime
+
+    def iter_records(self, start_datetime: datetime, end_datetime: datetime, include: List[str]) -> Iterator[Dict[str, Any]]:
+        """Yield export records, archived calls first and then hot calls in ID order"""
+        for record in self.archive_service.iter_archived_records(start_datetime, end_datetime):
+            for child in EXPORT_INCLUDES:
+                if child not in include:
+                    record.pop(child, None)
+            yield record
+
+        statement = select(Call).where(
+            Call.created_at >= start_datetime,
+            Call.created_at < end_datetime
+        ).order_by(Call.id).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+
+        for calls in self.db.execute(statement).scalars().partitions():
+            children = {child: self._load_children(EXPORT_INCLUDES[child], calls) for child in include}
+
+            for call in calls:
+                record = serialize_row(call)
+                for child, rows_by_call in children.items():
+                    record[child] = [serialize_row(row) for row in rows_by_call.get(call.id, [])]
+                yield record
+
+    def _load_children(self, model, calls: List[Call]) -> Dict[int, list]:
+        rows_by_call = defaultdict(list)
+        for row in self.db.query(model).filter(model.call_id.in_([call.id for call in calls])):
+            rows_by_call[row.call_id].append(row)
+        return rows_by_call
+
+    def iter_export(self, start_datetime: datetime, end_datetime: datetime, format: str = "ndjson",
+                    include: Optional[List[str]] = None, compress: bool = False) -> Iterator[bytes]:
+        """
+        Stream an export as encoded bytes
+
+        Args:
+            start_datetime: Inclusive start of the range
+            end_datetime: Exclusive end of the range
+            format: ndjson or csv; child rows are JSON-encoded columns in csv
+            include: Child rows to include (recordings, actions, tickets)
+            compress: Gzip the stream on the fly
+        """
+        include = include or []
+        records = self.iter_records(start_datetime, end_datetime, include)
+        lines = self._iter_csv(records, include) if format == "csv" else self._iter_ndjson(records)
+
+        if not compress:
+            yield from lines
+            return
+
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        for chunk in lines:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def _iter_ndjson(self, records: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+        buffer = []
+        for count, record in enumerate(records, 1):
+            buffer.append(json.dumps(record, ensure_ascii=False))
+            if count % EXPORT_CHUNK_SIZE == 0:
+                yield ("\n".join(buffer) + "\n").encode("utf-8")
+                buffer = []
+        if buffer:
+            yield ("\n".join(buffer) + "\n").encode("utf-8")
+
+    def _iter_csv(self, records: Iterator[Dict[str, Any]], include: List[str]) -> Iterator[bytes]:
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(CSV_COLUMNS + include)
+
+        for count, record in enumerate(records, 1):
+            writer.writerow(
+                [record.get(column) for column in CSV_COLUMNS] +
+                [json.dumps(record.get(child, []), ensure_ascii=False) for child in include]
+            )
+            if count % EXPORT_CHUNK_SIZE == 0:
+                yield output.getvalue().encode("utf-8")
+                output.seek(0)
+                output.truncate()
+
+        yield output.getvalue().encode("utf-8")
@@ -0,0 +1,116 @@
+from typing import Dict, List, Tuple
+import logging
+import os
+import threading
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app.database.db import SessionLocal
+from app.database.query_monitor import untracked
+from app.models.database import IdCounter
+from app.utils.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+class IdAllocator:
+    """
+    Hands out sequential IDs from blocks leased from the id_counters table
+
+    Each process leases block_size values of a counter at a time with a
+    single UPDATE ... RETURNING, then hands them out from memory,
+    so only one in block_size IDs costs a database round trip. Blocks never
+    overlap, so IDs are unique across workers without relying on the
+    unique index to catch collisions. IDs grow with time but are only
+    strictly ordered within a worker, and the unused rest of a block is
+    skipped when a worker stops.
+
+    Blocks are leased in a session of their own, so leasing never commits
+    or rolls back the caller's work, and untracked, so a request that
+    happens to lease doesn't count the lease against its query budget.
+    """
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._blocks: Dict[str, Tuple[int, int]] = {}  # name -> [next, end)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.leases = 0
+
+    def _lease(self, name: str, size: int) -> Tuple[int, int]:
+        with untracked():
+            return self._lease_block(name, size)
+
+    def _lease_block(self, name: str, size: int) -> Tuple[int, int]:
+        db = SessionLocal()
+        try:
+            while True:
+                end = db.execute(
+                    update(IdCounter)
+                    .where(IdCounter.name == name)
+                    .values(next_value=IdCounter.next_value + size)
+                    .returning(IdCounter.next_value)
+                ).scalar()
+                if end is not None:
+                    db.commit()
+                    self.leases += 1
+                    return end - size, end
+
+                # Counters in ID_COUNTERS are created by the migration, others on first use
+                db.add(IdCounter(name=name, next_value=1))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Another worker created the counter first
+                    db.rollback()
+        finally:
+            db.close()
+
+    def next(self, name: str) -> int:
+        """Return the next ID of a counter"""
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Blocks leased before a fork are shared with the parent
+                self._blocks.clear()
+                self._pid = os.getpid()
+
+            next_value, end = self._blocks.get(name, (0, 0))
+            if next_value >= end:
+                next_value, end = self._lease(name, self.block_size)
+            self._blocks[name] = (next_value + 1, end)
+            return next_value
+
+    def next_range(self, name: str, count: int) -> range:
+        """
+        Lease count consecutive IDs of a counter at once, for bulk inserts
+
+        Must not be called inside a write transaction on SQLite: the lease
+        commits on its own connection and would wait for that transaction.
+        """
+        if count <= 0:
+            return range(0)
+        start, end = self._lease(name, count)
+        return range(start, end)
+
+id_allocator = IdAllocator(settings.id_block_size)
+
+def next_ticket_number() -> str:
+    """
+    Sequential ticket number such as TKT-000001234
+
+    Nine digits are easy to read out on a call and sort in creation order,
+    and never equal the eight hex characters of earlier ticket numbers.
+    """
+    return f"TKT-{id_allocator.next('ticket'):09d}"
+
+def next_call_sid(prefix: str) -> str:
+    """Sequential SID for calls we create ourselves, such as out_0000001234"""
+    return f"{prefix}_{id_allocator.next('call_sid'):010d}"
+
+def next_ticket_numbers(count: int) -> List[str]:
+    """count sequential ticket numbers leased in one round trip"""
+    return [f"TKT-{value:09d}" for value in id_allocator.next_range("ticket", count)]
+
+def next_call_sids(prefix: str, count: int) -> List[str]:
+    """count sequential call SIDs leased in one round trip"""
+    return [f"{prefix}_{value:010d}" for value in id_allocator.next_range("call_sid", count)]
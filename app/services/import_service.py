@@ -0,0 +1,516 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+import csv
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from sqlalchemy import Boolean, DateTime, Enum, Float, Integer, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database.db import SessionLocal
+from app.database.search_index import index_new_transcripts
+from app.models.database import ActionType, Call, Recording, CallAction, Ticket, ImportJob, TRANSCRIPT_SNIPPET_LENGTH
+from app.services.callback_scheduler import DIALING_STATUS
+from app.services.id_allocator import next_call_sids, next_ticket_numbers
+from app.services.intent_service import IntentService
+from app.utils.config import get_settings
+from app.utils.prefork import default_worker_count
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+IMPORT_FORMATS = ["ndjson", "csv"]
+
+# Child rows a record can carry, under the keys the export writes them to
+IMPORT_CHILDREN = {
+    "recordings": Recording,
+    "actions": CallAction,
+    "tickets": Ticket,
+}
+
+# SID prefix of imported calls that come without one
+IMPORT_SID_PREFIX = "imp"
+
+# Rejected records logged per run; the rest are only counted
+MAX_LOGGED_REJECTIONS = 100
+
+# Values looked up per query when checking SIDs and ticket numbers
+LOOKUP_CHUNK_SIZE = 500
+
+# Imported callbacks that were still waiting to be dialed get this status
+# instead, so the callback scheduler never dials historical calls
+IMPORTED_CALLBACK_STATUS = "imported"
+
+# Call columns computed on import rather than read
+_COMPUTED_COLUMNS = {"id", "call_id", "transcript_length", "transcript_snippet"}
+
+class ImportAlreadyRunning(Exception):
+    """Another run of the same job committed a batch first"""
+    pass
+
+def _converter(column):
+    """Function turning a CSV or JSON value into what the column takes"""
+    column_type = column.type
+    if isinstance(column_type, Enum) and column_type.enum_class:
+        # Exports write enum values; names are accepted as well
+        members = {}
+        for member in column_type.enum_class:
+            members[member.name] = members[member.name.lower()] = members[member.value] = member
+
+        def convert(value):
+            try:
+                return members[value]
+            except KeyError:
+                raise ValueError(f"invalid {column.key}: {value}")
+        return convert
+    if isinstance(column_type, DateTime):
+        return _parse_datetime
+    if isinstance(column_type, Boolean):
+        return lambda value: value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes")
+    if isinstance(column_type, Float):
+        return float
+    if isinstance(column_type, Integer):
+        return int
+    return lambda value: value if isinstance(value, str) else str(value)
+
+def _parse_datetime(value) -> datetime:
+    parsed = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        # Stored like server-side CURRENT_TIMESTAMP values: naive UTC
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+class _TableColumns:
+    """Columns of a table read from import records, with their converters and defaults"""
+    def __init__(self, model):
+        self.table = model.__table__
+        self.columns = [column for column in self.table.columns if column.key not in _COMPUTED_COLUMNS]
+        self.converters = {column.key: _converter(column) for column in self.columns}
+        # executemany sends explicit NULLs, so column defaults are applied here
+        self.defaults = {
+            column.key: column.default.arg if column.default is not None and column.default.is_scalar else None
+            for column in self.columns
+        }
+        self.server_defaulted = [column.key for column in self.columns if column.server_default is not None]
+
+    def row(self, record: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        row = self.defaults.copy()
+        for key, convert in self.converters.items():
+            value = record.get(key)
+            if value is not None and value != "":
+                row[key] = convert(value)
+        for key in self.server_defaulted:
+            if row[key] is None:
+                row[key] = now
+        return row
+
+_CALL_COLUMNS = _TableColumns(Call)
+_CHILD_COLUMNS = {child: _TableColumns(model) for child, model in IMPORT_CHILDREN.items()}
+
+class _PreparedBatch:
+    """Rows of one batch of records, ready to insert"""
+    def __init__(self, end_offset: int, records: int):
+        self.end_offset = end_offset
+        self.records = records
+        self.calls: List[Dict[str, Any]] = []
+        self.children: List[Dict[str, List[Dict[str, Any]]]] = []  # per call
+        self.unclassified: List[Dict[str, Any]] = []  # calls with a transcript and no intent
+        self.rejected = 0
+
+class _LineReader:
+    """Decoded lines of a binary file, tracking the offset just past the last line read"""
+    def __init__(self, source, offset: int):
+        source.seek(offset)
+        self.source = source
+        self.offset = offset
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = self.source.readline()
+        if not line:
+            raise StopIteration
+        at_start = self.offset == 0
+        self.offset += len(line)
+        return line.decode("utf-8-sig" if at_start else "utf-8")
+
+def _classify_intents(texts: List[str]) -> List[str]:
+    """Run in the pool's worker processes"""
+    return IntentService().classify_offline(texts)
+
+class ImportService:
+    """
+    Imports historical calls from CSV or NDJSON files in large batches
+
+    Records use the export format: call columns, with recordings, actions
+    and tickets as nested lists (NDJSON) or JSON-encoded columns (CSV), so
+    an export can be imported as is. A flat recording_url column is read as
+    one recording. Source IDs are ignored; calls without a call_sid and
+    tickets without a number get sequential ones.
+
+    The file is streamed. Each batch is inserted with one executemany per
+    table and indexed for search in the same transaction, which also
+    advances the job's checkpoint (the byte offset of the next record), so
+    an interrupted import resumes after the last committed batch. With
+    classify_intents, calls that have a transcript but no intent are
+    classified by the rules and the local model in a process pool, while
+    earlier batches are being written.
+    """
+    def __init__(self, db: Session, batch_size: Optional[int] = None, intent_workers: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.import_batch_size
+        self.intent_workers = intent_workers or settings.import_intent_workers or default_worker_count()
+        self._logged_rejections = 0
+
+    @staticmethod
+    def format_for(path: str) -> str:
+        """Import format implied by a file name"""
+        name = path[:-len(".gz")] if path.endswith(".gz") else path
+        return "csv" if name.endswith(".csv") else "ndjson"
+
+    def create_job(self, source: str, format: str, classify_intents: bool = False) -> ImportJob:
+        if format not in IMPORT_FORMATS:
+            raise ValueError(f"Unsupported import format: {format}")
+        job = ImportJob(source=os.path.abspath(source), format=format, classify_intents=classify_intents)
+        self.db.add(job)
+        self.db.commit()
+        return job
+
+    def find_unfinished_job(self, source: str) -> Optional[ImportJob]:
+        """Latest import of a file that hasn't completed"""
+        return self.db.query(ImportJob).filter(
+            ImportJob.source == os.path.abspath(source),
+            ImportJob.status != "completed"
+        ).order_by(ImportJob.id.desc()).first()
+
+    def list_jobs(self, limit: int = 50) -> List[ImportJob]:
+        return self.db.query(ImportJob).order_by(ImportJob.id.desc()).limit(limit).all()
+
+    def run(self, job: ImportJob) -> Dict[str, Any]:
+        """Import a job's file from its checkpoint to the end"""
+        job.status = "running"
+        job.error = None
+        self.db.commit()
+        logger.info(f"Importing {job.source} as job {job.id} from record {job.rows}")
+
+        started = time.perf_counter()
+        elapsed_before = job.elapsed_seconds or 0.0
+        pool = None
+        if job.classify_intents:
+            # Spawned, not forked: the server runs imports on a thread
+            pool = ProcessPoolExecutor(self.intent_workers, mp_context=multiprocessing.get_context("spawn"))
+
+        try:
+            # Up to one batch per worker is being classified while the oldest is written
+            pending: Deque[Tuple[_PreparedBatch, Optional[Future]]] = deque()
+            for batch in self._prepared_batches(job):
+                texts = [call["transcript"] for call in batch.unclassified]
+                pending.append((batch, pool.submit(_classify_intents, texts) if pool and texts else None))
+                if len(pending) > (self.intent_workers if pool else 0):
+                    self._write_batch(job, *pending.popleft(), elapsed_before + time.perf_counter() - started)
+            while pending:
+                self._write_batch(job, *pending.popleft(), elapsed_before + time.perf_counter() - started)
+
+            job.status = "completed"
+            job.finished_at = datetime.now()
+            self.db.commit()
+        except ImportAlreadyRunning:
+            # The other run owns the job; its status is left alone
+            self.db.rollback()
+            raise
+        except BaseException as e:
+            checkpoint = job.byte_offset
+            self.db.rollback()
+            # Only marked failed if no other run has moved the checkpoint since
+            # this one's last batch; such a run also makes this one's batch
+            # collide with the calls it imported
+            failed = self.db.execute(
+                update(ImportJob)
+                .where(ImportJob.id == job.id, ImportJob.byte_offset == checkpoint, ImportJob.status != "completed")
+                .values(status="failed", error=str(e) or type(e).__name__)
+            ).rowcount
+            self.db.commit()
+            self.db.refresh(job)
+            if not failed and isinstance(e, IntegrityError):
+                raise ImportAlreadyRunning(f"Import {job.id} was advanced by another run") from e
+            logger.error(f"Import {job.id} failed at record {job.rows}: {e}")
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        status = import_job_status(job)
+        logger.info(f"Import {job.id} completed: {status}")
+        return status
+
+    def _records(self, job: ImportJob) -> Iterator[Tuple[Optional[Dict[str, Any]], int]]:
+        """Records from the checkpoint on, each with the offset just past it; None for unparseable ones"""
+        opener = gzip.open if job.source.endswith(".gz") else open
+        with opener(job.source, "rb") as source:
+            if job.format == "csv":
+                lines = _LineReader(source, 0)
+                reader = csv.reader(lines)
+                header = next(reader, [])
+                if job.byte_offset > lines.offset:
+                    lines = _LineReader(source, job.byte_offset)
+                    reader = csv.reader(lines)
+                for values in reader:
+                    if values:
+                        yield (dict(zip(header, values)) if len(values) == len(header) else None), lines.offset
+            else:
+                lines = _LineReader(source, job.byte_offset)
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    yield (record if isinstance(record, dict) else None), lines.offset
+
+    def _prepared_batches(self, job: ImportJob) -> Iterator[_PreparedBatch]:
+        records: List[Optional[Dict[str, Any]]] = []
+        end_offset = job.byte_offset
+        for record, end_offset in self._records(job):
+            records.append(record)
+            if len(records) >= self.batch_size:
+                yield self._prepare(records, end_offset, job.rows)
+                records = []
+        if records:
+            yield self._prepare(records, end_offset, job.rows)
+
+    def _prepare(self, records: List[Optional[Dict[str, Any]]], end_offset: int, first_record: int) -> _PreparedBatch:
+        batch = _PreparedBatch(end_offset, len(records))
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for number, record in enumerate(records, start=first_record + 1):
+            try:
+                if record is None:
+                    raise ValueError("unparseable record")
+                call, children = self._prepare_call(record, now)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                batch.rejected += 1
+                self._log_rejection(f"record {number}", e)
+                continue
+
+            if call["transcript"] and not call["intent"]:
+                batch.unclassified.append(call)
+            batch.calls.append(call)
+            batch.children.append(children)
+        return batch
+
+    def _log_rejection(self, what: str, reason) -> None:
+        if self._logged_rejections < MAX_LOGGED_REJECTIONS:
+            self._logged_rejections += 1
+            logger.warning(f"Rejected import {what}: {reason}")
+
+    def _prepare_call(self, record: Dict[str, Any], now: datetime) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]:
+        call = _CALL_COLUMNS.row(record, now)
+        if not call["phone_number"]:
+            raise ValueError("missing phone_number")
+        transcript = call["transcript"]
+        call["transcript_length"] = len(transcript) if transcript is not None else None
+        call["transcript_snippet"] = transcript[:TRANSCRIPT_SNIPPET_LENGTH] if transcript is not None else None
+
+        children = {}
+        for child, columns in _CHILD_COLUMNS.items():
+            rows = record.get(child)
+            if isinstance(rows, str):
+                # CSV exports carry child rows as JSON
+                rows = json.loads(rows) if rows else []
+            if child == "recordings" and not rows and record.get("recording_url"):
+                rows = [{"recording_url": record["recording_url"]}]
+            if rows:
+                children[child] = [columns.row(row, now) for row in rows]
+
+        for action in children.get("actions", []):
+            if action["action_type"] == ActionType.CALLBACK and action["status"] in ("pending", DIALING_STATUS):
+                action["status"] = IMPORTED_CALLBACK_STATUS
+        return call, children
+
+    def _drop_existing_calls(self, conn, batch: _PreparedBatch) -> None:
+        """Reject calls whose SID is already taken, such as an export imported twice"""
+        call_sids = [call["call_sid"] for call in batch.calls if call["call_sid"]]
+        taken = _existing(conn, Call.call_sid, call_sids)
+        if not taken and len(set(call_sids)) == len(call_sids):
+            return
+
+        calls, children = [], []
+        for call, call_children in zip(batch.calls, batch.children):
+            call_sid = call["call_sid"]
+            if call_sid in taken:
+                batch.rejected += 1
+                self._log_rejection(f"call {call_sid}", "call_sid already exists")
+                continue
+            if call_sid:
+                taken.add(call_sid)
+            calls.append(call)
+            children.append(call_children)
+        batch.calls, batch.children = calls, children
+
+    def _assign_identifiers(self, conn, batch: _PreparedBatch) -> None:
+        """Give calls without a SID, and tickets without a free number, sequential ones"""
+        self._assign_sequential(
+            conn, [call for call in batch.calls if not call["call_sid"]], Call.call_sid,
+            lambda count: next_call_sids(IMPORT_SID_PREFIX, count),
+            {call["call_sid"] for call in batch.calls if call["call_sid"]}
+        )
+
+        tickets = [ticket for children in batch.children for ticket in children.get("tickets", [])]
+        taken = _existing(conn, Ticket.ticket_number, [ticket["ticket_number"] for ticket in tickets if ticket["ticket_number"]])
+        numbered, unnumbered = set(), []
+        for ticket in tickets:
+            ticket_number = ticket["ticket_number"]
+            if ticket_number and ticket_number not in taken and ticket_number not in numbered:
+                numbered.add(ticket_number)
+                continue
+            if ticket_number:
+                logger.warning(f"Imported ticket {ticket_number} already exists; giving it a new number")
+            unnumbered.append(ticket)
+        self._assign_sequential(conn, unnumbered, Ticket.ticket_number, next_ticket_numbers, numbered)
+
+    def _assign_sequential(self, conn, rows: List[Dict[str, Any]], column, lease, reserved: set) -> None:
+        # Imported rows can hold numbers the counter hasn't reached yet, such
+        # as an export of another database; leases double until past them
+        size = len(rows)
+        while rows:
+            values = lease(size)
+            taken = reserved | _existing(conn, column, values)
+            free = [value for value in values if value not in taken]
+            for row, value in zip(rows, free):
+                row[column.key] = value
+            rows = rows[len(free):]
+            size *= 2
+
+    def _write_batch(self, job: ImportJob, batch: _PreparedBatch, future: Optional[Future], elapsed_seconds: float) -> None:
+        # Checked and leased outside the batch's transaction, see IdAllocator.next_range
+        conn = self.db.connection()
+        self._drop_existing_calls(conn, batch)
+        self._assign_identifiers(conn, batch)
+        # Ends the reads, whose snapshot predates the leases and can't be written from
+        self.db.commit()
+
+        classified = 0
+        if future is not None:
+            kept = {id(call) for call in batch.calls}
+            for call, intent in zip(batch.unclassified, future.result()):
+                call["intent"] = intent
+                classified += id(call) in kept
+
+        counts = {child: 0 for child in IMPORT_CHILDREN}
+        conn = self.db.connection()
+        if batch.calls:
+            # A plain executemany; RETURNING the IDs in order makes SQLite
+            # insert row by row, so they are read back by the unique SID
+            conn.execute(insert(Call), batch.calls)
+            call_sids = [call["call_sid"] for call in batch.calls]
+            ids_by_sid = _call_ids_by_sid(conn, call_sids)
+            call_ids = [ids_by_sid[call_sid] for call_sid in call_sids]
+
+            for child, model in IMPORT_CHILDREN.items():
+                rows = []
+                for call_id, children in zip(call_ids, batch.children):
+                    for row in children.get(child, []):
+                        row["call_id"] = call_id
+                        rows.append(row)
+                if rows:
+                    conn.execute(insert(model), rows)
+                counts[child] = len(rows)
+
+            index_new_transcripts(conn, [
+                (call_id, call["transcript"]) for call_id, call in zip(call_ids, batch.calls) if call["transcript"]
+            ])
+
+        # The checkpoint only moves from where this run found it, so a second
+        # run of the same job can't import a batch twice
+        checkpointed = conn.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job.id, ImportJob.byte_offset == job.byte_offset)
+            .values(
+                status="running",
+                error=None,
+                byte_offset=batch.end_offset,
+                rows=ImportJob.rows + batch.records,
+                calls=ImportJob.calls + len(batch.calls),
+                recordings=ImportJob.recordings + counts["recordings"],
+                actions=ImportJob.actions + counts["actions"],
+                tickets=ImportJob.tickets + counts["tickets"],
+                rejected=ImportJob.rejected + batch.rejected,
+                intents_classified=ImportJob.intents_classified + classified,
+                elapsed_seconds=elapsed_seconds
+            )
+        ).rowcount
+        if not checkpointed:
+            raise ImportAlreadyRunning(f"Import {job.id} was advanced by another run")
+        self.db.commit()
+        self.db.refresh(job)
+
+        logger.info(
+            f"Import {job.id}: {job.rows} records, {job.calls} calls, "
+            f"{job.rows / job.elapsed_seconds if job.elapsed_seconds else 0:.0f} records/s"
+        )
+
+def _existing(conn, column, values: List[str]) -> set:
+    """Those of the values a unique column already holds"""
+    existing = set()
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        existing.update(conn.execute(select(column).where(column.in_(values[start:start + LOOKUP_CHUNK_SIZE]))).scalars())
+    return existing
+
+def _call_ids_by_sid(conn, call_sids: List[str]) -> Dict[str, int]:
+    ids_by_sid = {}
+    for start in range(0, len(call_sids), LOOKUP_CHUNK_SIZE):
+        ids_by_sid.update(conn.execute(
+            select(Call.call_sid, Call.id).where(Call.call_sid.in_(call_sids[start:start + LOOKUP_CHUNK_SIZE]))
+        ).all())
+    return ids_by_sid
+
+def import_job_status(job: ImportJob) -> Dict[str, Any]:
+    elapsed_seconds = job.elapsed_seconds or 0.0
+    return {
+        "id": job.id,
+        "source": job.source,
+        "format": job.format,
+        "classify_intents": bool(job.classify_intents),
+        "status": job.status,
+        "rows": job.rows or 0,
+        "calls": job.calls or 0,
+        "recordings": job.recordings or 0,
+        "actions": job.actions or 0,
+        "tickets": job.tickets or 0,
+        "rejected": job.rejected or 0,
+        "intents_classified": job.intents_classified or 0,
+        "elapsed_seconds": round(elapsed_seconds, 2),
+        "rows_per_second": round((job.rows or 0) / elapsed_seconds, 1) if elapsed_seconds else 0.0,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+def run_import_in_background(job_id: int) -> threading.Thread:
+    """
+    Run an import on a thread of its own, with its own session
+
+    A new thread starts with an empty context, so the import isn't counted
+    as part of the request that started it.
+    """
+    def target():
+        db = SessionLocal()
+        try:
+            ImportService(db).run(db.get(ImportJob, job_id))
+        except Exception as e:
+            logger.error(f"Error importing calls for job {job_id}: {e}")
+        finally:
+            db.close()
+
+    thread = threading.Thread(target=target, name=f"call-import-{job_id}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,218 @@
+from functools import lru_cache
+from typing import List, Tuple, Optional, Dict, Any
+import logging
+import os
+
+import numpy as np
+
+from app.utils.config import get_settings
+from app.utils.ngrams import char_ngram_keys
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+INTENT_LABELS = ["schedule_callback", "create_ticket", "speak_agent", "resolve_issue", "general_inquiry"]
+
+# Character n-grams hashed into a fixed number of feature buckets
+NGRAM_ORDERS = (2, 3, 4)
+NGRAM_BITS = 16
+FEATURE_BUCKETS = 1 << 18
+
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+def _featurize(texts: List[str], buckets: int = FEATURE_BUCKETS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Turn a batch of texts into sparse hashed n-gram features
+
+    Counts are log-scaled and each text's feature vector is L2-normalized.
+
+    Returns:
+        (row, bucket, value) arrays of the non-zero features
+    """
+    keys, owners = char_ngram_keys(texts, NGRAM_ORDERS, bits=NGRAM_BITS)
+    shift = np.uint64(64 - int(buckets).bit_length() + 1)
+    hashed = ((keys * _HASH_MULTIPLIER) >> shift).astype(np.int64)
+
+    cells, counts = np.unique(owners * buckets + hashed, return_counts=True)
+    rows, columns = np.divmod(cells, buckets)
+    values = 1.0 + np.log(counts)
+
+    norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(texts)))
+    values /= norms[rows]
+    return rows, columns, values
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = scores - scores.max(axis=1, keepdims=True)
+    probabilities = np.exp(scores)
+    return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+class IntentClassifier:
+    """
+    Multinomial logistic regression over hashed character n-grams
+
+    Scores are computed for a whole batch with array operations only, and
+    probabilities are calibrated with a temperature fitted on held-out calls.
+    """
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: List[str], temperature: float = 1.0):
+        self.weights = weights
+        self.bias = bias
+        self.labels = labels
+        self.temperature = temperature
+
+    def _scores(self, texts: List[str]) -> np.ndarray:
+        rows, columns, values = _featurize(texts, buckets=self.weights.shape[0])
+        return self._scores_from_features(rows, columns, values, len(texts))
+
+    def _scores_from_features(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray, samples: int) -> np.ndarray:
+        classes = len(self.labels)
+        contributions = self.weights[columns] * values[:, None]
+        cells = (rows[:, None] * classes + np.arange(classes)).ravel()
+        scores = np.bincount(cells, weights=contributions.ravel(), minlength=samples * classes)
+        return scores.reshape(samples, classes) + self.bias
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        """Return a (len(texts), len(labels)) array of calibrated intent probabilities"""
+        return _softmax(self._scores(texts) / self.temperature)
+
+    def predict(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Return the most likely intent and its probability for each text"""
+        if not texts:
+            return []
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [(self.labels[label_id], float(probabilities[row, label_id])) for row, label_id in enumerate(best)]
+
+    @classmethod
+    def train(cls, texts: List[str], intents: List[str], holdout: float = 0.2, epochs: int = 60,
+              learning_rate: float = 0.05, l2: float = 1e-5, seed: int = 0) -> Tuple["IntentClassifier", Dict[str, Any]]:
+        """
+        Train on labelled transcripts and calibrate on a held-out share of them
+
+        Args:
+            texts: Call transcripts
+            intents: Intent label of each transcript
+            holdout: Share of samples held out for calibration and evaluation
+            epochs: Full-batch Adam iterations
+            learning_rate: Adam step size
+            l2: Weight decay
+            seed: Seed for the holdout split
+
+        Returns:
+            The classifier and a report with sample counts and held-out accuracy
+
+        Raises:
+            ValueError: If an intent isn't one of INTENT_LABELS, or there is nothing to train on
+        """
+        if len(texts) != len(intents):
+            raise ValueError(f"Got {len(texts)} transcripts but {len(intents)} intents")
+        unknown = sorted(set(intents) - set(INTENT_LABELS))
+        if unknown:
+            count = sum(intent in unknown for intent in intents)
+            raise ValueError(f"{count} transcripts have intents other than {', '.join(INTENT_LABELS)}: {', '.join(map(str, unknown))}")
+        if not texts:
+            raise ValueError("No labelled transcripts to train on")
+
+        labels = [label for label in INTENT_LABELS if label in set(intents)]
+        targets = np.array([labels.index(intent) for intent in intents])
+
+        order = np.random.default_rng(seed).permutation(len(texts))
+        held_out = order[:int(len(texts) * holdout)] if len(labels) > 1 else order[:0]
+        training = order[len(held_out):]
+
+        rows, columns, values = _featurize([texts[i] for i in training])
+        samples, classes = len(training), len(labels)
+        one_hot = np.eye(classes)[targets[training]]
+
+        weights = np.zeros((FEATURE_BUCKETS, classes))
+        bias = np.zeros(classes)
+        moments = [np.zeros_like(weights), np.zeros_like(weights), np.zeros_like(bias), np.zeros_like(bias)]
+        model = cls(weights, bias, labels)
+
+        for step in range(1, epochs + 1):
+            errors = (_softmax(model._scores_from_features(rows, columns, values, samples)) - one_hot) / samples
+            weight_gradient = np.stack([
+                np.bincount(columns, weights=errors[rows, label_id] * values, minlength=FEATURE_BUCKETS)
+                for label_id in range(classes)
+            ], axis=1) + l2 * weights
+            bias_gradient = errors.sum(axis=0)
+
+            for parameter, gradient, first, second in (
+                (weights, weight_gradient, moments[0], moments[1]),
+                (bias, bias_gradient, moments[2], moments[3]),
+            ):
+                first *= 0.9
+                first += 0.1 * gradient
+                second *= 0.999
+                second += 0.001 * gradient ** 2
+                parameter -= learning_rate * (first / (1 - 0.9 ** step)) / (np.sqrt(second / (1 - 0.999 ** step)) + 1e-8)
+
+        report = {"samples": len(texts), "trained_on": samples, "held_out": len(held_out), "labels": labels}
+        if len(held_out):
+            held_out_texts = [texts[i] for i in held_out]
+            scores = model._scores(held_out_texts)
+            model.temperature = cls._fit_temperature(scores, targets[held_out])
+
+            probabilities = _softmax(scores / model.temperature)
+            predicted = probabilities.argmax(axis=1)
+            confident = probabilities.max(axis=1) >= settings.intent_model_min_confidence
+            correct = predicted == targets[held_out]
+            report.update({
+                "temperature": round(model.temperature, 3),
+                "held_out_accuracy": round(float(correct.mean()), 4),
+                "confident_share": round(float(confident.mean()), 4),
+                "confident_accuracy": round(float(correct[confident].mean()), 4) if confident.any() else None,
+            })
+
+        return model, report
+
+    @staticmethod
+    def _fit_temperature(scores: np.ndarray, targets: np.ndarray) -> float:
+        """
+        Pick the temperature that minimizes held-out negative log-likelihood
+
+        Calibration only ever softens the probabilities: held-out calls are
+        phrased like the training calls and look easier than new phrasings,
+        so sharpening on them would make the cascade skip the LLM for
+        transcripts the model has never seen the like of.
+        """
+        best_temperature, best_loss = 1.0, np.inf
+        for temperature in np.logspace(0, 1, 21):
+            probabilities = _softmax(scores / temperature)
+            loss = -np.log(probabilities[np.arange(len(targets)), targets] + 1e-12).mean()
+            if loss < best_loss:
+                best_temperature, best_loss = float(temperature), loss
+        return best_temperature
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float32),
+            bias=self.bias,
+            labels=np.array(self.labels),
+            temperature=np.array(self.temperature)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        with np.load(path, allow_pickle=False) as model:
+            return cls(
+                weights=model["weights"],
+                bias=model["bias"],
+                labels=[str(label) for label in model["labels"]],
+                temperature=float(model["temperature"])
+            )
+
+@lru_cache()
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """Load the trained classifier once per process, or None if none has been trained"""
+    path = settings.intent_model_path
+    if not path or not os.path.exists(path):
+        return None
+
+    try:
+        classifier = IntentClassifier.load(path)
+        logger.info(f"Loaded intent classifier from {path} with labels {classifier.labels}")
+        return classifier
+    except Exception as e:
+        logger.error(f"Error loading intent classifier from {path}: {e}")
+        return None
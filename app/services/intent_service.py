@@ -1,14 +1,31 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import logging
 import json
 import re
 import aiohttp
 
+from app.services.intent_classifier import get_intent_classifier, INTENT_LABELS
+from app.services.language_identifier import get_language_identifier
+from app.services.micro_batcher import MicroBatcher
 from app.utils.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Stages of the intent cascade, in the order they are tried
+INTENT_STAGES = ["rules", "model", "llm", "default"]
+
+# How many transcripts each stage decided, for this worker process
+intent_stage_counts = {stage: 0 for stage in INTENT_STAGES}
+
+def get_intent_stage_stats() -> List[Dict[str, Any]]:
+    """Per-stage counts and hit rates of the intent cascade"""
+    total = sum(intent_stage_counts.values())
+    return [
+        {"stage": stage, "count": intent_stage_counts[stage], "rate": round(intent_stage_counts[stage] / total, 4) if total else 0.0}
+        for stage in INTENT_STAGES
+    ]
+
 class IntentService:
     def __init__(self):
         self.openai_api_key = settings.openai_api_key
@@ -23,7 +40,10 @@ class IntentService:
                 r"call.*again",
                 r"कॉलबैक.*शेड्यूल",  # Hindi patterns
                 r"वापस.*कॉल",
-                r"बाद में.*कॉल"
+                r"बाद में.*कॉल",
+                r"callback chahiye",  # Romanized Hindi patterns
+                r"baad mein.*call",
+                r"phir se call"
             ],
             "resolve_issue": [
                 r"resolve.*issue",
@@ -34,7 +54,9 @@ class IntentService:
                 r"resolved",
                 r"समस्या.*हल",  # Hindi patterns
                 r"समाधान",
-                r"सुलझा"
+                r"सुलझा",
+                r"theek ho gay",  # Romanized Hindi patterns
+                r"solve ho gay"
             ],
             "speak_agent": [
                 r"speak.*agent",
@@ -45,7 +67,9 @@ class IntentService:
                 r"manager",
                 r"एजेंट.*बात",  # Hindi patterns
                 r"व्यक्ति.*बात",
-                r"सुपरवाइजर"
+                r"सुपरवाइजर",
+                r"agent se baat",  # Romanized Hindi patterns
+                r"insaan se baat"
             ],
             "create_ticket": [
                 r"create.*ticket",
@@ -54,13 +78,19 @@ class IntentService:
                 r"ticket",
                 r"complaint",
                 r"टिकट.*बनाओ",  # Hindi patterns
-                r"शिकायत.*दर्ज"
+                r"शिकायत.*दर्ज",
+                r"ticket bana",  # Romanized Hindi patterns
+                r"shikayat"
             ]
         }
     
     async def extract_intent(self, text: str) -> str:
         """
-        Extract intent from text using OpenAI or rule-based approach
+        Extract intent from text with a cascade of increasingly expensive stages
+        
+        Intent patterns are tried first, then the local classifier, and
+        OpenAI is only called when the classifier isn't confident enough.
+        Without OpenAI the rule-based default applies.
         
         Args:
             text: The text to extract intent from
@@ -72,16 +102,48 @@ class IntentService:
             if not text:
                 return "unknown"
             
-            # Determine if we should use OpenAI or rule-based approach
-            if settings.use_openai_for_intent and self.openai_api_key:
-                return await self._extract_intent_openai(text)
-            else:
-                return self._extract_intent_rule_based(text)
+            intent = self._match_intent_patterns(text)
+            stage = "rules"
+            
+            if intent is None:
+                intent, confidence = self._classify_intent_locally(text)
+                stage = "model"
+                
+                if confidence < settings.intent_model_min_confidence:
+                    if settings.use_openai_for_intent and self.openai_api_key:
+                        intent = await self._extract_intent_openai(text)
+                        stage = "llm"
+                    else:
+                        intent = "general_inquiry"
+                        stage = "default"
+            
+            intent_stage_counts[stage] += 1
+            return intent
                 
         except Exception as e:
             logger.error(f"Error extracting intent: {e}")
             return "unknown"
     
+    def classify_offline(self, texts: List[str]) -> List[str]:
+        """
+        Classify a batch of transcripts with the patterns and the local classifier only
+        
+        Meant for bulk imports, where asking the LLM about each transcript is
+        too slow; transcripts the classifier isn't confident about get the
+        rule-based default instead.
+        """
+        intents: List[Optional[str]] = [self._match_intent_patterns(text) if text else "unknown" for text in texts]
+        
+        unmatched = [index for index, intent in enumerate(intents) if intent is None]
+        classifier = get_intent_classifier()
+        if unmatched and classifier is not None:
+            predictions = classifier.predict([texts[index] for index in unmatched])
+            for index, (intent, confidence) in zip(unmatched, predictions):
+                if confidence >= settings.intent_model_min_confidence:
+                    intents[index] = intent
+        
+        return [intent or "general_inquiry" for intent in intents]
+    
     async def _extract_intent_openai(self, text: str) -> str:
         """Extract intent using OpenAI API"""
         try:
@@ -100,6 +162,10 @@ class IntentService:
                     return "resolve_issue"
                 else:
                     return "general_inquiry"
+            elif settings.intent_batch_max_size > 1:
+                # Concurrent requests are combined into one API call
+                intent = await openai_intent_batcher.submit(text)
+                return intent or self._extract_intent_rule_based(text)
             else:
                 # Make actual OpenAI API call
                 prompt = f"""
@@ -115,7 +181,7 @@ class IntentService:
                 Intent:
                 """
                 
-                url = "https://api.openai.com/v1/chat/completions"
+                url = f"{settings.openai_base_url}/chat/completions"
                 headers = {
                     "Authorization": f"Bearer {self.openai_api_key}",
                     "Content-Type": "application/json"
@@ -154,28 +220,54 @@ class IntentService:
             # Fall back to rule-based approach
             return self._extract_intent_rule_based(text)
     
+    def _match_intent_patterns(self, text: str) -> Optional[str]:
+        """Return the intent of the first matching pattern, or None"""
+        text_lower = text.lower()
+        
+        for intent, patterns in self.intent_patterns.items():
+            for pattern in patterns:
+                if re.search(pattern, text_lower, re.IGNORECASE):
+                    logger.info(f"Rule-based intent detected: {intent}")
+                    return intent
+        
+        return None
+    
     def _extract_intent_rule_based(self, text: str) -> str:
         """Extract intent using rule-based pattern matching"""
         try:
-            text_lower = text.lower()
-            
-            for intent, patterns in self.intent_patterns.items():
-                for pattern in patterns:
-                    if re.search(pattern, text_lower, re.IGNORECASE):
-                        logger.info(f"Rule-based intent detected: {intent}")
-                        return intent
-            
             # Default intent if no patterns match
-            return "general_inquiry"
+            return self._match_intent_patterns(text) or "general_inquiry"
             
         except Exception as e:
             logger.error(f"Error in rule-based intent extraction: {e}")
             return "unknown"
     
+    def _classify_intent_locally(self, text: str) -> Tuple[Optional[str], float]:
+        """Classify intent with the local model, returning (None, 0.0) if no model is trained"""
+        classifier = get_intent_classifier()
+        if classifier is None:
+            return None, 0.0
+        
+        intent, confidence = classifier.predict([text])[0]
+        logger.info(f"Local classifier intent: {intent} ({confidence:.2f})")
+        return intent, confidence
+    
+    def identify_language(self, text: str) -> Tuple[str, float]:
+        """
+        Identify the language of the text with the local n-gram model
+        
+        Returns:
+            Language label (en/hi/hi-Latn) and its probability
+        """
+        return get_language_identifier().predict([text])[0]
+    
     async def detect_language(self, text: str) -> str:
         """
         Detect language of the text
         
+        Romanized Hindi is reported as hi, so it gets the Hindi voice and
+        patterns. When the model isn't confident the character set decides.
+        
         Args:
             text: The text to detect language for
             
@@ -183,8 +275,10 @@ class IntentService:
             Language code (en/hi)
         """
         try:
-            # Simple language detection based on character set
-            # This is a simplified approach; in production, use a proper language detection library
+            label, confidence = self.identify_language(text)
+            if confidence >= settings.language_id_min_confidence:
+                return "en" if label == "en" else "hi"
+            
             devanagari_pattern = re.compile(r'[\u0900-\u097F]')
             if devanagari_pattern.search(text):
                 return "hi"
@@ -193,4 +287,73 @@ class IntentService:
                 
         except Exception as e:
             logger.error(f"Error detecting language: {e}")
-            return "en"  # Default to English
\ No newline at end of file
+            return "en"  # Default to English
+
+async def _request_intents_openai(texts: List[str]) -> List[Optional[str]]:
+    """
+    Classify a batch of transcripts with a single chat completion
+    
+    Returns:
+        One intent per transcript, None where the response has no valid intent
+    """
+    transcripts = "\n".join(f"{number}. {json.dumps(text, ensure_ascii=False)}" for number, text in enumerate(texts, 1))
+    prompt = f"""
+    Extract the primary customer intent from each numbered text. Choose ONE of the following intent categories for each:
+    - schedule_callback: Customer wants to schedule a callback or be contacted later
+    - create_ticket: Customer wants to report an issue or create a support ticket
+    - speak_agent: Customer wants to speak with a human agent or supervisor
+    - resolve_issue: Customer is confirming an issue is resolved or fixed
+    - general_inquiry: Customer has a general question or other intent
+    
+    Texts:
+    {transcripts}
+    
+    Respond with a JSON object of the form {{"intents": [{{"id": 1, "intent": "..."}}]}} with one entry per text.
+    """
+    
+    url = f"{settings.openai_base_url}/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {settings.openai_api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": "gpt-3.5-turbo",
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.3,
+        "max_tokens": 20 * len(texts) + 20,
+        "response_format": {"type": "json_object"}
+    }
+    
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, headers=headers, json=data) as response:
+            if response.status != 200:
+                raise RuntimeError(f"OpenAI API error: {await response.text()}")
+            result = await response.json()
+    
+    intents: List[Optional[str]] = [None] * len(texts)
+    try:
+        entries = json.loads(result["choices"][0]["message"]["content"])["intents"]
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        logger.error(f"Unparseable batched intent response: {e}")
+        return intents
+    
+    for entry in entries:
+        try:
+            index = int(entry["id"]) - 1
+            intent = str(entry["intent"]).strip().lower()
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(texts) and intent in INTENT_LABELS:
+            intents[index] = intent
+    
+    missing = intents.count(None)
+    if missing:
+        logger.warning(f"Batched intent response had no valid intent for {missing} of {len(texts)} texts")
+    return intents
+
+# Shared by all IntentService instances in this worker process
+openai_intent_batcher = MicroBatcher(
+    _request_intents_openai,
+    max_batch_size=settings.intent_batch_max_size,
+    max_wait_ms=settings.intent_batch_max_wait_ms
+)
@@ -0,0 +1,102 @@
+from functools import lru_cache
+from typing import List, Tuple, Iterable
+import logging
+import os
+
+import numpy as np
+
+from app.utils.ngrams import char_ngram_keys
+
+logger = logging.getLogger(__name__)
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "language_corpus.tsv")
+
+LANGUAGE_LABELS = ["en", "hi", "hi-Latn"]
+
+# Character n-gram orders used as features
+NGRAM_ORDERS = (1, 2, 3)
+
+# Log-likelihoods are rescaled as if the text had at most this many n-grams,
+# so long utterances don't produce saturated 0/1 confidences
+CONFIDENCE_NGRAM_CAP = 24
+
+class LanguageIdentifier:
+    """
+    Character n-gram naive Bayes classifier for en, hi and romanized hi
+
+    The model is a sorted array of n-gram keys and a matching matrix of
+    per-language log-probabilities, scored for a whole batch at once.
+    """
+    def __init__(self, vocabulary: np.ndarray, log_probs: np.ndarray, log_priors: np.ndarray, labels: List[str]):
+        self.vocabulary = vocabulary
+        self.log_probs = log_probs
+        self.log_priors = log_priors
+        self.labels = labels
+
+    @classmethod
+    def train(cls, samples: Iterable[Tuple[str, str]], alpha: float = 0.5) -> "LanguageIdentifier":
+        """
+        Train from (label, text) pairs
+
+        Args:
+            samples: Labelled utterances
+            alpha: Additive smoothing for unseen n-grams
+        """
+        samples = list(samples)
+        labels = [label for label in LANGUAGE_LABELS if any(sample[0] == label for sample in samples)]
+        label_ids = np.array([labels.index(label) for label, _ in samples])
+
+        keys, owners = char_ngram_keys([text for _, text in samples], NGRAM_ORDERS)
+        vocabulary, key_ids = np.unique(keys, return_inverse=True)
+
+        counts = np.zeros((len(labels), len(vocabulary)))
+        np.add.at(counts, (label_ids[owners], key_ids), 1)
+
+        log_probs = np.log(counts + alpha) - np.log(counts.sum(axis=1, keepdims=True) + alpha * len(vocabulary))
+        log_priors = np.log(np.bincount(label_ids, minlength=len(labels)) / len(samples))
+        return cls(vocabulary, log_probs.T.copy(), log_priors, labels)
+
+    @classmethod
+    def from_corpus(cls, path: str = CORPUS_PATH) -> "LanguageIdentifier":
+        """Train from a tab-separated file of label and text lines"""
+        samples = []
+        with open(path, encoding="utf-8") as corpus:
+            for line in corpus:
+                if line.strip() and not line.startswith("#"):
+                    label, text = line.rstrip("\n").split("\t", 1)
+                    samples.append((label, text))
+        return cls.train(samples)
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        """Return a (len(texts), len(labels)) array of language probabilities"""
+        keys, owners = char_ngram_keys(texts, NGRAM_ORDERS)
+        positions = np.minimum(np.searchsorted(self.vocabulary, keys), len(self.vocabulary) - 1)
+        known = self.vocabulary[positions] == keys
+        positions, owners = positions[known], owners[known]
+
+        scores = np.empty((len(texts), len(self.labels)))
+        for label_id in range(len(self.labels)):
+            scores[:, label_id] = np.bincount(owners, weights=self.log_probs[positions, label_id], minlength=len(texts))
+
+        ngram_counts = np.bincount(owners, minlength=len(texts))
+        scale = np.minimum(ngram_counts, CONFIDENCE_NGRAM_CAP) / np.maximum(ngram_counts, 1)
+        scores = scores * scale[:, None] + self.log_priors
+
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def predict(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Return the most likely language and its probability for each text"""
+        if not texts:
+            return []
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [(self.labels[label_id], float(probabilities[row, label_id])) for row, label_id in enumerate(best)]
+
+@lru_cache()
+def get_language_identifier() -> LanguageIdentifier:
+    """Load the identifier trained on the bundled corpus, once per process"""
+    identifier = LanguageIdentifier.from_corpus()
+    logger.info(f"Language identifier trained: {len(identifier.vocabulary)} n-grams, labels {identifier.labels}")
+    return identifier
@@ -0,0 +1,163 @@
+"""
+Sliding-window call metrics kept in memory
+
+Each worker counts call events into a ring of per-second buckets, so the
+counts of the last few minutes are a fixed-size sum that never touches the
+database. Under the pre-fork server the rings of all workers live in one
+shared mapping created before forking; any worker serves the merged
+figures, and each worker only writes its own ring.
+"""
+from typing import Any, Dict, Optional
+import mmap
+import threading
+import time
+
+import numpy as np
+
+from app.utils.config import get_settings
+from app.utils.prefork import get_worker_table
+
+settings = get_settings()
+
+# Key counted when a worker has run out of key columns
+OVERFLOW_KEY = "other"
+
+# Longest key stored in bytes; longer intents are truncated
+MAX_KEY_BYTES = 64
+
+def _stored_key(key: str) -> str:
+    """A key as it fits in a name column: at most MAX_KEY_BYTES of UTF-8, cut between characters"""
+    return key.encode()[:MAX_KEY_BYTES].decode(errors="ignore")
+
+class LiveMetrics:
+    """
+    Per-second event counts of every worker over the last window_seconds
+
+    A worker's ring holds window_seconds buckets of max_keys counters. Keys
+    such as "status:completed" get a column the first time they are seen;
+    the key names are stored in shared memory too, so other workers can
+    merge by name and a restarted worker picks up its predecessor's columns.
+    """
+    def __init__(self, slots: int, window_seconds: int, max_keys: int):
+        self.slots = slots
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+
+        names_bytes = slots * max_keys * MAX_KEY_BYTES
+        seconds_bytes = slots * window_seconds * 8
+        counts_bytes = slots * window_seconds * max_keys * 4
+        self._buffer = mmap.mmap(-1, names_bytes + seconds_bytes + counts_bytes)
+        self.names = np.ndarray((slots, max_keys), dtype=f"S{MAX_KEY_BYTES}", buffer=self._buffer)
+        self.seconds = np.ndarray((slots, window_seconds), dtype=np.int64, buffer=self._buffer, offset=names_bytes)
+        self.counts = np.ndarray((slots, window_seconds, max_keys), dtype=np.uint32, buffer=self._buffer,
+                                 offset=names_bytes + seconds_bytes)
+
+        self._columns: Dict[str, int] = {}
+        self._columns_slot: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _column(self, slot: int, key: str) -> int:
+        if self._columns_slot != slot:
+            # First write from this process: adopt the columns already in the row
+            self._columns = {name.decode(): column for column, name in enumerate(self.names[slot]) if name}
+            self._columns_slot = slot
+
+        # Looked up as stored, so a restarted worker finds the columns of truncated keys
+        key = _stored_key(key)
+        column = self._columns.get(key)
+        if column is None:
+            # The last column is kept for keys that don't fit
+            column = len(self._columns) if len(self._columns) < self.max_keys - 1 else self.max_keys - 1
+            if column == self.max_keys - 1:
+                self.names[slot, column] = OVERFLOW_KEY.encode()
+            else:
+                self.names[slot, column] = key.encode()
+            self._columns[key] = column
+        return column
+
+    def record(self, *keys: str) -> None:
+        """Count one occurrence of each key in the current second"""
+        slot = get_worker_table().slot
+        now = int(time.time())
+        bucket = now % self.window_seconds
+
+        with self._lock:
+            if self.seconds[slot, bucket] != now:
+                self.counts[slot, bucket] = 0
+                self.seconds[slot, bucket] = now
+            for key in keys:
+                self.counts[slot, bucket, self._column(slot, key)] += 1
+
+    def snapshot(self, window_seconds: int) -> Dict[str, Any]:
+        """
+        Counts of every key over the last window_seconds, merged across workers
+
+        Returns:
+            totals: key -> count over the window
+            per_second: key -> counts of each second, oldest first
+        """
+        window_seconds = max(1, min(window_seconds, self.window_seconds))
+        now = int(time.time())
+        age = now - self.seconds
+        fresh = (age >= 0) & (age < window_seconds)
+
+        per_second: Dict[str, np.ndarray] = {}
+        for slot in range(self.slots):
+            names = self.names[slot]
+            used = np.flatnonzero(names)
+            if not len(used):
+                continue
+
+            rows = np.flatnonzero(fresh[slot])
+            series = np.zeros((window_seconds, len(used)), dtype=np.int64)
+            series[window_seconds - 1 - age[slot, rows]] = self.counts[slot][np.ix_(rows, used)]
+
+            for column, name in enumerate(names[used]):
+                key = name.decode()
+                merged = per_second.get(key)
+                per_second[key] = series[:, column] if merged is None else merged + series[:, column]
+
+        return {
+            "totals": {key: int(counts.sum()) for key, counts in per_second.items()},
+            "per_second": {key: counts.tolist() for key, counts in per_second.items()},
+        }
+
+    def call_metrics(self, window_seconds: int) -> Dict[str, Any]:
+        """Calls started, status changes and intents over the last window_seconds"""
+        snapshot = self.snapshot(window_seconds)
+        grouped: Dict[str, Dict[str, int]] = {"created": {}, "status": {}, "intent": {}}
+        for key, count in snapshot["totals"].items():
+            if key == OVERFLOW_KEY:
+                # Statuses and directions are few and seen first, so overflow is intents
+                grouped["intent"][key] = count
+                continue
+            group, _, value = key.partition(":")
+            if group in grouped:
+                grouped[group][value] = count
+
+        per_second = [0] * max(1, min(window_seconds, self.window_seconds))
+        for key, counts in snapshot["per_second"].items():
+            if key.startswith("created:"):
+                per_second = [total + count for total, count in zip(per_second, counts)]
+
+        return {
+            "window_seconds": len(per_second),
+            "calls_started": sum(grouped["created"].values()),
+            "calls_started_per_second": per_second,
+            "by_direction": grouped["created"],
+            "by_status": grouped["status"],
+            "by_intent": grouped["intent"],
+        }
+
+_live_metrics: Optional[LiveMetrics] = None
+
+def allocate_live_metrics(slots: int) -> None:
+    """Create the shared rings for the given number of workers; called by the pre-fork master"""
+    global _live_metrics
+    _live_metrics = LiveMetrics(slots, settings.live_metrics_window_seconds, settings.live_metrics_max_keys)
+
+def get_live_metrics() -> LiveMetrics:
+    """The shared rings under the pre-fork server, otherwise rings for this process only"""
+    if _live_metrics is None:
+        allocate_live_metrics(1)
+    return _live_metrics
@@ -0,0 +1,79 @@
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Collects items submitted concurrently and processes them together
+
+    The first item of a batch starts a timer; the batch is sent when it is
+    full or when the timer fires, whichever comes first. process_batch gets
+    the list of items and returns one result per item; callers whose item
+    has no result get None. If it raises, every caller in that batch gets
+    the exception.
+    """
+    def __init__(self, process_batch: Callable[[List[Any]], Awaitable[List[Any]]], max_batch_size: int, max_wait_ms: float):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # The loop only keeps weak references to tasks, so in-flight batches are held here
+        self._sending: Set[asyncio.Task] = set()
+        self.batches_sent = 0
+        self.items_sent = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item for the next batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures can't cross event loops, so start over on a new loop
+            self._pending, self._timer, self._loop = [], None, loop
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sent)
+
+    def _sent(self, task: asyncio.Task) -> None:
+        self._sending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error sending batch: {task.exception()}")
+
+    async def _send(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        self.batches_sent += 1
+        self.items_sent += len(batch)
+
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(batch)} items: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        results = list(results)[:len(batch)]
+        results += [None] * (len(batch) - len(results))
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,202 @@
+from functools import lru_cache
+from typing import Optional, List, Tuple
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+
+from app.utils.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# After eviction the store is brought down to this share of its bound, so
+# the directory is rescanned once per that much new data rather than on
+# every write
+EVICTION_TARGET = 0.9
+
+class RecordingStore:
+    """
+    Content-addressed store of recording audio on local disk
+
+    Each recording is saved once under the SHA-256 of its bytes, and served
+    from disk by the recording audio endpoint. Transcripts are memoized next
+    to the audio, keyed by (content hash, language, model), so identical
+    audio is only transcribed once.
+
+    Files are written to a temporary name and renamed into place, so
+    several workers can share one directory. Reads update the file's
+    modification time, and when the store grows past max_bytes the least
+    recently used files are deleted.
+    """
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._estimated_bytes: Optional[int] = None
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _audio_path(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash)
+
+    def _transcript_path(self, content_hash: str, language: str, model: str) -> str:
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.{language}.{model}.json")
+
+    def _write(self, path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "wb") as temporary_file:
+                temporary_file.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+        self._added(len(data))
+
+    def _touch(self, path: str) -> bool:
+        """Mark a file as recently used, returning False if it's gone"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def put(self, data: bytes) -> str:
+        """Save audio unless it is already stored and return its content hash"""
+        content_hash = self.content_hash(data)
+        path = self._audio_path(content_hash)
+        if not self._touch(path):
+            self._write(path, data)
+        return content_hash
+
+    def contains(self, content_hash: str) -> bool:
+        return os.path.exists(self._audio_path(content_hash))
+
+    def size(self, content_hash: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self._audio_path(content_hash))
+        except FileNotFoundError:
+            return None
+
+    def get(self, content_hash: str) -> Optional[bytes]:
+        """Return stored audio, or None if it was never stored or has been evicted"""
+        return self.read_range(content_hash, 0, None)
+
+    def read_range(self, content_hash: str, start: int, end: Optional[int]) -> Optional[bytes]:
+        """
+        Read bytes [start, end) of stored audio through a memory map
+
+        Only the requested pages are read from disk, so serving a range of a
+        long recording costs the size of the range, not of the file.
+
+        Returns:
+            The bytes, or None if the audio isn't stored
+        """
+        path = self._audio_path(content_hash)
+        try:
+            with open(path, "rb") as audio_file:
+                if os.fstat(audio_file.fileno()).st_size == 0:
+                    return b""
+                with mmap.mmap(audio_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    data = mapped[start:end]
+        except FileNotFoundError:
+            return None
+
+        self._touch(path)
+        return data
+
+    def get_transcript(self, content_hash: str, language: str, model: str) -> Optional[List[Tuple[float, Optional[float], str]]]:
+        """Return memoized transcript segments as (start, end, text) tuples"""
+        path = self._transcript_path(content_hash, language, model)
+        try:
+            with open(path, encoding="utf-8") as transcript_file:
+                segments = json.load(transcript_file)["segments"]
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable memoized transcript {path}: {e}")
+            return None
+
+        self._touch(path)
+        return [tuple(segment) for segment in segments]
+
+    def put_transcript(self, content_hash: str, language: str, model: str, segments: List[Tuple[float, Optional[float], str]]) -> None:
+        """Memoize transcript segments of stored audio"""
+        data = json.dumps({"segments": [list(segment) for segment in segments]}, ensure_ascii=False)
+        self._write(self._transcript_path(content_hash, language, model), data.encode("utf-8"))
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            if self._estimated_bytes is None:
+                self._estimated_bytes = self._scan_bytes()
+            else:
+                self._estimated_bytes += size
+            over_bound = self._estimated_bytes > self.max_bytes
+
+        if over_bound:
+            self.evict()
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        """List (last used, size, path) of every stored file"""
+        entries = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_bytes(self) -> int:
+        return sum(size for _, size, _ in self._scan())
+
+    def evict(self) -> int:
+        """
+        Delete least recently used files until the store is below its bound
+
+        The directory is scanned rather than tracked in memory, so files
+        added by other workers are accounted for.
+
+        Returns:
+            Number of bytes freed
+        """
+        with self._lock:
+            entries = sorted(self._scan())
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * EVICTION_TARGET)
+            freed, removed = 0, 0
+
+            for _, size, path in entries:
+                if total - freed <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                freed += size
+                removed += 1
+
+            self._estimated_bytes = total - freed
+
+        if removed:
+            logger.info(f"Evicted {removed} files ({freed} bytes) from recording store {self.root}")
+        return freed
+
+@lru_cache()
+def get_recording_store() -> RecordingStore:
+    return RecordingStore(settings.recording_store_dir, settings.recording_store_max_bytes)
@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, NamedTuple, Tuple
 import logging
 import os
 import requests
@@ -8,12 +8,36 @@ from fastapi.responses import Response
 import aiohttp
 import tempfile
 import asyncio
+import time
 
+import numpy as np
+
+from app.utils.audio import (
+    BYTES_PER_SAMPLE, WAV_HEADER_BYTES, PreparedAudio, is_wav, decode_wav, encode_wav, split_at_silence, prepare_for_transcription
+)
+from app.services.recording_store import get_recording_store
 from app.utils.config import get_settings
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Whisper model used for transcription, part of the memoized transcript key
+TRANSCRIPTION_MODEL = "whisper-1"
+
+class StoredRecording(NamedTuple):
+    content_hash: str  # SHA-256 of the audio, its key in the recording store
+    data: bytes
+
+class AudioUpload(NamedTuple):
+    start: float  # Seconds from the start of the original recording
+    end: float
+    data: bytes  # WAV file
+
+class TranscriptSegment(NamedTuple):
+    start: float  # Seconds from the start of the recording
+    end: Optional[float]  # None when the audio length isn't known
+    text: str
+
 class VoiceService:
     def __init__(self):
         self.elevenlabs_api_key = settings.elevenlabs_api_key
@@ -88,63 +112,242 @@ class VoiceService:
         Returns:
             Transcription text or None if failed
         """
+        segments = await self.transcribe_audio_segments(audio_url, language)
+        if segments is None:
+            return None
+        return self.join_segments(segments)
+    
+    async def transcribe_audio_segments(self, audio_url: str, language: str = "en") -> Optional[List[TranscriptSegment]]:
+        """
+        Transcribe audio, splitting long WAV recordings into segments
+        
+        Args:
+            audio_url: The URL of the audio file to transcribe
+            language: The language code (en/hi)
+            
+        Returns:
+            Transcribed segments in order, or None if any segment failed
+        """
+        logger.info(f"Transcribing audio from {audio_url} in {language}")
+        recording = await self.fetch_recording(audio_url)
+        return await self.transcribe_recording(recording, language)
+    
+    async def fetch_recording(self, audio_url: str) -> Optional[StoredRecording]:
+        """
+        Download recording audio and save it in the local recording store
+        
+        Args:
+            audio_url: The URL to download the audio from
+            
+        Returns:
+            The audio and its content hash, or None if it couldn't be
+            downloaded (always None when external services are mocked)
+        """
+        if settings.mock_external_services:
+            return None
+        
+        store = get_recording_store()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(audio_url) as response:
+                    if response.status != 200:
+                        logger.error(f"Failed to download audio: {response.status}")
+                        return None
+                    audio_data = await response.read()
+            
+            content_hash = await asyncio.to_thread(store.put, audio_data)
+            return StoredRecording(content_hash, audio_data)
+        except Exception as e:
+            logger.error(f"Error fetching recording {audio_url}: {e}")
+            return None
+    
+    async def transcribe_recording(self, recording: Optional[StoredRecording], language: str = "en") -> Optional[List[TranscriptSegment]]:
+        """
+        Transcribe fetched audio, reusing the transcript of identical audio
+        
+        Transcripts are memoized in the recording store by content hash,
+        language and model, so the same audio is sent to Whisper only once.
+        
+        WAV recordings longer than TRANSCRIPTION_SEGMENT_SECONDS (or than fits
+        in one upload) are cut at the quietest point near each segment's end,
+        and the segments are transcribed concurrently, at most
+        TRANSCRIPTION_CONCURRENCY at a time. Other formats are sent whole.
+        
+        WAV audio is first reduced to what Whisper needs (see _prepare_audio);
+        segment times still refer to the original recording.
+        
+        Args:
+            recording: Audio returned by fetch_recording
+            language: The language code (en/hi)
+            
+        Returns:
+            Transcribed segments in order, or None if any segment failed
+        """
         try:
             # For demo/mock purposes, we'll return a dummy transcript
             # In a real implementation, this would download the audio and send to OpenAI
-            logger.info(f"Transcribing audio from {audio_url} in {language}")
-            
             if settings.mock_external_services:
                 # Return mock transcript based on language
                 if language == "en":
-                    return "I would like to schedule a callback for tomorrow afternoon."
+                    text = "I would like to schedule a callback for tomorrow afternoon."
                 else:
-                    return "मुझे कल दोपहर के लिए एक कॉलबैक शेड्यूल करना होगा।"
-            else:
-                # Download the audio file
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(audio_url) as response:
-                        if response.status != 200:
-                            logger.error(f"Failed to download audio: {response.status}")
-                            return None
-                        
-                        # Save the audio to a temporary file
-                        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                            temp_file.write(await response.read())
-                            temp_file_path = temp_file.name
-                
-                # Transcribe with OpenAI Whisper
-                try:
-                    openai_url = "https://api.openai.com/v1/audio/transcriptions"
-                    headers = {
-                        "Authorization": f"Bearer {self.openai_api_key}"
-                    }
-                    
-                    with open(temp_file_path, "rb") as audio_file:
-                        files = {
-                            "file": audio_file,
-                            "model": (None, "whisper-1"),
-                            "language": (None, language)
-                        }
-                        
-                        async with aiohttp.ClientSession() as session:
-                            async with session.post(openai_url, headers=headers, data=files) as response:
-                                if response.status == 200:
-                                    result = await response.json()
-                                    return result.get("text")
-                                else:
-                                    error_text = await response.text()
-                                    logger.error(f"OpenAI API error: {error_text}")
-                                    return None
-                                
-                finally:
-                    # Clean up the temporary file
-                    if os.path.exists(temp_file_path):
-                        os.remove(temp_file_path)
+                    text = "मुझे कल दोपहर के लिए एक कॉलबैक शेड्यूल करना होगा।"
+                return [TranscriptSegment(0.0, None, text)]
+            
+            if recording is None:
+                return None
+            
+            store = get_recording_store()
+            memoized = await asyncio.to_thread(store.get_transcript, recording.content_hash, language, TRANSCRIPTION_MODEL)
+            if memoized is not None:
+                logger.info(f"Reusing transcript of recording {recording.content_hash[:12]}")
+                return [TranscriptSegment(*segment) for segment in memoized]
+            
+            async with aiohttp.ClientSession() as session:
+                segments = await self._transcribe_audio_data(session, recording.data, language)
+            
+            await asyncio.to_thread(store.put_transcript, recording.content_hash, language, TRANSCRIPTION_MODEL, segments)
+            return segments
                 
         except Exception as e:
             logger.error(f"Error in transcribe_audio: {e}")
             return None
     
+    async def _transcribe_audio_data(self, session: aiohttp.ClientSession, audio_data: bytes, language: str) -> List[TranscriptSegment]:
+        """Transcribe downloaded audio, in concurrent segments if it is a long WAV recording"""
+        if not is_wav(audio_data):
+            text = await self._transcribe_upload(session, audio_data, "recording.mp3", language)
+            return [TranscriptSegment(0.0, None, text)]
+        
+        # Decoding, resampling, VAD and encoding take ~0.3s per minute of audio; kept off the event loop
+        prepared = await asyncio.to_thread(self._prepare_uploads, audio_data)
+        if prepared is None:
+            text = await self._transcribe_upload(session, audio_data, "recording.wav", language)
+            return [TranscriptSegment(0.0, None, text)]
+        
+        duration, uploads = prepared
+        if not uploads:
+            logger.info("No speech found in recording, skipping transcription")
+            return [TranscriptSegment(0.0, duration, "")]
+        
+        if len(uploads) == 1:
+            text = await self._transcribe_upload(session, uploads[0].data, "recording.wav", language)
+            return [TranscriptSegment(0.0, duration, text)]
+        
+        logger.info(f"Transcribing {duration:.0f}s recording in {len(uploads)} segments")
+        semaphore = asyncio.Semaphore(settings.transcription_concurrency)
+        
+        async def transcribe_segment(upload: AudioUpload) -> TranscriptSegment:
+            async with semaphore:
+                text = await self._transcribe_upload(session, upload.data, "segment.wav", language)
+            return TranscriptSegment(upload.start, upload.end, text)
+        
+        return list(await asyncio.gather(*[transcribe_segment(upload) for upload in uploads]))
+    
+    def _prepare_uploads(self, audio_data: bytes) -> Optional[Tuple[float, List[AudioUpload]]]:
+        """
+        Prepare a WAV recording and cut it into segments that fit in one upload
+        
+        Returns:
+            The recording's length in seconds and its segments in order, none
+            if it has no speech; or None if the WAV data can't be decoded
+        """
+        prepared = self._prepare_audio(audio_data)
+        if prepared is None:
+            return None
+        
+        samples, sample_rate = prepared.samples, prepared.sample_rate
+        duration = prepared.source_duration
+        if len(samples) == 0:
+            return duration, []
+        
+        # Samples are only left with several channels when preprocessing is off
+        bytes_per_frame = BYTES_PER_SAMPLE * (samples.shape[1] if samples.ndim == 2 else 1)
+        max_segment_seconds = min(
+            settings.transcription_segment_seconds,
+            (settings.transcription_max_upload_bytes - WAV_HEADER_BYTES) / (sample_rate * bytes_per_frame)
+        )
+        bounds = split_at_silence(samples, sample_rate, max_segment_seconds)
+        
+        def source_span(start: int, end: int) -> Tuple[float, float]:
+            # Times in the original recording, which includes the trimmed silences
+            return prepared.source_seconds(start), duration if end == len(samples) else prepared.source_seconds(end)
+        
+        return duration, [
+            AudioUpload(*source_span(start, end), encode_wav(samples[start:end], sample_rate)) for start, end in bounds
+        ]
+    
+    def _prepare_audio(self, audio_data: bytes) -> Optional[PreparedAudio]:
+        """
+        Decode a WAV recording and cut it down before upload
+        
+        Channels are mixed to mono, audio above AUDIO_TARGET_SAMPLE_RATE is
+        downsampled to it, and pauses longer than AUDIO_MAX_PAUSE_MS are
+        shortened by an energy-based voice activity detector. Whisper works on
+        16 kHz mono internally, so this only removes bytes it would discard.
+        
+        Returns:
+            The prepared audio, or None if the WAV data can't be decoded
+        """
+        try:
+            samples, sample_rate = decode_wav(audio_data)
+        except Exception as e:
+            logger.warning(f"Could not decode WAV recording, uploading it as is: {e}")
+            return None
+        
+        if not settings.audio_preprocessing_enabled:
+            duration = len(samples) / sample_rate
+            return PreparedAudio(samples, sample_rate, np.zeros(1, dtype=np.int64), np.zeros(1), duration)
+        
+        started = time.perf_counter()
+        prepared = prepare_for_transcription(
+            samples, sample_rate, settings.audio_target_sample_rate, settings.audio_max_pause_ms
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        minutes = max(prepared.source_duration / 60, 1e-9)
+        output_bytes = len(prepared.samples) * BYTES_PER_SAMPLE
+        logger.info(
+            f"Prepared {prepared.source_duration:.0f}s of audio in {elapsed_ms:.0f}ms ({elapsed_ms / minutes:.1f}ms per minute): "
+            f"{len(audio_data)} -> {output_bytes} bytes ({1 - output_bytes / max(len(audio_data), 1):.0%} saved), "
+            f"{len(prepared.samples) / prepared.sample_rate:.0f}s kept"
+        )
+        return prepared
+    
+    async def _transcribe_upload(self, session: aiohttp.ClientSession, audio_data: bytes, filename: str, language: str) -> str:
+        """Send one audio file to OpenAI Whisper and return its text"""
+        openai_url = f"{settings.openai_base_url}/audio/transcriptions"
+        headers = {
+            "Authorization": f"Bearer {self.openai_api_key}"
+        }
+        
+        form = aiohttp.FormData()
+        form.add_field("file", audio_data, filename=filename)
+        form.add_field("model", TRANSCRIPTION_MODEL)
+        form.add_field("language", language)
+        
+        async with session.post(openai_url, headers=headers, data=form) as response:
+            if response.status == 200:
+                result = await response.json()
+                return result.get("text") or ""
+            else:
+                error_text = await response.text()
+                logger.error(f"OpenAI API error: {error_text}")
+                raise Exception(f"OpenAI API error: {response.status}")
+    
+    @staticmethod
+    def join_segments(segments: List[TranscriptSegment]) -> str:
+        """Plain transcript text of a list of segments"""
+        return " ".join(segment.text.strip() for segment in segments if segment.text.strip())
+    
+    @staticmethod
+    def format_timestamped_transcript(segments: List[TranscriptSegment]) -> str:
+        """One line per segment, prefixed with its start time as [mm:ss]"""
+        return "\n".join(
+            f"[{int(segment.start // 60):02d}:{int(segment.start % 60):02d}] {segment.text.strip()}"
+            for segment in segments
+        )
+    
     def generate_twilio_welcome_twiml(self) -> Response:
         """Generate TwiML for welcoming the caller"""
         twiml = """
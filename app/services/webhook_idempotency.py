@@ -0,0 +1,175 @@
+from collections import OrderedDict
+from typing import Optional, Tuple, NamedTuple
+import asyncio
+import logging
+import threading
+import time
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database.db import SessionLocal
+from app.models.database import WebhookEvent
+from app.utils.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# (provider, call id, event, sequence)
+WebhookKey = Tuple[str, str, str, str]
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    media_type: str
+    body: str
+
+# Returned for a duplicate that arrives while the first delivery is still
+# being processed. Providers retry non-2xx responses, and the retry then
+# gets the stored response.
+IN_PROGRESS_RESPONSE = StoredResponse(409, "application/json", '{"detail":"Webhook is already being processed"}')
+
+class WebhookIdempotency:
+    """
+    Remembers webhook responses so provider retries are answered without
+    running the handlers again
+
+    Deliveries are keyed by (provider, call id, event, sequence). The first
+    delivery claims its key with a row in webhook_events, whose unique
+    constraint makes the claim atomic across workers; its response is then
+    stored on the row. Recent responses are also kept in a bounded LRU, so a
+    retry storm is answered from memory without touching the database.
+    """
+    def __init__(self, max_entries: int, claim_timeout_seconds: float):
+        self.max_entries = max_entries
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self._responses: "OrderedDict[WebhookKey, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: WebhookKey, response: StoredResponse) -> None:
+        with self._lock:
+            self._responses[key] = response
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.max_entries:
+                self._responses.popitem(last=False)
+
+    def _recall(self, key: WebhookKey) -> Optional[StoredResponse]:
+        with self._lock:
+            response = self._responses.get(key)
+            if response is not None:
+                self._responses.move_to_end(key)
+            return response
+
+    @staticmethod
+    def _find(db: Session, key: WebhookKey) -> Optional[WebhookEvent]:
+        provider, call_id, event, sequence = key
+        return db.query(WebhookEvent).filter_by(provider=provider, call_id=call_id, event=event, sequence=sequence).first()
+
+    def claim(self, db: Session, key: WebhookKey) -> Optional[StoredResponse]:
+        """
+        Claim a delivery for processing
+
+        Returns:
+            None if the caller should process the delivery and then call
+            complete() or release(), otherwise the response to send instead
+        """
+        response = self._recall(key)
+        if response is not None:
+            self.hits += 1
+            return response
+
+        row = self._find(db, key)
+        if row is None:
+            provider, call_id, event, sequence = key
+            db.add(WebhookEvent(provider=provider, call_id=call_id, event=event, sequence=sequence, claimed_at=time.time()))
+            try:
+                db.commit()
+                self.misses += 1
+                return None
+            except IntegrityError:
+                # Another worker claimed it first
+                db.rollback()
+                row = self._find(db, key)
+                if row is None:
+                    # ...and released it again since
+                    return self.claim(db, key)
+
+        if row.status_code is not None:
+            response = StoredResponse(row.status_code, row.media_type, row.body)
+            self._remember(key, response)
+            self.hits += 1
+            return response
+
+        # Take over a claim left behind by a worker that died mid-delivery,
+        # conditionally so only one duplicate wins
+        if time.time() - (row.claimed_at or 0) > self.claim_timeout_seconds:
+            taken = db.query(WebhookEvent).filter(
+                WebhookEvent.id == row.id,
+                WebhookEvent.status_code.is_(None),
+                WebhookEvent.claimed_at == row.claimed_at
+            ).update({"claimed_at": time.time()}, synchronize_session=False)
+            db.commit()
+            if taken:
+                logger.warning(f"Taking over stale webhook claim {key}")
+                self.misses += 1
+                return None
+
+        return IN_PROGRESS_RESPONSE
+
+    def complete(self, db: Session, key: WebhookKey, response: StoredResponse) -> None:
+        """Store the response of a claimed delivery"""
+        provider, call_id, event, sequence = key
+        db.query(WebhookEvent).filter_by(provider=provider, call_id=call_id, event=event, sequence=sequence).update(
+            {"status_code": response.status_code, "media_type": response.media_type, "body": response.body},
+            synchronize_session=False
+        )
+        db.commit()
+        self._remember(key, response)
+
+    def release(self, db: Session, key: WebhookKey) -> None:
+        """Give up a claim after a failure, so the provider's retry is processed again"""
+        provider, call_id, event, sequence = key
+        try:
+            db.rollback()
+            db.query(WebhookEvent).filter_by(
+                provider=provider, call_id=call_id, event=event, sequence=sequence, status_code=None
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            logger.error(f"Error releasing webhook claim {key}: {e}")
+
+    def prune(self, db: Session, max_age_seconds: float) -> int:
+        """Delete answered deliveries claimed more than max_age_seconds ago"""
+        deleted = db.query(WebhookEvent).filter(
+            WebhookEvent.status_code.isnot(None),
+            WebhookEvent.claimed_at < time.time() - max_age_seconds
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+webhook_idempotency = WebhookIdempotency(
+    max_entries=settings.webhook_idempotency_cache_size,
+    claim_timeout_seconds=settings.webhook_claim_timeout_seconds
+)
+
+def prune_webhook_events(max_age_seconds: Optional[float] = None) -> int:
+    """Delete answered deliveries older than WEBHOOK_EVENT_TTL_HOURS"""
+    if max_age_seconds is None:
+        max_age_seconds = settings.webhook_event_ttl_hours * 3600
+    db = SessionLocal()
+    try:
+        return webhook_idempotency.prune(db, max_age_seconds)
+    finally:
+        db.close()
+
+async def run_webhook_event_pruning(interval_seconds: float) -> None:
+    """Prune webhook_events every interval_seconds; runs in one worker"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            deleted = await asyncio.to_thread(prune_webhook_events)
+            if deleted:
+                logger.info(f"Pruned {deleted} webhook events")
+        except Exception as e:
+            logger.error(f"Error pruning webhook events: {e}")
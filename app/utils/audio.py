@@ -0,0 +1,201 @@
+from typing import List, NamedTuple, Optional, Tuple
+import io
+import wave
+
+import numpy as np
+
+# Frame length used for energy-based analysis
+ENERGY_FRAME_MS = 30
+
+# Bytes per sample per channel of the 16-bit PCM WAV files read and written
+BYTES_PER_SAMPLE = 2
+
+# Size of the header encode_wav writes before the samples
+WAV_HEADER_BYTES = 44
+
+def is_wav(data: bytes) -> bool:
+    return len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE"
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """
+    Decode 16-bit PCM WAV data
+
+    Returns:
+        (samples as an int16 array of shape (frames, channels), sample rate)
+    """
+    with wave.open(io.BytesIO(data), "rb") as wav_file:
+        if wav_file.getsampwidth() != BYTES_PER_SAMPLE:
+            raise ValueError(f"Unsupported WAV sample width: {wav_file.getsampwidth() * 8} bits")
+        channels = wav_file.getnchannels()
+        sample_rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+
+    samples = np.frombuffer(frames, dtype="<i2").reshape(-1, channels)
+    return samples, sample_rate
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Encode int16 samples of shape (frames,) or (frames, channels) as WAV"""
+    if samples.ndim == 1:
+        samples = samples[:, None]
+
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wav_file:
+        wav_file.setnchannels(samples.shape[1])
+        wav_file.setsampwidth(BYTES_PER_SAMPLE)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.astype("<i2").tobytes())
+    return output.getvalue()
+
+def frame_energy(samples: np.ndarray, sample_rate: int, frame_ms: int = ENERGY_FRAME_MS) -> np.ndarray:
+    """Mean power of each frame of the mono mix, as float32"""
+    mono = samples.mean(axis=1, dtype=np.float32) if samples.ndim == 2 else samples.astype(np.float32)
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    frame_count = len(mono) // frame_length
+
+    frames = mono[:frame_count * frame_length].reshape(frame_count, frame_length)
+    return np.einsum("ij,ij->i", frames, frames) / frame_length
+
+def split_at_silence(samples: np.ndarray, sample_rate: int, max_segment_seconds: float,
+                     min_segment_seconds: Optional[float] = None) -> List[Tuple[int, int]]:
+    """
+    Split audio into segments no longer than max_segment_seconds, cutting
+    at the quietest frame of the last part of each segment
+
+    Args:
+        samples: int16 samples of shape (frames, channels)
+        sample_rate: Sample rate in Hz
+        max_segment_seconds: Upper bound on segment length
+        min_segment_seconds: Earliest point of a segment at which a cut may
+            be placed, half the maximum by default
+
+    Returns:
+        (start, end) sample offsets of the segments, in order
+    """
+    total = len(samples)
+    max_length = int(max_segment_seconds * sample_rate)
+    if total <= max_length:
+        return [(0, total)]
+
+    if min_segment_seconds is None:
+        min_segment_seconds = max_segment_seconds / 2
+    frame_length = max(1, sample_rate * ENERGY_FRAME_MS // 1000)
+    energy = frame_energy(samples, sample_rate)
+    min_frames = max(1, int(min_segment_seconds * sample_rate) // frame_length)
+    max_frames = max(min_frames + 1, max_length // frame_length)
+
+    segments = []
+    start_frame = 0
+    while total - start_frame * frame_length > max_length:
+        window = energy[start_frame + min_frames:start_frame + max_frames]
+        cut_frame = start_frame + min_frames + int(np.argmin(window))
+        segments.append((start_frame * frame_length, cut_frame * frame_length))
+        start_frame = cut_frame
+
+    segments.append((start_frame * frame_length, total))
+    return segments
+
+# A frame is speech when its energy is this many dB above the noise floor
+VAD_MARGIN_DB = 10.0
+
+# Recordings whose loud and quiet frames differ by less than this are
+# treated as all speech, since no noise floor can be told apart
+VAD_MIN_DYNAMIC_RANGE_DB = 12.0
+
+# Frames below this power are silence regardless of the noise floor
+VAD_ABSOLUTE_FLOOR = 100.0
+
+# Taps of the anti-aliasing filter applied before downsampling
+RESAMPLE_FILTER_TAPS = 63
+
+class PreparedAudio(NamedTuple):
+    samples: np.ndarray  # int16 mono
+    sample_rate: int
+    output_starts: np.ndarray  # Start of each kept region in samples, in the prepared audio
+    source_starts: np.ndarray  # Start of each kept region in seconds, in the original audio
+    source_duration: float  # Length of the original audio in seconds
+
+    def source_seconds(self, offset: int) -> float:
+        """Map a sample offset in the prepared audio to seconds in the original recording"""
+        region = max(0, int(np.searchsorted(self.output_starts, offset, side="right")) - 1)
+        return float(self.source_starts[region] + (offset - self.output_starts[region]) / self.sample_rate)
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """Average all channels into one float32 channel"""
+    if samples.ndim == 1:
+        return samples.astype(np.float32)
+    return samples.mean(axis=1, dtype=np.float32)
+
+def resample(mono: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """
+    Resample a float32 signal by linear interpolation, low-pass filtering
+    it first when downsampling so higher frequencies don't alias
+    """
+    if from_rate == to_rate or len(mono) == 0:
+        return mono
+
+    if to_rate < from_rate:
+        # Windowed-sinc low-pass at 90% of the new Nyquist frequency
+        cutoff = 0.45 * to_rate / from_rate
+        taps = np.arange(RESAMPLE_FILTER_TAPS) - (RESAMPLE_FILTER_TAPS - 1) / 2
+        kernel = (2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(RESAMPLE_FILTER_TAPS)).astype(np.float32)
+        mono = np.convolve(mono, kernel / kernel.sum(), mode="same")
+
+    length = int(len(mono) * to_rate / from_rate)
+    positions = np.arange(length, dtype=np.float64) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(len(mono)), mono).astype(np.float32)
+
+def speech_regions(mono: np.ndarray, sample_rate: int, max_pause_ms: int) -> np.ndarray:
+    """
+    Find the parts of a signal to keep for transcription with an energy VAD
+
+    Frames more than VAD_MARGIN_DB above the noise floor (the 10th
+    percentile of frame energy) are speech. Each speech frame keeps half of
+    max_pause_ms of audio on either side, so pauses up to max_pause_ms stay
+    intact and longer ones are shortened to max_pause_ms.
+
+    Returns:
+        (start, end) sample offsets of the regions to keep, shape (regions, 2)
+    """
+    energy = frame_energy(mono, sample_rate)
+    frame_length = max(1, sample_rate * ENERGY_FRAME_MS // 1000)
+    if len(energy) == 0:
+        return np.array([[0, len(mono)]])
+
+    noise_floor, loud = np.percentile(energy, [10, 90])
+    if loud < VAD_ABSOLUTE_FLOOR:
+        return np.empty((0, 2), dtype=np.int64)
+    if 10 * np.log10((loud + 1e-9) / (noise_floor + 1e-9)) < VAD_MIN_DYNAMIC_RANGE_DB:
+        return np.array([[0, len(mono)]])
+
+    threshold = max(noise_floor * 10 ** (VAD_MARGIN_DB / 10), VAD_ABSOLUTE_FLOOR)
+    speech = energy > threshold
+
+    # Widen speech frames by half the allowed pause on each side
+    padding = max(1, max_pause_ms // 2 // ENERGY_FRAME_MS)
+    counts = np.convolve(speech.astype(np.int32), np.ones(2 * padding + 1, dtype=np.int32), mode="same")
+    keep = np.concatenate(([False], counts > 0, [False]))
+
+    edges = np.flatnonzero(keep[1:] != keep[:-1])
+    regions = edges.reshape(-1, 2) * frame_length
+    regions[-1:, 1] = np.minimum(regions[-1:, 1], len(mono))
+    return regions
+
+def prepare_for_transcription(samples: np.ndarray, sample_rate: int, target_rate: int, max_pause_ms: int) -> PreparedAudio:
+    """
+    Downmix to mono, downsample to target_rate and cut silence
+
+    Recordings already at or below target_rate keep their rate, since
+    upsampling would only add bytes.
+    """
+    mono = downmix(samples)
+    output_rate = min(sample_rate, target_rate)
+    mono = resample(mono, sample_rate, output_rate)
+
+    regions = speech_regions(mono, output_rate, max_pause_ms)
+    lengths = regions[:, 1] - regions[:, 0]
+    output_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(regions) else np.zeros(1, dtype=np.int64)
+    source_starts = regions[:, 0] / output_rate if len(regions) else np.zeros(1)
+
+    kept = np.concatenate([mono[start:end] for start, end in regions]) if len(regions) else mono[:0]
+    kept = np.clip(np.rint(kept), -32768, 32767).astype(np.int16)
+    return PreparedAudio(kept, output_rate, output_starts, source_starts, len(samples) / sample_rate)
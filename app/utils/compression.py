@@ -0,0 +1,109 @@
+from typing import Optional, Union
+from functools import lru_cache
+import logging
+import zlib
+
+from app.utils.config import get_settings
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Compressed values start with a byte that never begins valid UTF-8, followed by
+# a codec marker. Anything else is treated as legacy uncompressed text.
+MAGIC = b"\xff"
+CODEC_ZLIB = b"z"
+CODEC_ZLIB_DICT = b"d"
+CODEC_ZSTD = b"s"
+CODEC_ZSTD_DICT = b"t"
+DICT_ID_SIZE = 4
+
+@lru_cache()
+def load_dictionary() -> Optional[bytes]:
+    """Load the shared compression dictionary, if one is configured"""
+    if not settings.transcript_compression_dict_path:
+        return None
+
+    with open(settings.transcript_compression_dict_path, "rb") as dict_file:
+        return dict_file.read()
+
+def _dictionary_id(dictionary: bytes) -> bytes:
+    return zlib.crc32(dictionary).to_bytes(DICT_ID_SIZE, "big")
+
+def _codec() -> str:
+    if settings.transcript_compression == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to zlib transcript compression")
+        return "zlib"
+    return settings.transcript_compression
+
+def compress_text(text: str) -> bytes:
+    """
+    Compress text for storage
+
+    Values that do not shrink are stored as plain UTF-8, which decompress_text
+    reads back unchanged.
+    """
+    raw = text.encode("utf-8")
+    dictionary = load_dictionary()
+    codec = _codec()
+    level = settings.transcript_compression_level
+
+    if codec == "none":
+        return raw
+
+    if codec == "zstd":
+        if dictionary:
+            compressor = zstandard.ZstdCompressor(level=level, dict_data=zstandard.ZstdCompressionDict(dictionary))
+            payload = MAGIC + CODEC_ZSTD_DICT + _dictionary_id(dictionary) + compressor.compress(raw)
+        else:
+            payload = MAGIC + CODEC_ZSTD + zstandard.ZstdCompressor(level=level).compress(raw)
+    else:
+        if dictionary:
+            compressor = zlib.compressobj(level, zdict=dictionary)
+            payload = MAGIC + CODEC_ZLIB_DICT + _dictionary_id(dictionary) + compressor.compress(raw) + compressor.flush()
+        else:
+            payload = MAGIC + CODEC_ZLIB + zlib.compress(raw, level)
+
+    return payload if len(payload) < len(raw) else raw
+
+def _require_dictionary(payload: bytes) -> bytes:
+    dictionary = load_dictionary()
+    if dictionary is None or _dictionary_id(dictionary) != payload[2:2 + DICT_ID_SIZE]:
+        raise ValueError("Transcript was compressed with a different dictionary than the one configured")
+    return dictionary
+
+def decompress_text(payload: Union[bytes, str, None]) -> Optional[str]:
+    """Decompress a value written by compress_text"""
+    if payload is None or isinstance(payload, str):
+        return payload
+
+    payload = bytes(payload)
+    if not payload.startswith(MAGIC):
+        return payload.decode("utf-8")
+
+    codec = payload[1:2]
+    if codec == CODEC_ZLIB:
+        raw = zlib.decompress(payload[2:])
+    elif codec == CODEC_ZLIB_DICT:
+        decompressor = zlib.decompressobj(zdict=_require_dictionary(payload))
+        raw = decompressor.decompress(payload[2 + DICT_ID_SIZE:]) + decompressor.flush()
+    elif codec in (CODEC_ZSTD, CODEC_ZSTD_DICT):
+        if zstandard is None:
+            raise ValueError("Transcript is zstd-compressed but zstandard is not installed")
+        if codec == CODEC_ZSTD_DICT:
+            dictionary = zstandard.ZstdCompressionDict(_require_dictionary(payload))
+            raw = zstandard.ZstdDecompressor(dict_data=dictionary).decompress(payload[2 + DICT_ID_SIZE:])
+        else:
+            raw = zstandard.ZstdDecompressor().decompress(payload[2:])
+    else:
+        raise ValueError(f"Unknown transcript compression codec: {codec!r}")
+
+    return raw.decode("utf-8")
+
+def is_compressed(payload: Union[bytes, str, None]) -> bool:
+    """Check whether a stored value was written by compress_text"""
+    return isinstance(payload, (bytes, bytearray, memoryview)) and bytes(payload[:1]) == MAGIC
@@ -14,6 +14,22 @@ class Settings(BaseSettings):
     db_name: str = "ai_voice_agent"
     db_username: str = "postgres"
     db_password: str = "postgres"
+    db_read_host: str = ""  # Read replica for analytics, lists and exports; empty uses the primary
+    
+    # Connection pools (write pool and read-only pool, sized independently)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_read_pool_size: int = 10
+    db_read_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    
+    # SQLite connection profile
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 65536
+    sqlite_mmap_size: int = 268435456  # 256 MB
+    sqlite_temp_store: str = "MEMORY"
     
     # API Keys
     elevenlabs_api_key: str = os.getenv("ELEVENLABS_API_KEY", "")
@@ -21,11 +37,101 @@ class Settings(BaseSettings):
     twilio_account_sid: str = os.getenv("TWILIO_ACCOUNT_SID", "")
     twilio_auth_token: str = os.getenv("TWILIO_AUTH_TOKEN", "")
     vapi_api_key: str = os.getenv("VAPI_API_KEY", "")
+    openai_base_url: str = "https://api.openai.com/v1"
     
     # Feature flags
     use_openai_for_intent: bool = True
     mock_external_services: bool = True  # Set to False in production
     
+    # Language identification
+    language_id_min_confidence: float = 0.6  # Below this the character set decides
+    
+    # Local intent classifier, consulted before the LLM
+    intent_model_path: str = "./intent_classifier.npz"  # Written by manage.py train-intent-model
+    intent_model_min_confidence: float = 0.8  # Below this the LLM (or the default intent) decides
+    
+    # Batching of OpenAI intent requests (a max size of 1 disables batching)
+    intent_batch_max_size: int = 16
+    intent_batch_max_wait_ms: float = 10.0
+    
+    # Transcription of long recordings
+    transcription_segment_seconds: float = 120.0  # Longer WAV recordings are split at silences
+    transcription_max_upload_bytes: int = 24 * 1024 * 1024  # Whisper rejects files over 25 MB
+    transcription_concurrency: int = 4  # Segments transcribed at the same time
+    audio_preprocessing_enabled: bool = True  # Downmix, downsample and trim silence before upload
+    audio_target_sample_rate: int = 16000  # Whisper resamples to 16 kHz itself
+    audio_max_pause_ms: int = 600  # Longer silences are shortened to this
+    
+    # Local copies of recordings and their memoized transcripts
+    recording_store_dir: str = "./recordings"
+    recording_store_max_bytes: int = 2 * 1024 ** 3  # Least recently used files are evicted past this
+    
+    # Replaying responses to retried webhooks
+    webhook_idempotency_cache_size: int = 10000  # Recent responses kept in memory per worker
+    webhook_claim_timeout_seconds: float = 60.0  # A delivery still unanswered after this is processed again
+    webhook_event_ttl_hours: float = 24.0  # Answered deliveries are kept this long, past any provider retry
+    webhook_event_prune_interval_seconds: float = 3600.0
+    
+    # Production server (python main.py --production)
+    web_host: str = "0.0.0.0"
+    web_port: int = 8000
+    web_workers: int = 0  # 0 runs one worker per available core
+    worker_drain_seconds: float = 30.0  # Time given to in-flight requests and background tasks on shutdown
+    worker_heartbeat_seconds: float = 1.0
+    worker_timeout_seconds: float = 30.0  # Workers without a heartbeat for this long are restarted
+    
+    # Dialing of pending callback actions
+    callback_scheduler_enabled: bool = True  # Runs in one worker only
+    callback_calls_per_second: float = 1.0
+    callback_max_concurrency: int = 10
+    callback_destination_interval_seconds: float = 600.0  # Minimum time between calls to the same number
+    callback_calling_hours: str = "09:00-20:00"
+    callback_timezone: str = "Asia/Kolkata"
+    callback_delay_seconds: float = 0.0  # Time between a callback being requested and it becoming due
+    callback_poll_seconds: float = 1.0  # How often new callbacks are picked up
+    callback_reload_seconds: float = 300.0  # How often all pending callbacks are re-read, catching any a poll missed
+    callback_dial_timeout_seconds: float = 600.0  # A callback still "dialing" this long at startup was left by a crashed worker
+    callback_message: str = "Hello, this is the callback you requested. How can we help you today?"
+    
+    # Ticket numbers and call SIDs
+    id_block_size: int = 100  # IDs leased from the database at a time by each worker
+    
+    # Transcript storage
+    transcript_compression: str = "zlib"  # zlib, zstd (requires zstandard) or none
+    transcript_compression_level: int = 6
+    transcript_compression_dict_path: str = ""  # Optional shared dictionary file
+    
+    # Archival of old calls
+    archive_dir: str = "./archive"
+    archive_retention_days: int = 365
+    
+    # Live call feed
+    live_feed_queue_size: int = 100  # Events buffered per subscriber before the oldest are dropped
+    live_feed_heartbeat_seconds: float = 15.0
+    
+    # Live metrics for wallboards
+    live_metrics_window_seconds: int = 300  # Longest window served, kept as one bucket per second
+    live_metrics_max_keys: int = 128  # Distinct statuses, intents and directions counted per worker
+    
+    # Request profiling
+    profiling_enabled: bool = False  # When off the profiling middleware isn't installed at all
+    profiling_token: str = ""  # Requests with this X-Profile header value are profiled; empty turns the header off
+    profiling_sample_rate: float = 0.0  # Share of all requests profiled
+    profiling_interval_ms: float = 5.0
+    profiling_dir: str = "./profiles"
+    profiling_max_profiles: int = 200
+    
+    # Query monitoring
+    slow_query_ms: float = 100.0  # Slower statements are logged with their EXPLAIN plan
+    n_plus_one_threshold: int = 10  # Identical statements per request or task reported as a likely N+1
+    query_budget_default: int = 0  # Budget of endpoints without @query_budget; 0 means none
+    query_budget_strict: bool = False  # Fail statements over budget instead of logging; meant for tests
+    
+    # Bulk import of historical calls
+    import_dir: str = "./imports"  # Files uploaded to POST /admin/imports are kept here until imported
+    import_batch_size: int = 5000  # Records inserted and checkpointed per transaction
+    import_intent_workers: int = 0  # Processes classifying intents; 0 runs one per available core
+    
     class Config:
         env_file = ".env"
 
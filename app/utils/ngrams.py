@@ -0,0 +1,51 @@
+from typing import List, Tuple, Sequence
+import re
+
+import numpy as np
+
+# Separates texts when a batch is processed as one string
+_SEPARATOR = "\x01"
+
+# Runs of whitespace, digits and punctuation, including the Devanagari danda
+# and digits, collapse to one space. \W can't be used as it also matches
+# Devanagari vowel signs
+_NON_LETTERS = re.compile(r"[\s0-9!-/:-@\[-`{-~\u0964-\u096F]+")
+_PADDED_SEPARATOR = re.compile(f" ?{_SEPARATOR} ?")
+
+def char_ngram_keys(texts: List[str], orders: Sequence[int] = (1, 2, 3), bits: int = 21) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Extract character n-grams of a batch of texts as integer keys
+
+    The batch is normalized as one string (lowercased, punctuation and
+    digits dropped, each text padded with spaces for word-boundary n-grams)
+    and turned into one array of code points. Each n-gram is packed into a
+    uint64 with `bits` bits per character, so extraction is a handful of
+    array operations over the whole batch. With bits=21 keys are exact for
+    orders up to 3; with fewer bits characters are truncated to their low
+    bits, which is fine for hashed features.
+
+    Returns:
+        (keys, index of the text each key belongs to)
+    """
+    batch = _SEPARATOR + _SEPARATOR.join(texts).lower() + _SEPARATOR
+    batch = _PADDED_SEPARATOR.sub(f" {_SEPARATOR} ", _NON_LETTERS.sub(" ", batch))[1:-1]
+    codepoints = np.frombuffer(batch.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+    # separators_before[i] is the number of separators in codepoints[:i]
+    separators_before = np.concatenate(([0], np.cumsum(codepoints == ord(_SEPARATOR))))
+    if bits < 21:
+        codepoints &= np.uint64((1 << bits) - 1)
+
+    keys, owners = [], []
+    for order in orders:
+        count = len(codepoints) - order + 1
+        packed = codepoints[:count].copy()
+        for offset in range(1, order):
+            packed = (packed << np.uint64(bits)) | codepoints[offset:offset + count]
+
+        # Only keep n-grams that don't span a separator
+        within = separators_before[order:order + count] == separators_before[:count]
+        keys.append(packed[within])
+        owners.append(separators_before[1:count + 1][within] - 1)
+
+    return np.concatenate(keys), np.concatenate(owners)
@@ -0,0 +1,273 @@
+"""
+Pre-forking production server
+
+The application is imported once in the master process, which also
+migrates the database and warms the per-process caches (language
+identifier, intent model), and is then forked into worker processes that
+share the listening socket. Workers therefore start in milliseconds and
+share the preloaded memory copy-on-write.
+
+The master restarts workers that exit or stop sending heartbeats. On
+SIGTERM or SIGINT it asks every worker to stop: uvicorn stops accepting
+connections, lets in-flight requests and their background tasks finish
+for up to WORKER_DRAIN_SECONDS, and runs the lifespan shutdown.
+"""
+from typing import Callable, List, Optional, Dict, Any
+import asyncio
+import logging
+import mmap
+import os
+import signal
+import socket
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Columns of the shared worker table
+WORKER_FIELDS = ["pid", "started_at", "heartbeat_at", "requests", "in_flight"]
+_PID, _STARTED_AT, _HEARTBEAT_AT, _REQUESTS, _IN_FLIGHT = range(len(WORKER_FIELDS))
+
+class WorkerTable:
+    """
+    Liveness and request counters of every worker, in shared memory
+
+    The table lives in an anonymous shared mapping created before the
+    workers are forked, so any worker can report on all of them. Each
+    worker only writes its own row.
+    """
+    def __init__(self, slots: int):
+        self._buffer = mmap.mmap(-1, slots * len(WORKER_FIELDS) * 8)
+        self.rows = np.frombuffer(self._buffer, dtype=np.float64).reshape(slots, len(WORKER_FIELDS))
+        self.slot = 0
+
+    def assign(self, slot: int, pid: int) -> None:
+        """Reset a row for a newly started worker"""
+        now = time.time()
+        self.rows[slot] = [pid, now, now, 0, 0]
+
+    def claim(self, slot: int) -> None:
+        """Make the current process write to the given row"""
+        self.slot = slot
+
+    def heartbeat(self) -> None:
+        self.rows[self.slot, _HEARTBEAT_AT] = time.time()
+
+    def request_started(self) -> None:
+        row = self.rows[self.slot]
+        row[_REQUESTS] += 1
+        row[_IN_FLIGHT] += 1
+
+    def request_finished(self) -> None:
+        self.rows[self.slot, _IN_FLIGHT] -= 1
+
+    def heartbeat_age(self, slot: int) -> float:
+        return time.time() - self.rows[slot, _HEARTBEAT_AT]
+
+    def snapshot(self, timeout_seconds: float) -> List[Dict[str, Any]]:
+        now = time.time()
+        workers = []
+        for slot, row in enumerate(self.rows):
+            if not row[_PID]:
+                continue
+            workers.append({
+                "slot": slot,
+                "pid": int(row[_PID]),
+                "alive": now - row[_HEARTBEAT_AT] <= timeout_seconds,
+                "uptime_seconds": round(now - row[_STARTED_AT], 1),
+                "heartbeat_age_seconds": round(now - row[_HEARTBEAT_AT], 2),
+                "requests": int(row[_REQUESTS]),
+                "in_flight": int(row[_IN_FLIGHT]),
+                "current": slot == self.slot,
+            })
+        return workers
+
+_worker_table: Optional[WorkerTable] = None
+
+def get_worker_table() -> WorkerTable:
+    """The shared table under the pre-fork server, otherwise a one-row table for this process"""
+    global _worker_table
+    if _worker_table is None:
+        _worker_table = WorkerTable(1)
+        _worker_table.assign(0, os.getpid())
+    return _worker_table
+
+def is_prefork_worker() -> bool:
+    return os.environ.get("PREFORK_WORKER") == "1"
+
+async def run_heartbeat(interval_seconds: float) -> None:
+    """
+    Beat for this worker until cancelled
+
+    Heartbeats come from the event loop, so a worker whose loop is blocked
+    stops beating and is restarted by the master.
+    """
+    table = get_worker_table()
+    while True:
+        table.heartbeat()
+        await asyncio.sleep(interval_seconds)
+
+class WorkerLivenessMiddleware:
+    """Count requests and in-flight requests of this worker in the worker table"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        table = get_worker_table()
+        table.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            table.request_finished()
+
+def default_worker_count() -> int:
+    """One worker per core this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+class PreforkServer:
+    """
+    Master process of the pre-fork server
+
+    Args:
+        app: The preloaded ASGI application
+        workers: Number of worker processes
+        host: Interface to listen on
+        port: Port to listen on
+        drain_seconds: How long a stopping worker waits for in-flight work
+        worker_timeout_seconds: Workers silent for longer are restarted
+        preload: Run once in the master before forking (migrations, caches)
+        allocate_shared: Called in the master with the number of workers to
+            create other shared memory before the workers are forked
+        before_fork: Run in the master right before each fork, e.g. to close
+            pooled database connections that must not be shared
+    """
+    def __init__(self, app, workers: int, host: str, port: int, drain_seconds: float, worker_timeout_seconds: float,
+                 preload: Optional[Callable[[], None]] = None, allocate_shared: Optional[Callable[[int], None]] = None,
+                 before_fork: Optional[Callable[[], None]] = None):
+        self.app = app
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.drain_seconds = drain_seconds
+        self.worker_timeout_seconds = worker_timeout_seconds
+        self.preload = preload
+        self.allocate_shared = allocate_shared
+        self.before_fork = before_fork
+        self.pids: Dict[int, int] = {}  # slot -> pid
+        self.stopping = False
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, slot: int, sock: socket.socket) -> None:
+        if self.before_fork:
+            self.before_fork()
+
+        pid = os.fork()
+        if pid:
+            self.pids[slot] = pid
+            _worker_table.assign(slot, pid)
+            return
+
+        # Worker process: drop the master's signal handlers, uvicorn installs its own
+        exit_code = 1
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            os.environ["PREFORK_WORKER"] = "1"
+            get_worker_table().claim(slot)
+
+            import uvicorn
+            config = uvicorn.Config(
+                self.app,
+                lifespan="on",
+                timeout_graceful_shutdown=self.drain_seconds,
+                log_config=None,
+            )
+            uvicorn.Server(config).run(sockets=[sock])
+            exit_code = 0
+        except BaseException as e:
+            logger.error(f"Worker {slot} crashed: {e}")
+        finally:
+            os._exit(exit_code)
+
+    def _reap(self) -> List[int]:
+        """Collect exited workers and return their slots"""
+        exited = []
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            for slot, worker_pid in list(self.pids.items()):
+                if worker_pid == pid:
+                    del self.pids[slot]
+                    exited.append(slot)
+                    if not self.stopping:
+                        logger.warning(f"Worker {slot} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}")
+        return exited
+
+    def _stop(self, signum, frame) -> None:
+        if not self.stopping:
+            logger.info(f"Received {signal.Signals(signum).name}, draining {len(self.pids)} workers")
+        self.stopping = True
+
+    def run(self) -> None:
+        global _worker_table
+        if self.preload:
+            started = time.perf_counter()
+            self.preload()
+            logger.info(f"Preloaded application in {time.perf_counter() - started:.2f}s")
+
+        _worker_table = WorkerTable(self.workers)
+        if self.allocate_shared:
+            self.allocate_shared(self.workers)
+        sock = self._bind()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        for slot in range(self.workers):
+            self._spawn(slot, sock)
+        logger.info(f"Serving on {self.host}:{self.port} with {self.workers} workers: {sorted(self.pids.values())}")
+
+        while not self.stopping:
+            time.sleep(0.5)
+            for slot in self._reap():
+                if not self.stopping:
+                    self._spawn(slot, sock)
+
+            for slot, pid in list(self.pids.items()):
+                age = _worker_table.heartbeat_age(slot)
+                if age > self.worker_timeout_seconds:
+                    logger.error(f"Worker {slot} (pid {pid}) missed heartbeats for {age:.0f}s, restarting it")
+                    os.kill(pid, signal.SIGKILL)
+
+        sock.close()
+        for pid in self.pids.values():
+            os.kill(pid, signal.SIGTERM)
+
+        # Workers finish in-flight requests and background tasks, then exit
+        deadline = time.monotonic() + self.drain_seconds + 5
+        while self.pids and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+
+        for slot, pid in self.pids.items():
+            logger.error(f"Worker {slot} (pid {pid}) did not stop in time, killing it")
+            os.kill(pid, signal.SIGKILL)
+        self._reap()
+        logger.info("All workers stopped")
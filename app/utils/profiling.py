@@ -0,0 +1,270 @@
+"""
+On-demand sampling profiler for individual requests
+
+A request is profiled when it carries the X-Profile header with the
+configured token, or is picked at PROFILING_SAMPLE_RATE. While any request
+is being profiled a background thread samples the event loop thread's
+stack every PROFILING_INTERVAL_MS. A sample is attributed to a request
+when the request's middleware frame is on the stack; a request whose
+coroutine is suspended at that moment gets the stack it is awaiting in,
+ending in "(waiting)", so time spent on I/O, or in work handed to a
+thread, shows up too. Starlette background tasks run inside the request
+and are included.
+
+Profiles are written as collapsed stacks (one "frame;frame;... count" line
+per distinct stack, the input format of flamegraph.pl and speedscope) to a
+directory bounded to PROFILING_MAX_PROFILES files, oldest first out.
+
+The middleware is only installed when PROFILING_ENABLED is set, so a
+disabled profiler costs nothing.
+"""
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from app.utils.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Leaf frame of samples taken while the request was suspended
+WAITING_FRAME = "(waiting)"
+
+_PROFILE_ID = re.compile(r"^[0-9]+-[0-9]+-[0-9]+$")
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+class RequestProfile:
+    """Samples collected for one request"""
+    def __init__(self, profile_id: str, method: str, path: str, trigger: str, root_frame, task: Optional[asyncio.Task]):
+        self.profile_id = profile_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.root_frame = root_frame
+        self.task = task
+        self.started_at = time.time()
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+
+    def add(self, labels: List[str]) -> None:
+        stack = ";".join(labels)
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+class Sampler:
+    """Samples the event loop thread while at least one request is profiled"""
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._profiles: Dict[int, RequestProfile] = {}  # id(root frame) -> profile
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._target_thread_id: Optional[int] = None
+
+    def start(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles[id(profile.root_frame)] = profile
+            self._target_thread_id = threading.get_ident()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.pop(id(profile.root_frame), None)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval_seconds)
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = dict(self._profiles)
+                frame = sys._current_frames().get(self._target_thread_id)
+                self._sample(frame, profiles)
+
+    def _sample(self, frame, profiles: Dict[int, RequestProfile]) -> None:
+        # Stack of the running code, innermost first, cut at a profiled request's root
+        running = None
+        labels = []
+        while frame is not None:
+            profile = profiles.get(id(frame))
+            if profile is not None and frame is profile.root_frame:
+                running = profile
+                break
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        if running is not None:
+            labels.append(_frame_label(running.root_frame.f_code))
+            running.add(labels[::-1])
+
+        for profile in profiles.values():
+            if profile is not running:
+                waiting = self._awaiting(profile)
+                if waiting:
+                    profile.add(waiting)
+
+    @staticmethod
+    def _awaiting(profile: RequestProfile) -> List[str]:
+        """Labels of the coroutines a suspended request is awaiting in, outermost first"""
+        if profile.task is None:
+            return []
+        labels = []
+        found_root = False
+        awaitable = profile.task.get_coro()
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                break
+            found_root = found_root or frame is profile.root_frame
+            if found_root:
+                labels.append(_frame_label(frame.f_code))
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+        return labels + [WAITING_FRAME] if labels else []
+
+class ProfileStore:
+    """Profiles on disk, bounded to max_profiles files shared by all workers"""
+    def __init__(self, root: str, max_profiles: int):
+        self.root = root
+        self.max_profiles = max_profiles
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.root, f"{profile_id}.json")
+
+    def save(self, profile: RequestProfile, status_code: Optional[int], duration_ms: float) -> None:
+        record = {
+            "id": profile.profile_id,
+            "method": profile.method,
+            "path": profile.path,
+            "status_code": status_code,
+            "trigger": profile.trigger,
+            "started_at": profile.started_at,
+            "duration_ms": round(duration_ms, 2),
+            "samples": profile.samples,
+            "pid": os.getpid(),
+            "collapsed": profile.collapsed(),
+        }
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as profile_file:
+                json.dump(record, profile_file)
+            os.replace(temporary_path, self._path(profile.profile_id))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        self._trim()
+
+    def _trim(self) -> None:
+        # IDs start with the start time, so name order is age order
+        names = sorted(name for name in os.listdir(self.root) if name.endswith(".json"))
+        for name in names[:max(0, len(names) - self.max_profiles)]:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Metadata of stored profiles, newest first"""
+        profiles = []
+        for name in sorted(os.listdir(self.root), reverse=True):
+            if not name.endswith(".json"):
+                continue
+            record = self.get(name[:-len(".json")])
+            if record is not None:
+                record.pop("collapsed")
+                profiles.append(record)
+        return profiles
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id), encoding="utf-8") as profile_file:
+                return json.load(profile_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+@lru_cache()
+def get_profile_store() -> ProfileStore:
+    return ProfileStore(settings.profiling_dir, settings.profiling_max_profiles)
+
+class ProfilingMiddleware:
+    """Profile requests that carry the admin header or are picked by the sample rate"""
+    def __init__(self, app):
+        self.app = app
+        self.token = settings.profiling_token.encode()
+        self.sample_rate = settings.profiling_sample_rate
+        self.sampler = Sampler(settings.profiling_interval_ms / 1000)
+        self._sequence = 0
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER and hmac.compare_digest(value, self.token):
+                    return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trigger = self._trigger(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        self._sequence += 1
+        profile = RequestProfile(
+            f"{int(time.time() * 1000)}-{os.getpid()}-{self._sequence}",
+            scope["method"],
+            scope["path"],
+            trigger,
+            sys._getframe(),
+            asyncio.current_task()
+        )
+        status_code = None
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_ID_HEADER, profile.profile_id.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        self.sampler.start(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            self.sampler.stop(profile)
+            duration_ms = (time.perf_counter() - started) * 1000
+            try:
+                await asyncio.to_thread(get_profile_store().save, profile, status_code, duration_ms)
+            except Exception as e:
+                logger.error(f"Error saving profile {profile.profile_id}: {e}")
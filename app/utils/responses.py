@@ -0,0 +1,34 @@
+from fastapi.responses import JSONResponse
+from datetime import datetime, date
+from typing import Any
+import enum
+import json
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+def _encode_default(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Encode content as compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_encode_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_encode_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for content built from trusted database rows
+
+    Returning a Response instance makes FastAPI skip re-validating the
+    content against the route's response_model and running it through
+    jsonable_encoder; the response_model is then only used for the docs.
+    """
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -4,14 +4,22 @@ from fastapi.responses import JSONResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.staticfiles import StaticFiles
 import uvicorn
+import argparse
+import asyncio
 import logging
 from datetime import datetime
 import os
 
-from app.database.db import init_db, get_db, engine
+from app.database.db import init_db, get_db, engine, dispose_engines
+from app.database.query_monitor import QueryCountMiddleware
 from app.routes import call_routes, webhook_routes, admin_routes
 from app.models.database import Base
+from app.services.callback_scheduler import callback_scheduler
+from app.services.live_metrics import allocate_live_metrics
+from app.services.webhook_idempotency import run_webhook_event_pruning
 from app.utils.config import get_settings
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.prefork import PreforkServer, WorkerLivenessMiddleware, default_worker_count, get_worker_table, is_prefork_worker, run_heartbeat
 
 # Configure logging
 logging.basicConfig(
@@ -20,6 +28,7 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -36,6 +45,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(WorkerLivenessMiddleware)
+app.add_middleware(QueryCountMiddleware)
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
 
 # Include routers
 app.include_router(call_routes.router)
@@ -45,12 +58,46 @@ app.include_router(admin_routes.router)
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting AI Voice Agent System")
-    await init_db()
-    logger.info("Database initialized")
+    if is_prefork_worker():
+        # The master migrated the database before forking. Pooled
+        # connections inherited from it must not be used by this worker
+        dispose_engines(close=False)
+    else:
+        await init_db()
+        logger.info("Database initialized")
+    
+    app.state.heartbeat = asyncio.create_task(run_heartbeat(settings.worker_heartbeat_seconds))
+    
+    # Callbacks are dialed, and old webhook responses pruned, by the first worker only
+    app.state.callback_scheduler = None
+    app.state.webhook_pruning = None
+    if get_worker_table().slot == 0:
+        if settings.callback_scheduler_enabled:
+            app.state.callback_scheduler = asyncio.create_task(callback_scheduler.run())
+        app.state.webhook_pruning = asyncio.create_task(
+            run_webhook_event_pruning(settings.webhook_event_prune_interval_seconds)
+        )
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    # Runs after uvicorn has drained in-flight requests and their background tasks
     logger.info("Shutting down AI Voice Agent System")
+    app.state.heartbeat.cancel()
+    if app.state.webhook_pruning:
+        app.state.webhook_pruning.cancel()
+    if app.state.callback_scheduler:
+        app.state.callback_scheduler.cancel()
+        await callback_scheduler.drain()
+    dispose_engines()
+
+def preload() -> None:
+    """Migrate the database and warm per-process caches once, before forking workers"""
+    from app.services.intent_classifier import get_intent_classifier
+    from app.services.language_identifier import get_language_identifier
+    
+    asyncio.run(init_db())
+    get_language_identifier()
+    get_intent_classifier()
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -60,4 +107,24 @@ async def root():
     return {"message": "AI Voice Agent System is running", "status": "ok", "timestamp": datetime.now().isoformat()}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the AI Voice Agent System")
+    parser.add_argument("--production", action="store_true", help="Serve with pre-forked worker processes instead of the auto-reloading dev server")
+    parser.add_argument("--workers", type=int, default=settings.web_workers or default_worker_count())
+    parser.add_argument("--host", default=settings.web_host)
+    parser.add_argument("--port", type=int, default=settings.web_port)
+    args = parser.parse_args()
+    
+    if args.production:
+        PreforkServer(
+            app,
+            workers=args.workers,
+            host=args.host,
+            port=args.port,
+            drain_seconds=settings.worker_drain_seconds,
+            worker_timeout_seconds=settings.worker_timeout_seconds,
+            preload=preload,
+            allocate_shared=allocate_live_metrics,
+            before_fork=dispose_engines
+        ).run()
+    else:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
\ No newline at end of file
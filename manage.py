@@ -0,0 +1,174 @@
+"""
+Management commands for the AI Voice Agent System
+
+Usage:
+    python manage.py compress-transcripts [--batch-size N] [--vacuum]
+    python manage.py rebuild-search-index [--batch-size N]
+    python manage.py archive-calls [--retention-days N] [--batch-size N]
+    python manage.py train-intent-model [--holdout F] [--epochs N] [--output PATH]
+    python manage.py prune-webhook-events [--ttl-hours H]
+    python manage.py import-calls PATH [--format csv|ndjson] [--batch-size N] [--classify-intents] [--workers N] [--from-start]
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+from sqlalchemy import text, select
+
+from app.database.db import engine, SessionLocal, init_db
+from app.database.migrations import upgrade_schema, deduplicate_recording_transcripts, compress_transcripts
+from app.database.search_index import rebuild_search_index
+from app.models.database import Call
+from app.services.archive_service import ArchiveService
+from app.services.import_service import ImportService, IMPORT_FORMATS
+from app.services.intent_classifier import IntentClassifier, INTENT_LABELS
+from app.services.webhook_idempotency import prune_webhook_events
+from app.utils.config import get_settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+def compress_transcripts_command(args: argparse.Namespace) -> None:
+    """Compress stored transcripts and report the size savings"""
+    upgrade_schema(engine)
+
+    deduplicated = deduplicate_recording_transcripts(engine)
+    logger.info(f"Cleared {deduplicated} recording transcripts duplicated on their call")
+
+    report = compress_transcripts(engine, batch_size=args.batch_size)
+    report["recordings"]["deduplicated"] = deduplicated
+
+    if args.vacuum and engine.dialect.name == "sqlite":
+        # Freed pages are only returned to the filesystem by VACUUM
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+
+    print(json.dumps(report, indent=2))
+
+def rebuild_search_index_command(args: argparse.Namespace) -> None:
+    """Rebuild the transcript search index from the calls table"""
+    upgrade_schema(engine)
+
+    db = SessionLocal()
+    try:
+        indexed = rebuild_search_index(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+    print(json.dumps({"indexed": indexed}, indent=2))
+
+def archive_calls_command(args: argparse.Namespace) -> None:
+    """Move calls older than the retention window into archive files"""
+    upgrade_schema(engine)
+
+    db = SessionLocal()
+    try:
+        report = asyncio.run(ArchiveService(db).archive_calls(
+            retention_days=args.retention_days,
+            batch_size=args.batch_size
+        ))
+    finally:
+        db.close()
+
+    print(json.dumps(report, indent=2))
+
+def train_intent_model_command(args: argparse.Namespace) -> None:
+    """Train the local intent classifier from calls with a known intent"""
+    upgrade_schema(engine)
+
+    texts, intents = [], []
+    db = SessionLocal()
+    try:
+        statement = select(Call.transcript, Call.intent).where(
+            Call.transcript.is_not(None),
+            Call.intent.in_(INTENT_LABELS)
+        ).execution_options(yield_per=1000)
+        for transcript, intent in db.execute(statement):
+            texts.append(transcript)
+            intents.append(intent)
+    finally:
+        db.close()
+
+    if not texts:
+        print(json.dumps({"error": "No calls with a transcript and a known intent to train on"}, indent=2))
+        return
+
+    classifier, report = IntentClassifier.train(texts, intents, holdout=args.holdout, epochs=args.epochs)
+    output = args.output or get_settings().intent_model_path
+    classifier.save(output)
+    report["output"] = output
+
+    print(json.dumps(report, indent=2))
+
+def prune_webhook_events_command(args: argparse.Namespace) -> None:
+    """Delete stored webhook responses older than the retry window"""
+    upgrade_schema(engine)
+
+    max_age_seconds = args.ttl_hours * 3600 if args.ttl_hours is not None else None
+    print(json.dumps({"deleted": prune_webhook_events(max_age_seconds)}, indent=2))
+
+def import_calls_command(args: argparse.Namespace) -> None:
+    """Bulk-import historical calls, resuming an unfinished import of the same file"""
+    asyncio.run(init_db())
+
+    db = SessionLocal()
+    try:
+        service = ImportService(db, batch_size=args.batch_size, intent_workers=args.workers)
+        job = None if args.from_start else service.find_unfinished_job(args.path)
+        if job is not None:
+            logger.info(f"Resuming import {job.id} of {job.source} after {job.rows} records")
+        else:
+            job = service.create_job(args.path, args.format or ImportService.format_for(args.path), args.classify_intents)
+        report = service.run(job)
+    finally:
+        db.close()
+
+    print(json.dumps(report, indent=2, default=str))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AI Voice Agent System management commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compress_parser = subparsers.add_parser("compress-transcripts", help="Compress existing call and recording transcripts")
+    compress_parser.add_argument("--batch-size", type=int, default=500, help="Rows compressed per transaction")
+    compress_parser.add_argument("--vacuum", action="store_true", help="Run VACUUM afterwards to shrink the SQLite file")
+    compress_parser.set_defaults(handler=compress_transcripts_command)
+
+    search_parser = subparsers.add_parser("rebuild-search-index", help="Rebuild the transcript full-text search index")
+    search_parser.add_argument("--batch-size", type=int, default=500, help="Calls loaded per batch")
+    search_parser.set_defaults(handler=rebuild_search_index_command)
+
+    archive_parser = subparsers.add_parser("archive-calls", help="Archive old calls and their child rows to compressed files")
+    archive_parser.add_argument("--retention-days", type=int, default=None, help="Archive calls older than this many days (default: ARCHIVE_RETENTION_DAYS)")
+    archive_parser.add_argument("--batch-size", type=int, default=1000, help="Calls moved per batch")
+    archive_parser.set_defaults(handler=archive_calls_command)
+
+    train_parser = subparsers.add_parser("train-intent-model", help="Train the local intent classifier from labelled calls")
+    train_parser.add_argument("--holdout", type=float, default=0.2, help="Share of calls held out for calibration and evaluation")
+    train_parser.add_argument("--epochs", type=int, default=60, help="Training iterations")
+    train_parser.add_argument("--output", default=None, help="Model file to write (default: INTENT_MODEL_PATH)")
+    train_parser.set_defaults(handler=train_intent_model_command)
+
+    prune_parser = subparsers.add_parser("prune-webhook-events", help="Delete stored webhook responses past the retry window")
+    prune_parser.add_argument("--ttl-hours", type=float, default=None, help="Age after which responses are deleted (default: WEBHOOK_EVENT_TTL_HOURS)")
+    prune_parser.set_defaults(handler=prune_webhook_events_command)
+
+    import_parser = subparsers.add_parser("import-calls", help="Bulk-import historical calls from a CSV or NDJSON file")
+    import_parser.add_argument("path", help="File to import, optionally gzipped; uses the export format")
+    import_parser.add_argument("--format", choices=IMPORT_FORMATS, default=None, help="File format (default: from the file name)")
+    import_parser.add_argument("--batch-size", type=int, default=None, help="Records per transaction (default: IMPORT_BATCH_SIZE)")
+    import_parser.add_argument("--classify-intents", action="store_true", help="Classify calls that have a transcript but no intent")
+    import_parser.add_argument("--workers", type=int, default=None, help="Intent classification processes (default: IMPORT_INTENT_WORKERS)")
+    import_parser.add_argument("--from-start", action="store_true", help="Start a new import even if one of this file is unfinished")
+    import_parser.set_defaults(handler=import_calls_command)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Shared fixtures
+
+The app binds its SQLite database and data directories to the working
+directory when it is imported, so the tests run from a temporary
+directory of their own, with a fresh database for each test.
+"""
+import asyncio
+import glob
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="ai-voice-agent-tests-")
+os.chdir(WORKDIR)
+os.environ["MOCK_EXTERNAL_SERVICES"] = "true"
+os.environ["CALLBACK_SCHEDULER_ENABLED"] = "false"
+os.environ["QUERY_BUDGET_STRICT"] = "true"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database.db import SessionLocal, dispose_engines, engine, init_db, read_engine
+from app.services.id_allocator import id_allocator
+from app.services.webhook_idempotency import webhook_idempotency
+
+@pytest.fixture
+def db():
+    """Session on an empty, freshly migrated database"""
+    dispose_engines()
+    for path in glob.glob(os.path.join(WORKDIR, "ai_voice_agent.db*")):
+        os.remove(path)
+    # Blocks and responses held in memory belong to the previous database
+    id_allocator._blocks.clear()
+    webhook_idempotency._responses.clear()
+    asyncio.run(init_db())
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def client(db):
+    """Client of the app without its startup tasks, such as the callback scheduler"""
+    from main import app
+    return TestClient(app)
+
+class QueryCounter:
+    """Statements issued on either engine while installed"""
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+@pytest.fixture
+def queries(db):
+    counter = QueryCounter()
+    for bound in (engine, read_engine):
+        event.listen(bound, "before_cursor_execute", counter)
+    yield counter
+    for bound in (engine, read_engine):
+        event.remove(bound, "before_cursor_execute", counter)
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import insert
+
+from app.models.database import Call, CallDirection, CallStatus
+from app.services.analytics_service import grouped_duration_stats
+
+def expected_stats(durations) -> dict:
+    p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+    return {
+        "count": len(durations),
+        "mean": round(float(np.mean(durations)), 2),
+        "p50": round(float(p50), 2),
+        "p90": round(float(p90), 2),
+        "p99": round(float(p99), 2),
+        "max": round(float(np.max(durations)), 2),
+    }
+
+def summary(stats) -> dict:
+    return {key: value for key, value in stats.model_dump().items() if key != "histogram"}
+
+def test_grouped_percentiles_match_numpy():
+    rng = np.random.default_rng(0)
+    durations = rng.lognormal(4, 1, 5000)
+    # Group 3 gets a single call and group 4 none
+    groups = rng.integers(0, 3, len(durations)).astype(np.int16)
+    groups[0] = 3
+
+    order = np.argsort(durations)
+    stats = grouped_duration_stats(durations[order], groups[order], 5)
+
+    for group in range(4):
+        assert summary(stats[group]) == expected_stats(durations[groups == group])
+    assert stats[4] is None
+    assert sum(stats[0].histogram) == stats[0].count
+
+def test_no_durations_at_all():
+    assert grouped_duration_stats(np.zeros(0), np.zeros(0, dtype=np.int16), 2) == [None, None]
+
+def add_calls(db, durations, intent: str = "create_ticket") -> None:
+    first = db.query(Call).count()
+    db.execute(insert(Call), [
+        {
+            "call_sid": f"CA{first + number:08d}",
+            "phone_number": "+15550000000",
+            "direction": CallDirection.INBOUND,
+            "status": CallStatus.COMPLETED,
+            "duration": float(duration),
+            "intent": intent,
+            "created_at": datetime(2024, 1, 1) + timedelta(minutes=number),
+        }
+        for number, duration in enumerate(durations)
+    ])
+    db.commit()
+
+def get_durations(client) -> dict:
+    response = client.get("/admin/analytics/durations", params={"start_date": "2024-01-01", "end_date": "2024-01-31"})
+    assert response.status_code == 200
+    return response.json()
+
+def without_histogram(stats: dict) -> dict:
+    return {key: value for key, value in stats.items() if key != "histogram"}
+
+def test_endpoint_percentiles_match_numpy(client, db):
+    durations = np.random.default_rng(1).integers(1, 1800, 500)
+    add_calls(db, durations)
+    add_calls(db, [0, 0])  # Unanswered calls aren't counted
+
+    analytics = get_durations(client)
+
+    assert without_histogram(analytics["overall"]) == expected_stats(durations)
+    assert without_histogram(analytics["by_intent"]["create_ticket"]) == expected_stats(durations)
+
+def test_endpoint_without_calls(client, db):
+    analytics = get_durations(client)
+
+    assert analytics["overall"] is None
+    assert analytics["by_intent"] == {} and analytics["by_hour"] == {}
+
+def test_endpoint_with_a_single_call(client, db):
+    add_calls(db, [42.5])
+
+    overall = get_durations(client)["overall"]
+
+    assert without_histogram(overall) == {"count": 1, "mean": 42.5, "p50": 42.5, "p90": 42.5, "p99": 42.5, "max": 42.5}
+    assert overall["histogram"][2] == 1
@@ -0,0 +1,72 @@
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from app.models.database import ArchivePartition, Call, CallDirection, CallStatus
+from app.services.archive_service import ArchiveService
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+def archive_two_days(db) -> ArchiveService:
+    """Archive a call every half hour of 2024-01-01 and 2024-01-02 (UTC)"""
+    db.execute(insert(Call), [
+        {
+            "call_sid": f"CA{number:08d}",
+            "phone_number": "+15550000000",
+            "direction": CallDirection.INBOUND,
+            "status": CallStatus.COMPLETED,
+            "duration": 60.0,
+            "created_at": datetime(2024, 1, 1) + timedelta(minutes=30 * number),
+        }
+        for number in range(96)
+    ])
+    db.commit()
+    service = ArchiveService(db)
+    report = asyncio.run(service.archive_calls(retention_days=0))
+    assert report["calls"] == 96 and report["partitions"] == 2
+    return service
+
+def with_offsets(service: ArchiveService, db) -> None:
+    """Rewrite the partitions as Postgres would have written them: created_at in IST, with an offset"""
+    for partition in db.query(ArchivePartition):
+        path = os.path.join(service.archive_dir, partition.path)
+        with gzip.open(path, "rt", encoding="utf-8") as archive_file:
+            records = [json.loads(line) for line in archive_file]
+        for record in records:
+            created_at = datetime.fromisoformat(record["created_at"]).replace(tzinfo=timezone.utc)
+            record["created_at"] = created_at.astimezone(IST).isoformat()
+        with gzip.open(path, "wt", encoding="utf-8") as archive_file:
+            archive_file.writelines(json.dumps(record) + "\n" for record in records)
+
+def test_partial_days_are_filtered_with_exact_bounds(db):
+    service = archive_two_days(db)
+    start, end = datetime(2024, 1, 1, 12), datetime(2024, 1, 2, 6)
+
+    assert len(list(service.iter_archived_records(start, end))) == 36
+    assert service.get_archived_summary(start, end)["total_calls"] == 36
+    assert service.get_archived_summary(datetime(2024, 1, 1), datetime(2024, 1, 3))["total_calls"] == 96
+
+def test_records_with_utc_offsets_compare_in_utc(db):
+    service = archive_two_days(db)
+    with_offsets(service, db)
+    start, end = datetime(2024, 1, 1, 12), datetime(2024, 1, 2, 6)
+
+    records = list(service.iter_archived_records(start, end))
+    assert len(records) == 36
+    assert service.get_archived_summary(start, end)["total_calls"] == 36
+    # Aware bounds select the same calls
+    aware = list(service.iter_archived_records(start.replace(tzinfo=timezone.utc), end.replace(tzinfo=timezone.utc)))
+    assert aware == records
+
+def test_recent_calls_are_not_archived(db):
+    db.add(Call(call_sid="CA-recent", phone_number="+15550000000", direction=CallDirection.INBOUND,
+                status=CallStatus.COMPLETED, created_at=datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)))
+    db.commit()
+
+    report = asyncio.run(ArchiveService(db).archive_calls(retention_days=1))
+
+    assert report["calls"] == 0
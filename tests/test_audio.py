@@ -0,0 +1,62 @@
+import numpy as np
+
+from app.utils.audio import decode_wav, encode_wav, prepare_for_transcription, speech_regions
+
+def tone(seconds: float, sample_rate: int, amplitude: float = 8000.0) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return amplitude * np.sin(2 * np.pi * 440 * t)
+
+def quiet(seconds: float, sample_rate: int) -> np.ndarray:
+    return np.random.default_rng(0).normal(0, 3, int(seconds * sample_rate))
+
+def speech_with_pause(sample_rate: int) -> np.ndarray:
+    """1s of speech, 3s of near silence, 1s of speech"""
+    signal = np.concatenate([tone(1, sample_rate), quiet(3, sample_rate), tone(1, sample_rate)])
+    return np.clip(np.rint(signal), -32768, 32767).astype(np.int16)
+
+def test_long_pause_is_shortened_to_max_pause():
+    mono = speech_with_pause(16000).astype(np.float32)
+
+    regions = speech_regions(mono, 16000, max_pause_ms=600)
+
+    assert len(regions) == 2
+    # Each side of the pause keeps half the allowed pause, give or take a frame
+    kept_pause = (regions[1][0] - regions[0][1]) / 16000
+    assert abs(kept_pause - 2.4) < 0.07
+
+def test_prepared_offsets_map_back_to_the_original_recording():
+    prepared = prepare_for_transcription(speech_with_pause(16000)[:, None], 16000, 16000, max_pause_ms=600)
+
+    assert prepared.source_duration == 5.0
+    assert abs(len(prepared.samples) / prepared.sample_rate - 2.6) < 0.07
+    # The second burst of speech starts 4s into the original
+    second_region = int(prepared.output_starts[1])
+    assert abs(prepared.source_seconds(second_region + int(0.3 * 16000)) - 4.0) < 0.04
+    assert abs(prepared.source_seconds(int(0.5 * 16000)) - 0.5) < 1e-6
+
+def test_all_silence_keeps_nothing():
+    silence = np.zeros((16000 * 2, 1), dtype=np.int16)
+
+    assert len(speech_regions(silence[:, 0].astype(np.float32), 16000, 600)) == 0
+    prepared = prepare_for_transcription(silence, 16000, 16000, max_pause_ms=600)
+    assert len(prepared.samples) == 0
+    assert prepared.source_duration == 2.0
+    assert prepared.source_seconds(0) == 0.0
+
+def test_stereo_is_downmixed_and_downsampled():
+    mono = speech_with_pause(48000)
+    samples, sample_rate = decode_wav(encode_wav(np.stack([mono, mono], axis=1), 48000))
+
+    prepared = prepare_for_transcription(samples, sample_rate, 16000, max_pause_ms=600)
+
+    assert prepared.sample_rate == 16000
+    assert prepared.samples.ndim == 1
+    assert prepared.source_duration == 5.0
+
+def test_narrowband_audio_is_not_upsampled():
+    samples = speech_with_pause(8000)[:, None]
+
+    prepared = prepare_for_transcription(samples, 8000, 16000, max_pause_ms=600)
+
+    assert prepared.sample_rate == 8000
+    assert abs(len(prepared.samples) / 8000 - 2.6) < 0.07
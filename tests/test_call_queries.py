@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.models.database import ActionType, Call, CallAction, CallDirection, CallStatus, Recording, Ticket
+
+INCLUDE = "recordings,actions,tickets"
+
+def add_calls(db, count: int) -> None:
+    """Insert count calls, each with two recordings, two actions and a ticket"""
+    created_at = datetime(2024, 1, 1)
+    db.execute(insert(Call), [
+        {
+            "call_sid": f"CA{number:08d}",
+            "phone_number": "+15550000000",
+            "direction": CallDirection.INBOUND,
+            "status": CallStatus.COMPLETED,
+            "transcript": "Where is my order?",
+            "created_at": created_at + timedelta(seconds=number),
+        }
+        for number in range(count)
+    ])
+    call_ids = db.execute(select(Call.id)).scalars().all()
+    db.execute(insert(Recording), [
+        {"call_id": call_id, "recording_sid": f"RE{call_id:08d}{copy}", "recording_url": "https://example.com/audio.wav"}
+        for call_id in call_ids for copy in range(2)
+    ])
+    db.execute(insert(CallAction), [
+        {"call_id": call_id, "action_type": action_type, "details": "{}", "status": "completed"}
+        for call_id in call_ids for action_type in (ActionType.RESOLVED, ActionType.TICKET)
+    ])
+    db.execute(insert(Ticket), [
+        {"call_id": call_id, "ticket_number": f"TKT-{call_id:09d}", "subject": "Order status", "description": "Where is my order?"}
+        for call_id in call_ids
+    ])
+    db.commit()
+
+def test_list_queries_do_not_grow_with_page_size(client, db, queries):
+    add_calls(db, 501)
+
+    counts = {}
+    for limit in (1, 10, 500):
+        before = queries.count
+        response = client.get("/calls/", params={"limit": limit, "include": INCLUDE})
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) == limit
+        assert all(len(call["recordings"]) == 2 and len(call["actions"]) == 2 and len(call["tickets"]) == 1 for call in page)
+        counts[limit] = queries.count - before
+
+    # One query for the page and one per included relationship
+    assert counts == {1: 4, 10: 4, 500: 4}
+
+def test_pages_are_capped_at_what_one_query_per_include_loads(client, db):
+    assert client.get("/calls/", params={"limit": 501, "include": INCLUDE}).status_code == 422
+
+@pytest.mark.parametrize("include, expected", [("", 1), ("actions", 2), (INCLUDE, 4)])
+def test_detail_loads_each_include_in_one_query(client, db, queries, include, expected):
+    add_calls(db, 3)
+
+    before = queries.count
+    response = client.get("/calls/2", params={"include": include})
+
+    assert response.status_code == 200
+    assert queries.count - before == expected
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.models.database import ActionType, Call, CallAction, CallDirection, CallStatus
+from app.services.callback_scheduler import CallbackScheduler
+
+def make_scheduler() -> CallbackScheduler:
+    return CallbackScheduler(
+        calls_per_second=100.0,
+        max_concurrency=10,
+        destination_interval_seconds=0.0,
+        calling_hours="09:00-18:00",
+        timezone="UTC",
+        delay_seconds=0.0,
+        poll_seconds=0.1,
+        reload_seconds=300.0,
+        dial_timeout_seconds=600.0
+    )
+
+def add_callback(db, status: str = "pending", updated_at=None) -> CallAction:
+    call = Call(call_sid=f"CA{db.query(Call).count():08d}", phone_number="+15550000000",
+                direction=CallDirection.INBOUND, status=CallStatus.COMPLETED)
+    db.add(call)
+    db.flush()
+    action = CallAction(call_id=call.id, action_type=ActionType.CALLBACK, details="{}", status=status)
+    db.add(action)
+    db.commit()
+    if updated_at is not None:
+        db.query(CallAction).filter(CallAction.id == action.id).update({"updated_at": updated_at})
+        db.commit()
+    return action
+
+def test_requeue_stale_dialing_callbacks(db):
+    stale = add_callback(db, "dialing", datetime.now(timezone.utc) - timedelta(hours=1))
+    recent = add_callback(db, "dialing", datetime.now(timezone.utc))
+
+    assert make_scheduler().requeue_stale() == 1
+
+    db.expire_all()
+    assert db.get(CallAction, stale.id).status == "pending"
+    assert db.get(CallAction, recent.id).status == "dialing"
+
+def test_load_new_picks_up_late_callbacks_once(db):
+    scheduler = make_scheduler()
+    first = add_callback(db)
+    assert scheduler.load_all() == 1
+
+    # A callback committed after the load, with an id below ones not seen yet
+    second = add_callback(db)
+    db.query(CallAction).filter(CallAction.id == second.id).update({"created_at": datetime(2000, 1, 1)})
+    db.commit()
+    assert scheduler.load_all() == 1
+    third = add_callback(db)
+    assert scheduler.load_new() == 1
+    assert scheduler.load_new() == 0
+
+    assert sorted(callback.action_id for callback in scheduler._queue) == [first.id, second.id, third.id]
+
+def test_dialed_callback_does_not_schedule_another(db):
+    action = add_callback(db)
+    scheduler = make_scheduler()
+    scheduler.in_calling_hours = lambda at: True
+    scheduler.load_all()
+
+    async def dial():
+        scheduler.dispatch_due()
+        await scheduler.drain()
+    asyncio.run(dial())
+
+    db.expire_all()
+    assert db.get(CallAction, action.id).status in ("completed", "failed")
+    assert db.query(CallAction).filter(
+        CallAction.action_type == ActionType.CALLBACK, CallAction.status == "pending"
+    ).count() == 0
+    scheduler.load_new()
+    assert scheduler._queue == []
@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import text
+
+from app.database.db import engine
+from app.database.migrations import compress_transcripts
+from app.models.database import Call, CallDirection, CallStatus
+from app.utils import compression
+from app.utils.compression import compress_text, decompress_text, is_compressed
+
+TRANSCRIPT = "I would like to know the status of my order and when it will be delivered. " * 10
+HINDI_TRANSCRIPT = "मेरा ऑर्डर कहाँ है और यह कब तक पहुंचेगा? " * 10
+
+@pytest.fixture
+def codec(monkeypatch, tmp_path):
+    """Switch codec and dictionary: codec(name, dictionary=None)"""
+    def configure(name: str, dictionary: bytes = None):
+        path = ""
+        if dictionary is not None:
+            path = str(tmp_path / f"dictionary-{len(dictionary)}")
+            with open(path, "wb") as dict_file:
+                dict_file.write(dictionary)
+        monkeypatch.setattr(compression.settings, "transcript_compression", name)
+        monkeypatch.setattr(compression.settings, "transcript_compression_dict_path", path)
+        compression.load_dictionary.cache_clear()
+
+    yield configure
+    compression.load_dictionary.cache_clear()
+
+def test_legacy_plain_text_reads_back_unchanged():
+    assert decompress_text(TRANSCRIPT) == TRANSCRIPT
+    assert decompress_text(HINDI_TRANSCRIPT.encode("utf-8")) == HINDI_TRANSCRIPT
+    assert decompress_text(None) is None
+    assert not is_compressed(TRANSCRIPT.encode("utf-8"))
+
+@pytest.mark.parametrize("value", [TRANSCRIPT, HINDI_TRANSCRIPT])
+def test_zlib_round_trip(codec, value):
+    codec("zlib")
+    payload = compress_text(value)
+
+    assert is_compressed(payload) and payload[1:2] == compression.CODEC_ZLIB
+    assert len(payload) < len(value.encode("utf-8"))
+    assert decompress_text(payload) == value
+
+def test_values_that_do_not_shrink_stay_plain(codec):
+    codec("zlib")
+    assert compress_text("ok") == b"ok"
+
+def test_zlib_dictionary_round_trip(codec):
+    codec("zlib", dictionary=TRANSCRIPT.encode("utf-8"))
+    payload = compress_text(TRANSCRIPT)
+
+    assert payload[1:2] == compression.CODEC_ZLIB_DICT
+    assert decompress_text(payload) == TRANSCRIPT
+
+    codec("zlib", dictionary=b"another dictionary")
+    with pytest.raises(ValueError):
+        decompress_text(payload)
+
+@pytest.mark.parametrize("with_dictionary", [False, True])
+def test_zstd_round_trip(codec, with_dictionary):
+    pytest.importorskip("zstandard")
+    codec("zstd", dictionary=HINDI_TRANSCRIPT.encode("utf-8") if with_dictionary else None)
+    payload = compress_text(HINDI_TRANSCRIPT)
+
+    assert payload[1:2] == (compression.CODEC_ZSTD_DICT if with_dictionary else compression.CODEC_ZSTD)
+    assert decompress_text(payload) == HINDI_TRANSCRIPT
+
+def test_compressed_text_column_through_the_orm(db):
+    db.add(Call(call_sid="CA1", phone_number="+15550000000", direction=CallDirection.INBOUND,
+                status=CallStatus.COMPLETED, transcript=TRANSCRIPT))
+    db.commit()
+    db.expunge_all()
+
+    stored = db.execute(text("SELECT transcript FROM calls WHERE call_sid = 'CA1'")).scalar()
+    assert is_compressed(stored)
+    assert db.query(Call).filter(Call.call_sid == "CA1").one().transcript == TRANSCRIPT
+
+def insert_plain_transcripts(db, transcripts) -> None:
+    """Rows as written before transcripts were compressed"""
+    for number, transcript in enumerate(transcripts):
+        db.execute(text(
+            "INSERT INTO calls (call_sid, phone_number, direction, status, transcript) "
+            "VALUES (:call_sid, '+15550000000', 'INBOUND', 'COMPLETED', :transcript)"
+        ), {"call_sid": f"CA{number}", "transcript": transcript})
+    db.commit()
+
+def test_compress_transcripts_only_rewrites_values_that_shrink(db):
+    insert_plain_transcripts(db, [TRANSCRIPT, HINDI_TRANSCRIPT, "ok", "yes"])
+
+    first = compress_transcripts(engine)["calls"]
+    assert first["rows"] == 4 and first["compressed"] == 2
+    assert first["bytes_after"] < first["bytes_before"]
+
+    second = compress_transcripts(engine)["calls"]
+    assert second["compressed"] == 0
+    assert second["bytes_after"] == second["bytes_before"]
+
+    db.expire_all()
+    assert sorted(call.transcript for call in db.query(Call)) == sorted([TRANSCRIPT, HINDI_TRANSCRIPT, "ok", "yes"])
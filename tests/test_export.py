@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+import gzip
+import json
+import tracemalloc
+
+from sqlalchemy import insert, select
+
+from app.database.db import ReadSessionLocal
+from app.models.database import ActionType, Call, CallAction, CallDirection, CallStatus, Ticket
+from app.services.export_service import ExportService
+
+TRANSCRIPT = "I would like to know the status of my order and when it will be delivered. " * 6
+
+def add_calls(db, count: int) -> None:
+    """Insert count calls, each with an action and a ticket"""
+    first = db.query(Call).count()
+    created_at = datetime(2024, 1, 1)
+    db.execute(insert(Call), [
+        {
+            "call_sid": f"CA{first + number:08d}",
+            "phone_number": "+15550000000",
+            "direction": CallDirection.INBOUND,
+            "status": CallStatus.COMPLETED,
+            "duration": 30.0,
+            "transcript": TRANSCRIPT,
+            "intent": "order_status",
+            "created_at": created_at + timedelta(seconds=first + number),
+        }
+        for number in range(count)
+    ])
+    call_ids = db.execute(select(Call.id).order_by(Call.id).offset(first)).scalars().all()
+    db.execute(insert(CallAction), [
+        {"call_id": call_id, "action_type": ActionType.RESOLVED, "details": "{}", "status": "completed"}
+        for call_id in call_ids
+    ])
+    db.execute(insert(Ticket), [
+        {"call_id": call_id, "ticket_number": f"TKT-{call_id:09d}", "subject": "Order status", "description": TRANSCRIPT}
+        for call_id in call_ids
+    ])
+    db.commit()
+
+def export_peak_bytes(format: str) -> int:
+    """Peak memory allocated while streaming a full export and discarding it"""
+    db = ReadSessionLocal()
+    try:
+        tracemalloc.start()
+        for _ in ExportService(db).iter_export(datetime.min, datetime.max, format=format, include=["actions", "tickets"]):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        db.close()
+
+def test_export_memory_stays_flat(db):
+    add_calls(db, 1000)
+    small = {format: export_peak_bytes(format) for format in ("ndjson", "csv")}
+
+    add_calls(db, 7000)
+    for format in ("ndjson", "csv"):
+        # Eight times the rows; a materialized export would need about eight times the memory
+        assert export_peak_bytes(format) < small[format] * 1.5
+
+def test_export_streams_every_call_with_children(client, db):
+    add_calls(db, 1200)
+
+    response = client.get("/admin/export", params={"include": "actions,tickets", "gzip": "true"})
+
+    assert response.status_code == 200
+    records = [json.loads(line) for line in gzip.decompress(response.content).splitlines()]
+    assert len(records) == 1200
+    assert [record["id"] for record in records] == sorted(record["id"] for record in records)
+    assert all(len(record["actions"]) == 1 and len(record["tickets"]) == 1 for record in records)
+
+def test_export_filters_by_date(client, db):
+    add_calls(db, 10)
+
+    response = client.get("/admin/export", params={"start_date": "2024-01-02", "format": "csv"})
+
+    assert response.status_code == 200
+    assert response.text.splitlines() == [",".join(column.key for column in Call.__table__.columns)]
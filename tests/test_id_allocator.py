@@ -0,0 +1,17 @@
+from app.services.id_allocator import id_allocator, next_call_sid, next_ticket_number
+
+def test_first_lease_on_fresh_database_is_one_statement(db, queries):
+    assert next_ticket_number() == "TKT-000000001"
+    assert queries.count == 1
+
+    assert next_call_sid("out") == "out_0000000001"
+    assert queries.count == 2
+
+def test_blocks_do_not_overlap(db):
+    first = id_allocator.next_range("ticket", 5)
+    assert next_ticket_number() == f"TKT-{first.stop:09d}"
+    assert id_allocator.next_range("ticket", 5).start == first.stop + id_allocator.block_size
+
+def test_unseeded_counter_is_created_on_first_lease(db):
+    assert id_allocator.next("other") == 1
+    assert id_allocator.next("other") == 2
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from app.database.db import SessionLocal
+from app.models.database import ActionType, Call, CallAction, ImportJob
+from app.services.import_service import IMPORTED_CALLBACK_STATUS, ImportAlreadyRunning, ImportService
+
+def write_export(path, count: int) -> str:
+    with open(path, "w") as export:
+        for number in range(count):
+            export.write(json.dumps({
+                "call_sid": f"CA{number:08d}",
+                "phone_number": "+15550000000",
+                "direction": "inbound",
+                "status": "completed",
+                "intent": "callback",
+                "actions": [
+                    {"action_type": "callback", "status": "pending", "details": "{}"},
+                    {"action_type": "callback", "status": "completed", "details": "{}"},
+                ],
+            }) + "\n")
+    return str(path)
+
+def test_imported_pending_callbacks_are_never_dialed(db, tmp_path):
+    service = ImportService(db, batch_size=10)
+    service.run(service.create_job(write_export(tmp_path / "calls.ndjson", 5), "ndjson"))
+
+    statuses = db.query(CallAction.status).filter(CallAction.action_type == ActionType.CALLBACK).all()
+    assert sorted(status for status, in statuses) == ["completed"] * 5 + [IMPORTED_CALLBACK_STATUS] * 5
+
+def test_losing_concurrent_run_leaves_the_job_completed(db, tmp_path):
+    job = ImportService(db, batch_size=10).create_job(write_export(tmp_path / "calls.ndjson", 5), "ndjson")
+    second_db = SessionLocal()
+    second = ImportService(second_db, batch_size=10)
+    write_batch = second._write_batch
+
+    def write_after_first_run(*args):
+        # The first run checks for existing calls and commits its batch in
+        # between the second run's check and its insert
+        ImportService(db, batch_size=10).run(job)
+        second._drop_existing_calls = lambda conn, batch: None
+        write_batch(*args)
+    second._write_batch = write_after_first_run
+
+    try:
+        with pytest.raises(ImportAlreadyRunning):
+            second.run(second_db.get(ImportJob, job.id))
+    finally:
+        second_db.close()
+
+    db.expire_all()
+    assert db.get(ImportJob, job.id).status == "completed"
+    assert db.query(Call).count() == 5
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import re
+import time
+
+from aiohttp import web
+
+from app.services import intent_service
+from app.services.intent_service import IntentService, _request_intents_openai, settings
+from app.services.micro_batcher import MicroBatcher
+
+NUMBERED_TEXT = re.compile(r'^\s*(\d+)\. (".*")$', re.MULTILINE)
+
+class StandInChatCompletions:
+    """
+    Answers batched intent requests like the chat completions API
+
+    Texts mentioning "omit" are left out of the response, those mentioning
+    "bogus" get a label that isn't an intent, and a batch with any text
+    mentioning "fail" gets a server error. Everything else is resolve_issue.
+    """
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, request: web.Request) -> web.Response:
+        prompt = (await request.json())["messages"][0]["content"]
+        texts = {int(number): json.loads(text) for number, text in NUMBERED_TEXT.findall(prompt)}
+        self.batches.append(list(texts.values()))
+        if any("fail" in text for text in texts.values()):
+            return web.Response(status=500, text="overloaded")
+
+        intents = [
+            {"id": number, "intent": "not_a_label" if "bogus" in text else "resolve_issue"}
+            for number, text in texts.items() if "omit" not in text
+        ]
+        content = json.dumps({"intents": intents})
+        return web.json_response({"choices": [{"message": {"content": content}}]})
+
+def run_with_stand_in(monkeypatch, scenario):
+    """Run scenario(stand_in) with the OpenAI API pointed at a stand-in server"""
+    stand_in = StandInChatCompletions()
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", stand_in)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(settings, "openai_base_url", f"http://127.0.0.1:{port}/v1")
+        try:
+            return await scenario(stand_in)
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+def test_full_batch_is_sent_without_waiting(monkeypatch):
+    batcher = MicroBatcher(_request_intents_openai, max_batch_size=4, max_wait_ms=10_000)
+
+    async def scenario(stand_in):
+        started = time.perf_counter()
+        intents = await asyncio.gather(*[batcher.submit(f"text {number}") for number in range(4)])
+        return intents, time.perf_counter() - started
+
+    intents, elapsed = run_with_stand_in(monkeypatch, scenario)
+
+    assert intents == ["resolve_issue"] * 4
+    assert elapsed < 5
+    assert batcher.batches_sent == 1
+
+def test_partial_batch_is_sent_after_max_wait(monkeypatch):
+    batcher = MicroBatcher(_request_intents_openai, max_batch_size=100, max_wait_ms=50)
+
+    async def scenario(stand_in):
+        started = time.perf_counter()
+        await asyncio.gather(*[batcher.submit(f"text {number}") for number in range(3)])
+        return stand_in.batches, time.perf_counter() - started
+
+    batches, elapsed = run_with_stand_in(monkeypatch, scenario)
+
+    assert batches == [["text 0", "text 1", "text 2"]]
+    assert elapsed >= 0.05
+
+def extract_intents(monkeypatch, texts):
+    """Intents of concurrently classified texts, through the batched LLM stage"""
+    monkeypatch.setattr(settings, "mock_external_services", False)
+    monkeypatch.setattr(settings, "intent_batch_max_size", 8)
+    batcher = MicroBatcher(_request_intents_openai, max_batch_size=8, max_wait_ms=20)
+    monkeypatch.setattr(intent_service, "openai_intent_batcher", batcher)
+    service = IntentService()
+
+    async def scenario(stand_in):
+        intents = await asyncio.gather(*[service._extract_intent_openai(text) for text in texts])
+        return intents, stand_in.batches
+
+    return run_with_stand_in(monkeypatch, scenario)
+
+def test_items_without_a_valid_intent_fall_back_to_the_rules(monkeypatch):
+    intents, batches = extract_intents(monkeypatch, [
+        "omit this, I want to file a complaint",
+        "bogus, please call me back later",
+        "anything else",
+    ])
+
+    assert len(batches) == 1
+    assert intents == ["create_ticket", "schedule_callback", "resolve_issue"]
+
+def test_failed_request_falls_back_to_the_rules_for_the_whole_batch(monkeypatch):
+    intents, batches = extract_intents(monkeypatch, [
+        "fail, and let me speak to a manager",
+        "open a ticket please",
+        "anything else",
+    ])
+
+    assert len(batches) == 1
+    assert intents == ["speak_agent", "create_ticket", "general_inquiry"]
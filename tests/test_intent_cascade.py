@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from app.services import intent_classifier, intent_service
+from app.services.intent_classifier import IntentClassifier
+from app.services.intent_service import IntentService, intent_stage_counts, settings
+
+TRAINING = {
+    "create_ticket": [
+        "the app crashes when I log in", "my screen freezes on the payment page", "the app crashes every morning",
+        "the login page keeps freezing", "payment page crashes on my phone", "it freezes when I open the app",
+    ],
+    "general_inquiry": [
+        "what are your opening hours", "where is your nearest store", "what are your hours on sunday",
+        "do you have a store near me", "what time do you open", "where can I find your store",
+    ],
+}
+
+# Matches no intent pattern and none of the mock LLM's keywords
+UNMATCHED = "the app crashes when I open the payment page"
+
+@pytest.fixture
+def classifier(monkeypatch, tmp_path):
+    """A tiny trained model in place of INTENT_MODEL_PATH"""
+    texts = [text for texts in TRAINING.values() for text in texts]
+    intents = [intent for intent, texts in TRAINING.items() for _ in texts]
+    model, _ = IntentClassifier.train(texts, intents, holdout=0.0, epochs=60)
+    path = str(tmp_path / "intent_classifier.npz")
+    model.save(path)
+
+    monkeypatch.setattr(settings, "intent_model_path", path)
+    monkeypatch.setattr(settings, "use_openai_for_intent", True)
+    monkeypatch.setattr(settings, "openai_api_key", "test-key")
+    intent_classifier.get_intent_classifier.cache_clear()
+    yield model
+    intent_classifier.get_intent_classifier.cache_clear()
+
+def extract(text: str):
+    """Intent of text and the stage of the cascade that decided it"""
+    before = dict(intent_stage_counts)
+    intent = asyncio.run(IntentService().extract_intent(text))
+    stages = [stage for stage, count in intent_stage_counts.items() if count != before[stage]]
+    return intent, stages
+
+def test_rules_decide_first(classifier):
+    assert extract("please call me back tomorrow") == ("schedule_callback", ["rules"])
+
+def test_confident_model_decides_before_the_llm(classifier, monkeypatch):
+    (intent, confidence), = classifier.predict([UNMATCHED])
+    assert intent == "create_ticket"
+
+    monkeypatch.setattr(settings, "intent_model_min_confidence", confidence)
+    assert extract(UNMATCHED) == ("create_ticket", ["model"])
+
+def test_llm_decides_when_the_model_is_unsure(classifier, monkeypatch):
+    (_, confidence), = classifier.predict([UNMATCHED])
+    monkeypatch.setattr(settings, "intent_model_min_confidence", confidence + 1e-6)
+
+    assert extract(UNMATCHED) == ("general_inquiry", ["llm"])
+
+def test_default_without_the_llm(classifier, monkeypatch):
+    monkeypatch.setattr(settings, "intent_model_min_confidence", 1.1)
+    monkeypatch.setattr(settings, "use_openai_for_intent", False)
+
+    assert extract(UNMATCHED) == ("general_inquiry", ["default"])
+
+def test_training_rejects_unknown_labels():
+    with pytest.raises(ValueError, match="refund_request"):
+        IntentClassifier.train(["I want my money back", "what are your hours"], ["refund_request", "general_inquiry"])
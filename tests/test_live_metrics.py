@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import live_metrics as live_metrics_module
+from app.services.live_metrics import MAX_KEY_BYTES, LiveMetrics
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1000.0)
+    monkeypatch.setattr(live_metrics_module.time, "time", clock.time)
+    return clock
+
+@pytest.fixture
+def worker(monkeypatch):
+    """The slot records are written from, as the pre-fork worker it stands for"""
+    worker = SimpleNamespace(slot=0)
+    monkeypatch.setattr(live_metrics_module, "get_worker_table", lambda: worker)
+    return worker
+
+def test_ring_wraps_around_and_drops_old_seconds(clock, worker):
+    metrics = LiveMetrics(slots=1, window_seconds=5, max_keys=4)
+    for second, count in [(1000, 2), (1003, 1), (1006, 3)]:
+        clock.now = second + 0.5
+        for _ in range(count):
+            metrics.record("created:inbound")
+
+    # 1006 reused the bucket of 1001; 1000 is out of the window, 1003 isn't
+    snapshot = metrics.snapshot(5)
+    assert snapshot["per_second"]["created:inbound"] == [0, 1, 0, 0, 3]
+    assert snapshot["totals"]["created:inbound"] == 4
+
+    # The bucket of 1000, written one pass round the ring earlier, starts again from zero
+    clock.now = 1010.2
+    metrics.record("created:inbound")
+    assert metrics.snapshot(5)["per_second"]["created:inbound"] == [3, 0, 0, 0, 1]
+    assert metrics.snapshot(2)["per_second"]["created:inbound"] == [0, 1]
+
+def test_slots_of_all_workers_are_merged_by_key(clock, worker):
+    metrics = LiveMetrics(slots=3, window_seconds=10, max_keys=4)
+    for slot, keys in [(0, ["created:inbound", "status:completed"]), (1, ["status:completed", "created:inbound"]), (2, ["intent:refund"])]:
+        worker.slot = slot
+        metrics.record(*keys)
+
+    assert metrics.snapshot(10)["totals"] == {"created:inbound": 2, "status:completed": 2, "intent:refund": 1}
+    assert metrics.call_metrics(10)["by_status"] == {"completed": 2}
+
+def test_long_multibyte_keys_are_cut_between_characters(clock, worker):
+    metrics = LiveMetrics(slots=1, window_seconds=10, max_keys=4)
+    # 64 bytes end in the middle of a three-byte character
+    key = "intent:a" + "रिफंड" * 10
+
+    metrics.record(key)
+    metrics.record(key)
+    # A worker restarted in the same slot adopts the truncated column
+    restarted = LiveMetrics.__new__(LiveMetrics)
+    restarted.__dict__.update(metrics.__dict__, _columns={}, _columns_slot=None)
+    restarted.record(key)
+
+    (stored, count), = metrics.snapshot(10)["totals"].items()
+    assert count == 3
+    assert key.startswith(stored) and len(stored.encode()) <= MAX_KEY_BYTES
@@ -0,0 +1,42 @@
+import pytest
+
+from app.database.query_monitor import QueryBudgetExceeded, query_monitor, track_queries
+from app.services.id_allocator import next_ticket_number
+
+MESSAGES = [
+    "I have an issue, please create a ticket",
+    "Please call me back tomorrow",
+    "I want to speak to a manager",
+    "Where is my order?",
+]
+
+def test_strict_mode_is_on():
+    assert query_monitor.strict
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_simulate_call_on_empty_database_fits_its_budget(client, message):
+    # The first call of each kind leases fresh ID blocks
+    response = client.post("/admin/simulate-call", params={"phone_number": "+15550001111", "message": message})
+
+    assert response.status_code == 200
+
+def test_id_leases_are_not_counted(db):
+    with track_queries("lease", budget=0) as stats:
+        next_ticket_number()
+    assert stats.count == 0
+
+def test_going_over_budget_fails_in_strict_mode(db):
+    with pytest.raises(QueryBudgetExceeded):
+        with track_queries("over", budget=0):
+            db.connection().exec_driver_sql("SELECT 1")
+
+def test_failed_statements_leave_nothing_on_the_connection(db):
+    connection = db.connection()
+    for _ in range(3):
+        with pytest.raises(Exception):
+            connection.exec_driver_sql("SELECT * FROM no_such_table")
+        db.rollback()
+        connection = db.connection()
+
+    connection.exec_driver_sql("SELECT 1")
+    assert "query_started_at" not in connection.info
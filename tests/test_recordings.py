@@ -0,0 +1,141 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from app.database.db import SessionLocal
+from app.models.database import Call, CallDirection, CallStatus, Recording
+from app.routes import call_routes
+from app.services.call_service import CallService
+from app.services.recording_store import RecordingStore
+from app.services.voice_service import StoredRecording, TranscriptSegment
+from app.utils.audio import encode_wav
+
+AUDIO = bytes(range(256)) * 4
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = RecordingStore(str(tmp_path / "recordings"), max_bytes=10_000)
+    monkeypatch.setattr(call_routes, "get_recording_store", lambda: store)
+    return store
+
+def add_recording(db, content_hash: str) -> Recording:
+    call = Call(call_sid="CA00000001", phone_number="+15550000000",
+                direction=CallDirection.INBOUND, status=CallStatus.COMPLETED)
+    db.add(call)
+    db.flush()
+    recording = Recording(call_id=call.id, recording_url="https://example.com/recording", content_hash=content_hash)
+    db.add(recording)
+    db.commit()
+    return recording
+
+def get_audio(client, recording: Recording, range_header: str = None):
+    headers = {"Range": range_header} if range_header else {}
+    return client.get(f"/calls/{recording.call_id}/recordings/{recording.id}/audio", headers=headers)
+
+def test_whole_recording_without_a_range(client, db, store):
+    recording = add_recording(db, store.put(AUDIO))
+
+    response = get_audio(client, recording)
+
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "content-range" not in response.headers
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=100-199", 100, 199),
+    ("bytes=1000-", 1000, 1023),  # Open-ended
+    ("bytes=-24", 1000, 1023),  # Suffix
+    ("bytes=-5000", 0, 1023),  # Suffix longer than the recording
+    ("bytes=1000-5000", 1000, 1023),  # Past the end
+])
+def test_byte_ranges(client, db, store, range_header, start, end):
+    recording = add_recording(db, store.put(AUDIO))
+
+    response = get_audio(client, recording, range_header)
+
+    assert response.status_code == 206
+    assert response.content == AUDIO[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(AUDIO)}"
+
+@pytest.mark.parametrize("range_header", ["bytes=1024-", "bytes=2000-3000", "bytes=500-100"])
+def test_unsatisfiable_ranges(client, db, store, range_header):
+    recording = add_recording(db, store.put(AUDIO))
+
+    response = get_audio(client, recording, range_header)
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(AUDIO)}"
+
+@pytest.mark.parametrize("range_header", ["bytes=0-9,20-29", "items=0-9", "bytes=a-b"])
+def test_ranges_that_are_ignored(client, db, store, range_header):
+    recording = add_recording(db, store.put(AUDIO))
+
+    response = get_audio(client, recording, range_header)
+
+    assert response.status_code == 200
+    assert response.content == AUDIO
+
+def test_wav_type_is_detected_from_the_start_of_the_file(client, db, store):
+    recording = add_recording(db, store.put(encode_wav(np.zeros(1000, dtype=np.int16), 8000)))
+
+    assert get_audio(client, recording).headers["content-type"] == "audio/wav"
+    assert get_audio(client, recording, "bytes=100-199").headers["content-type"] == "audio/wav"
+
+def test_evicted_recording_is_gone(client, db, store):
+    recording = add_recording(db, store.put(AUDIO))
+    os.remove(store._audio_path(recording.content_hash))
+
+    assert get_audio(client, recording).status_code == 404
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    store = RecordingStore(str(tmp_path), max_bytes=3500)
+    hashes = [store.put(bytes([number]) * 1000) for number in range(3)]
+    # The oldest file was read since, so the second one is least recently used
+    for number, content_hash in enumerate(hashes):
+        os.utime(store._audio_path(content_hash), (1000 + number, 1000 + number))
+    store.get(hashes[0])
+
+    # A fourth file takes the store past its bound, and it is brought
+    # down to 90% of it
+    newest = store.put(b"\xff" * 1000)
+
+    assert [store.contains(content_hash) for content_hash in hashes] == [True, False, True]
+    assert store.get(newest) == b"\xff" * 1000
+    assert store._estimated_bytes == 3000
+
+def test_storing_the_same_audio_twice_keeps_one_copy(tmp_path):
+    store = RecordingStore(str(tmp_path), max_bytes=10_000)
+
+    assert store.put(AUDIO) == store.put(AUDIO)
+    assert store._scan_bytes() == len(AUDIO)
+
+def test_processed_recording_is_committed_without_a_transcript(db, store, monkeypatch):
+    call = Call(call_sid="CA00000001", phone_number="+15550000000",
+                direction=CallDirection.INBOUND, status=CallStatus.COMPLETED)
+    db.add(call)
+    db.commit()
+
+    service = CallService(db)
+    audio = StoredRecording(store.put(AUDIO), AUDIO)
+
+    async def fetch_recording(audio_url):
+        return audio
+
+    async def transcribe_recording(recording, language):
+        # Silence: segments come back, but none of them has any text
+        return [TranscriptSegment(0.0, 30.0, ""), TranscriptSegment(30.0, 42.5, " ")]
+
+    monkeypatch.setattr(service.voice_service, "fetch_recording", fetch_recording)
+    monkeypatch.setattr(service.voice_service, "transcribe_recording", transcribe_recording)
+    asyncio.run(service.process_recording("CA00000001", "https://example.com/recording"))
+
+    other = SessionLocal()
+    try:
+        stored = other.query(Recording).filter(Recording.call_id == call.id).one()
+    finally:
+        other.close()
+    assert stored.content_hash == audio.content_hash
+    assert stored.duration == 42.5
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime
+
+from app.models.database import Call, CallDirection, CallStatus
+from app.services.archive_service import ArchiveService
+from app.services.call_service import CallService
+
+def add_call(db, transcript: str, created_at: datetime = None) -> int:
+    call = Call(call_sid=f"CA{db.query(Call).count():08d}", phone_number="+15550000000",
+                direction=CallDirection.INBOUND, status=CallStatus.COMPLETED, created_at=created_at)
+    db.add(call)
+    db.flush()
+    CallService(db)._set_transcript(call, transcript)
+    db.commit()
+    return call.id
+
+def search(client, q: str, **params):
+    response = client.get("/calls/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()
+
+def test_best_matches_come_first(client, db):
+    passing = add_call(db, "I asked about a refund once, but mostly I wanted to know when my order would be delivered to me")
+    focused = add_call(db, "Refund please, I want a refund")
+    add_call(db, "When will my order be delivered")
+
+    results = search(client, "refund")
+
+    assert [result["id"] for result in results] == [focused, passing]
+    assert results[0]["score"] > results[1]["score"]
+    # Every word must match
+    assert [result["id"] for result in search(client, "refund delivered")] == [passing]
+
+def test_pages_follow_the_ranking(client, db):
+    for number in range(7):
+        add_call(db, "refund " * (number + 1) + "for my damaged order")
+
+    ranked = [result["id"] for result in search(client, "refund", limit=20)]
+    paged = [result["id"] for skip in (0, 3, 6) for result in search(client, "refund", skip=skip, limit=3)]
+
+    assert len(ranked) == 7
+    assert paged == ranked
+
+def test_index_follows_transcript_changes(client, db):
+    call_id = add_call(db, "I need a refund for my order")
+    call = db.get(Call, call_id)
+    CallService(db)._set_transcript(call, "When will my order be delivered")
+    db.commit()
+
+    assert search(client, "refund") == []
+    assert [result["id"] for result in search(client, "delivered")] == [call_id]
+
+def test_archived_calls_leave_the_index(client, db):
+    add_call(db, "I need a refund for my order", created_at=datetime(2024, 1, 1))
+    recent = add_call(db, "Another refund request")
+
+    asyncio.run(ArchiveService(db).archive_calls(retention_days=30))
+
+    assert [result["id"] for result in search(client, "refund")] == [recent]
+
+def test_hindi_words_match_as_whole_tokens(client, db):
+    refund = add_call(db, "मुझे रिफंड चाहिए, मेरा ऑर्डर ख़राब था।")
+    add_call(db, "मेरा ऑर्डर कब आएगा?")
+
+    assert [result["id"] for result in search(client, "रिफंड")] == [refund]
+    # The danda ends a sentence like a full stop
+    assert [result["id"] for result in search(client, "था")] == [refund]
+    assert len(search(client, "ऑर्डर")) == 2
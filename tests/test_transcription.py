@@ -0,0 +1,71 @@
+import asyncio
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from app.services.voice_service import VoiceService, settings
+from app.utils.audio import decode_wav, encode_wav, prepare_for_transcription
+
+MAX_UPLOAD_BYTES = 200_000
+
+def speech(seconds: float, sample_rate: int = 16000) -> bytes:
+    """A tone whose loudness rises and falls every two seconds, like phrases with short breaths between them"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    envelope = 0.2 + 0.8 * np.abs(np.sin(np.pi * t / 2))
+    signal = 8000 * envelope * np.sin(2 * np.pi * 220 * t)
+    return encode_wav(np.rint(signal).astype(np.int16), sample_rate)
+
+def transcribe(audio: bytes, monkeypatch):
+    """Transcribe audio against a stand-in for the Whisper API, which answers with an upload number"""
+    uploads = []
+
+    async def transcriptions(request: web.Request) -> web.Response:
+        form = await request.post()
+        upload = form["file"]
+        data = upload.file.read()
+        uploads.append((upload.filename, data))
+        return web.json_response({"text": str(len(uploads) - 1)})
+
+    async def run():
+        app = web.Application(client_max_size=MAX_UPLOAD_BYTES * 2)
+        app.router.add_post("/v1/audio/transcriptions", transcriptions)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(settings, "openai_base_url", f"http://127.0.0.1:{port}/v1")
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await VoiceService()._transcribe_audio_data(session, audio, "en")
+        finally:
+            await runner.cleanup()
+
+    monkeypatch.setattr(settings, "transcription_max_upload_bytes", MAX_UPLOAD_BYTES)
+    monkeypatch.setattr(settings, "transcription_concurrency", 3)
+    return asyncio.run(run()), uploads
+
+def test_long_recording_is_sent_in_ordered_contiguous_segments(monkeypatch):
+    audio = speech(60)
+
+    segments, uploads = transcribe(audio, monkeypatch)
+
+    assert len(segments) > 3
+    assert all(filename == "segment.wav" and len(data) <= MAX_UPLOAD_BYTES for filename, data in uploads)
+    # Consecutive segments meet exactly and cover the whole recording
+    assert segments[0].start == 0.0 and segments[-1].end == 60.0
+    assert all(earlier.end == later.start for earlier, later in zip(segments, segments[1:]))
+    assert all(segment.start < segment.end for segment in segments)
+
+    # In segment order, the uploaded audio is the prepared recording, without gaps or overlaps
+    sent = np.concatenate([decode_wav(uploads[int(segment.text)][1])[0][:, 0] for segment in segments])
+    samples, sample_rate = decode_wav(audio)
+    prepared = prepare_for_transcription(samples, sample_rate, settings.audio_target_sample_rate, settings.audio_max_pause_ms)
+    assert np.array_equal(sent, prepared.samples)
+
+def test_short_recording_is_sent_whole(monkeypatch):
+    segments, uploads = transcribe(speech(3), monkeypatch)
+
+    assert [filename for filename, _ in uploads] == ["recording.wav"]
+    assert segments == [(0.0, 3.0, "0")]
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from app.models.database import Call, WebhookEvent
+from app.services.call_service import CallService
+from app.services.webhook_idempotency import webhook_idempotency
+
+INITIATED = {"CallSid": "CA100", "CallStatus": "initiated", "From": "+15550000001", "To": "+15550000002", "SequenceNumber": "0"}
+
+def retry_costs(client, queries, path, retries, first, forget=False, **request):
+    """Statements issued by each retry of a delivery, checking it gets the first response"""
+    costs = []
+    for _ in range(retries):
+        if forget:
+            # As if the retry landed on a worker that hasn't seen the delivery
+            webhook_idempotency._responses.clear()
+        before = queries.count
+        response = client.post(path, **request)
+        costs.append(queries.count - before)
+        assert response.status_code == first.status_code
+        assert response.content == first.content
+    return costs
+
+def test_twilio_initiated_storm_creates_one_call(client, db, queries):
+    first = client.post("/webhooks/twilio", data=INITIATED)
+    assert first.status_code == 200
+
+    # Retries are answered from memory, and from one row lookup on other workers
+    assert retry_costs(client, queries, "/webhooks/twilio", 50, first, data=INITIATED) == [0] * 50
+    assert retry_costs(client, queries, "/webhooks/twilio", 50, first, forget=True, data=INITIATED) == [1] * 50
+
+    assert db.query(Call).filter(Call.call_sid == "CA100").count() == 1
+    assert db.query(WebhookEvent).count() == 1
+
+def test_twilio_ringing_after_initiated_is_a_duplicate(client, db):
+    first = client.post("/webhooks/twilio", data=INITIATED)
+    ringing = client.post("/webhooks/twilio", data={**INITIATED, "CallStatus": "ringing", "SequenceNumber": "1"})
+
+    assert ringing.status_code == 200
+    assert ringing.content == first.content
+    assert db.query(Call).filter(Call.call_sid == "CA100").count() == 1
+
+def test_twilio_completed_storm_processes_recording_once(client, db, queries, monkeypatch):
+    processed = []
+
+    async def process_recording(self, call_sid, recording_url):
+        processed.append((call_sid, recording_url))
+
+    monkeypatch.setattr(CallService, "process_recording", process_recording)
+    client.post("/webhooks/twilio", data=INITIATED)
+    completed = {"CallSid": "CA100", "CallStatus": "completed", "RecordingUrl": "https://example.com/CA100.wav", "SequenceNumber": "3"}
+    first = client.post("/webhooks/twilio", data=completed)
+
+    assert retry_costs(client, queries, "/webhooks/twilio", 50, first, data=completed) == [0] * 50
+    assert processed == [("CA100", "https://example.com/CA100.wav")]
+
+def test_vapi_call_started_storm_creates_one_call(client, db, queries):
+    started = {"event": "call.started", "call_id": "vapi-1", "direction": "inbound", "from_number": "+15550000001"}
+    first = client.post("/webhooks/vapi", json={**started, "metadata": {"sequence": 1}})
+    assert first.status_code == 200
+
+    # Renumbered deliveries of the same start are duplicates too
+    costs = retry_costs(client, queries, "/webhooks/vapi", 20, first, json={**started, "metadata": {"sequence": 2}})
+    assert costs == [0] * 20
+    assert db.query(Call).filter(Call.call_sid == "vapi-1").count() == 1
+
+def test_create_inbound_call_returns_existing_call(db):
+    service = CallService(db)
+    call = asyncio.run(service.create_inbound_call("CA200", "+15550000001", "+15550000002"))
+
+    again = asyncio.run(service.create_inbound_call("CA200", "+15550000001", "+15550000002"))
+
+    assert again.id == call.id
+    assert db.query(Call).count() == 1
+
+def test_prune_deletes_only_old_answered_deliveries(db):
+    now = time.time()
+    db.add_all([
+        WebhookEvent(provider="twilio", call_id="old", event="completed", sequence="", status_code=200, claimed_at=now - 7200),
+        WebhookEvent(provider="twilio", call_id="new", event="completed", sequence="", status_code=200, claimed_at=now),
+        WebhookEvent(provider="twilio", call_id="open", event="completed", sequence="", status_code=None, claimed_at=now - 7200),
+    ])
+    db.commit()
+
+    assert webhook_idempotency.prune(db, 3600) == 1
+    assert sorted(event.call_id for event in db.query(WebhookEvent)) == ["new", "open"]